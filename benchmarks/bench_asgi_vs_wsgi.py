@@ -0,0 +1,114 @@
+"""
+Пропускная способность эндпоинтов транзакций под WSGI и ASGI при разной параллельности.
+
+    python -m benchmarks.bench_asgi_vs_wsgi --requests 1000 --concurrency 1 8 32 128
+
+Режимы:
+
+- wsgi        — синхронные представления, потоки с django.test.Client (как под gunicorn --threads);
+- asgi-sync   — синхронные представления через ASGIHandler (django.test.AsyncClient):
+                каждый запрос проходит через мост sync_to_async;
+- asgi-async  — async-представления /api/transactions/async/... через ASGIHandler:
+                в синхронный поток уходит только транзакция с изменением балансов.
+
+Все режимы работают в одном процессе без сети, поэтому сравнивают накладные
+расходы обработчиков и мостов, а не сетевой стек конкретного сервера.
+"""
+import argparse
+import asyncio
+import json
+import shutil
+import statistics
+import time
+
+from benchmarks.bench_transaction_api import ENDPOINTS, run_endpoint, seed
+from benchmarks.utils import percentile, print_table, setup_django
+
+
+MODES = ('wsgi', 'asgi-sync', 'asgi-async')
+
+COLUMNS = ['mode', 'concurrency', 'requests', 'errors', 'rps', 'p50_ms', 'p95_ms', 'p99_ms']
+
+
+def async_url(url):
+    return url.replace('/api/transactions/', '/api/transactions/async/', 1)
+
+
+async def run_asgi(url, payload, requests, concurrency):
+    from django.test import AsyncClient
+
+    body = json.dumps(payload)
+    per_worker = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+    timings = []
+    errors = 0
+
+    async def worker(count):
+        nonlocal errors
+        client = AsyncClient()
+        for _ in range(count):
+            started = time.perf_counter()
+            response = await client.post(url, body, content_type='application/json')
+            timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(count) for count in per_worker))
+    elapsed = time.perf_counter() - started
+
+    return {
+        'requests': len(timings),
+        'errors': errors,
+        'rps': len(timings) / elapsed,
+        'p50_ms': statistics.median(timings),
+        'p95_ms': percentile(timings, 95),
+        'p99_ms': percentile(timings, 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=1000, help='Запросов на замер')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32, 128])
+    parser.add_argument('--endpoint', choices=list(ENDPOINTS), default='service_spend')
+    parser.add_argument('--mode', action='append', choices=MODES, help='По умолчанию все')
+    parser.add_argument('--shards', type=int, default=1, help='Число шардов общих балансов')
+    parser.add_argument('--db', help='Путь к файлу SQLite (по умолчанию временный)')
+    args = parser.parse_args()
+
+    db_path = setup_django(args.db)
+
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connection
+
+    settings.ALLOWED_HOSTS.append('testserver')
+    settings.DEBUG = False
+
+    call_command('migrate', verbosity=0)
+    seed(args.shards)
+
+    url, payload = ENDPOINTS[args.endpoint]
+    print(f'База: {db_path}')
+    print(f'Эндпоинт: {url}, запросов на замер: {args.requests}')
+
+    rows = []
+    for mode in args.mode or MODES:
+        for concurrency in args.concurrency:
+            if mode == 'wsgi':
+                result = run_endpoint(args.endpoint, args.requests, concurrency)
+            else:
+                target = async_url(url) if mode == 'asgi-async' else url
+                result = asyncio.run(run_asgi(target, payload, args.requests, concurrency))
+            rows.append({'mode': mode, 'concurrency': concurrency, **result})
+
+    print()
+    print_table(rows, COLUMNS)
+
+    if args.db is None:
+        connection.close()
+        shutil.rmtree(db_path.parent)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Время кодирования ответов и разбора запросов эндпоинтов транзакций:
+JSONRenderer/JSONParser DRF против BillingJSONRenderer/BillingJSONParser
+на каждом установленном бэкенде (BILLING_JSON_BACKEND).
+
+    python -m benchmarks.bench_json --iterations 50000
+
+Ответы берутся настоящие: по одному запросу к conversion, service-spend
+и account-topup (и account-topup в режиме журнала, ответ 202).
+"""
+import argparse
+import json
+import shutil
+import time
+from io import BytesIO
+
+from benchmarks.bench_transaction_api import ENDPOINTS, seed
+from benchmarks.utils import print_table, setup_django
+
+
+COLUMNS = ['endpoint', 'backend', 'render_drf_us', 'render_us', 'render_x', 'parse_drf_us', 'parse_us', 'parse_x']
+
+
+def per_call_us(func, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=50_000, help='Вызовов на замер')
+    parser.add_argument('--db', help='Путь к файлу SQLite (по умолчанию временный)')
+    args = parser.parse_args()
+
+    db_path = setup_django(args.db)
+
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test import Client
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+    from billing import renderers
+    from billing.renderers import BillingJSONParser, BillingJSONRenderer
+
+    call_command('migrate', verbosity=0)
+    seed(1)
+
+    settings.ALLOWED_HOSTS.append('testserver')
+    client = Client()
+    shapes = {}
+    for endpoint, (url, payload) in ENDPOINTS.items():
+        shapes[endpoint] = (payload, client.post(url, payload, content_type='application/json').data)
+    settings.BILLING_TOPUP_WRITE_BEHIND = True
+    url, payload = ENDPOINTS['account_topup']
+    shapes['account_topup_pending'] = (payload, client.post(url, payload, content_type='application/json').data)
+    settings.BILLING_TOPUP_WRITE_BEHIND = False
+
+    backends = ['stdlib'] + [
+        name for name, module in (('orjson', renderers.orjson), ('msgspec', renderers.msgspec)) if module is not None
+    ]
+
+    rows = []
+    drf_renderer, drf_parser = JSONRenderer(), JSONParser()
+    renderer, json_parser = BillingJSONRenderer(), BillingJSONParser()
+    for endpoint, (payload, data) in shapes.items():
+        body = json.dumps(payload).encode()
+        render_drf = per_call_us(lambda: drf_renderer.render(data), args.iterations)
+        parse_drf = per_call_us(lambda: drf_parser.parse(BytesIO(body)), args.iterations)
+        for backend in backends:
+            settings.BILLING_JSON_BACKEND = backend
+            # Проверка, что вывод и разбор совпадают с DRF
+            assert renderer.render(data) == drf_renderer.render(data), (endpoint, backend)
+            assert json_parser.parse(BytesIO(body)) == drf_parser.parse(BytesIO(body)), (endpoint, backend)
+
+            render_us = per_call_us(lambda: renderer.render(data), args.iterations)
+            parse_us = per_call_us(lambda: json_parser.parse(BytesIO(body)), args.iterations)
+            rows.append({
+                'endpoint': endpoint, 'backend': backend,
+                'render_drf_us': render_drf, 'render_us': render_us, 'render_x': render_drf / render_us,
+                'parse_drf_us': parse_drf, 'parse_us': parse_us, 'parse_x': parse_drf / parse_us,
+            })
+
+    print(f'База: {db_path}, вызовов на замер: {args.iterations}')
+    print()
+    print_table(rows, COLUMNS)
+
+    if args.db is None:
+        connection.close()
+        shutil.rmtree(db_path.parent)
+
+
+if __name__ == '__main__':
+    main()
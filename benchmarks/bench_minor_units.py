@@ -0,0 +1,77 @@
+"""
+Сверочные задачи по Decimal-колонкам и по целым amount_minor (BILLING_MINOR_UNITS).
+
+    python -m benchmarks.bench_minor_units --transactions 200000 --users 2000
+    BILLING_DB_PROFILE=postgresql python -m benchmarks.bench_minor_units
+
+Данные генерирует seed_billing. Для каждого представления сумм замеряются
+агрегация проводок по счетам в БД (SUM ... GROUP BY), команда verify_ledger
+(потоковое суммирование проводок в Python) и reconcile_balances --rebuild.
+"""
+import argparse
+import io
+import shutil
+
+from benchmarks.utils import measure, print_table, setup_django
+
+
+COLUMNS = ['job', 'columns', 'min_ms', 'p50_ms', 'p95_ms', 'max_ms']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--transactions', type=int, default=100_000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--db', help='Путь к файлу SQLite (по умолчанию временный)')
+    args = parser.parse_args()
+
+    db_path = setup_django(args.db)
+
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connection
+    from django.db.models import Sum
+    from billing.models import LedgerEntry
+
+    call_command('migrate', verbosity=0)
+    call_command(
+        'seed_billing', transactions=args.transactions, users=args.users, seed=1, stdout=io.StringIO(),
+    )
+
+    def aggregate(field):
+        return lambda: list(
+            LedgerEntry.objects.filter(account=LedgerEntry.Account.CLIENT)
+            .values('user', 'currency').annotate(total=Sum(field)).order_by()
+        )
+
+    def command(name, minor, **options):
+        def run():
+            settings.BILLING_MINOR_UNITS = minor
+            call_command(name, stdout=io.StringIO(), **options)
+        return run
+
+    jobs = [
+        ('ledger SUM', 'amount', aggregate('amount')),
+        ('ledger SUM', 'amount_minor', aggregate('amount_minor')),
+        ('verify_ledger', 'amount', command('verify_ledger', False)),
+        ('verify_ledger', 'amount_minor', command('verify_ledger', True)),
+        ('reconcile_balances', 'amount', command('reconcile_balances', False, rebuild=True, lag=0)),
+        ('reconcile_balances', 'amount_minor', command('reconcile_balances', True, rebuild=True, lag=0)),
+    ]
+    rows = [
+        {'job': job, 'columns': columns, **measure(func, repeat=args.repeat, warmup=1)}
+        for job, columns, func in jobs
+    ]
+
+    print(f'База: {connection.vendor}, транзакций: {args.transactions}, проводок: {LedgerEntry.objects.count()}')
+    print()
+    print_table(rows, COLUMNS)
+
+    if args.db is None and connection.vendor == 'sqlite':
+        connection.close()
+        shutil.rmtree(db_path.parent)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Поиск кросс-курсов в RateTable на больших справочниках валют.
+
+    python -m benchmarks.bench_rates --currencies 150 300 --lookups 100000
+
+Курсы генерируются в памяти: каждая валюта котируется к RUB, часть —
+ещё и к USD, по каждой паре несколько снимков за прошедшие дни.
+Для каждого размера замеряются построение таблицы текущих курсов всех пар,
+поиск текущего курса (обращение к словарю) и поиск курса на прошлый
+момент, для которого путь через промежуточные валюты ищется заново.
+"""
+import argparse
+import random
+import shutil
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from benchmarks.utils import print_table, setup_django
+
+
+COLUMNS = ['currencies', 'snapshots', 'pairs', 'build_ms', 'current_us', 'historical_us']
+
+
+def generate_rows(count, snapshots, now, rng):
+    codes = ['RUB', 'USD'] + [f'X{number:04d}' for number in range(1, count - 1)]
+    rows = []
+    for code in codes[1:]:
+        quotes = ['RUB'] + (['USD'] if code != 'USD' and rng.random() < 0.3 else [])
+        for quote in quotes:
+            for day in range(snapshots):
+                rate = Decimal(rng.randint(1, 1_000_000)) / 1000
+                rows.append((code, quote, now - timedelta(days=day + 1), rate))
+    return codes, rows
+
+
+def per_call_us(func, pairs):
+    started = time.perf_counter()
+    for base, quote in pairs:
+        func(base, quote)
+    return (time.perf_counter() - started) / len(pairs) * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--currencies', type=int, nargs='+', default=[150, 300])
+    parser.add_argument('--snapshots', type=int, default=30, help='Снимков на пару')
+    parser.add_argument('--lookups', type=int, default=100_000, help='Поисков текущего курса на замер')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    db_path = setup_django()
+
+    from django.utils import timezone
+    from billing.rates import RateTable
+
+    rng = random.Random(args.seed)
+    now = timezone.now()
+    rows_out = []
+    for count in args.currencies:
+        codes, rows = generate_rows(count, args.snapshots, now, rng)
+        table = RateTable(rows)
+
+        started = time.perf_counter()
+        current = table.current_rates()
+        build_ms = (time.perf_counter() - started) * 1000
+
+        pairs = [tuple(rng.sample(codes, 2)) for _ in range(args.lookups)]
+        current_us = per_call_us(table.get, pairs)
+        past = now - timedelta(days=args.snapshots // 2, hours=12)
+        # Поиск на прошлый момент строит граф заново: замеряем на меньшей выборке
+        historical_us = per_call_us(lambda base, quote: table.get(base, quote, past), pairs[:200])
+
+        rows_out.append({
+            'currencies': count, 'snapshots': len(rows), 'pairs': len(current),
+            'build_ms': build_ms, 'current_us': current_us, 'historical_us': historical_us,
+        })
+
+    print_table(rows_out, COLUMNS)
+    shutil.rmtree(db_path.parent)
+
+
+if __name__ == '__main__':
+    main()
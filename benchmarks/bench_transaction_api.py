@@ -0,0 +1,202 @@
+"""
+Нагрузочный бенчмарк эндпоинтов conversion, service-spend и account-topup.
+
+    python -m benchmarks.bench_transaction_api --requests 2000 --concurrency 8
+    python -m benchmarks.bench_transaction_api --save-baseline benchmarks/baseline.json
+    python -m benchmarks.bench_transaction_api --baseline benchmarks/baseline.json
+
+Запросы идут в процессе через django.test.Client (обработчик WSGI без сети),
+каждый поток-воркер держит свой клиент и своё соединение с БД.
+Для каждого эндпоинта печатаются p50/p95/p99, пропускная способность
+и среднее число SQL-запросов на HTTP-запрос.
+
+С --baseline результаты сравниваются с сохранённым JSON: рост p95/p99
+или падение пропускной способности больше --tolerance, а также любой рост
+числа запросов считаются регрессией, и процесс завершается с кодом 1.
+"""
+import argparse
+import json
+import shutil
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.utils import percentile, print_table, setup_django
+
+
+ENDPOINTS = {
+    'conversion': (
+        '/api/transactions/conversion/',
+        {'sum': '1', 'currency_id': 'USD', 'gross_currency_id': 'RUB', 'exchange_rate': '85.0'},
+    ),
+    'service_spend': (
+        '/api/transactions/service-spend/',
+        {'sum': '1', 'currency_id': 'RUB'},
+    ),
+    'account_topup': (
+        '/api/transactions/account-topup/',
+        {'sum': '1', 'currency_id': 'RUB'},
+    ),
+}
+
+COLUMNS = ['endpoint', 'requests', 'errors', 'rps', 'p50_ms', 'p95_ms', 'p99_ms', 'queries']
+
+
+def run_worker(url, payload, count):
+    """Отправляет count запросов и возвращает (задержки в мс, число запросов к БД, ошибки)."""
+    from django.db import connection
+    from django.test import Client
+
+    client = Client()
+    body = json.dumps(payload)
+    timings = []
+    queries = 0
+    errors = 0
+
+    def count_queries(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    try:
+        with connection.execute_wrapper(count_queries):
+            for _ in range(count):
+                started = time.perf_counter()
+                response = client.post(url, body, content_type='application/json')
+                timings.append((time.perf_counter() - started) * 1000)
+                if response.status_code >= 400:
+                    errors += 1
+    finally:
+        connection.close()
+
+    return timings, queries, errors
+
+
+def run_endpoint(name, requests, concurrency):
+    url, payload = ENDPOINTS[name]
+    per_worker = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda count: run_worker(url, payload, count), per_worker))
+    elapsed = time.perf_counter() - started
+
+    timings = [timing for worker_timings, _, _ in results for timing in worker_timings]
+    queries = sum(worker_queries for _, worker_queries, _ in results)
+    errors = sum(worker_errors for _, _, worker_errors in results)
+
+    return {
+        'endpoint': name,
+        'requests': len(timings),
+        'errors': errors,
+        'rps': len(timings) / elapsed,
+        'p50_ms': statistics.median(timings),
+        'p95_ms': percentile(timings, 95),
+        'p99_ms': percentile(timings, 99),
+        'queries': queries / len(timings),
+    }
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    """Возвращает список описаний регрессий относительно сохранённого прогона."""
+    regressions = []
+    for row in results:
+        base = baseline.get('endpoints', {}).get(row['endpoint'])
+        if base is None:
+            continue
+        for key in ('p95_ms', 'p99_ms'):
+            if row[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{row['endpoint']}: {key} {base[key]:.3f} -> {row[key]:.3f}")
+        if row['rps'] < base['rps'] * (1 - tolerance):
+            regressions.append(f"{row['endpoint']}: rps {base['rps']:.1f} -> {row['rps']:.1f}")
+        # Число запросов детерминировано, поэтому допуск к нему не применяется
+        if row['queries'] > base['queries']:
+            regressions.append(f"{row['endpoint']}: queries {base['queries']:.2f} -> {row['queries']:.2f}")
+    return regressions
+
+
+def seed(shards):
+    from decimal import Decimal
+    from billing.models import Balance, Currency
+
+    for code, name in (('RUB', 'Russian Ruble'), ('USD', 'United States Dollar')):
+        currency, _ = Currency.objects.get_or_create(code=code, defaults={'name': name})
+        Balance.objects.get_or_create(
+            user=None, currency=currency, shard=0, defaults={'amount': Decimal('1000000000.00')},
+        )
+        if shards > 1:
+            Balance.objects.account(None, currency).reshard(shards)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=1000, help='Запросов на эндпоинт')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--warmup', type=int, default=20, help='Запросов прогрева на эндпоинт')
+    parser.add_argument('--shards', type=int, default=1, help='Число шардов общих балансов')
+    parser.add_argument('--endpoint', action='append', choices=list(ENDPOINTS), help='По умолчанию все')
+    parser.add_argument('--save-baseline', help='Сохранить результаты в JSON')
+    parser.add_argument('--baseline', help='Сравнить с сохранёнными результатами')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Допустимое ухудшение, доля')
+    parser.add_argument('--db', help='Путь к файлу SQLite (по умолчанию временный)')
+    args = parser.parse_args()
+
+    db_path = setup_django(args.db)
+
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connection
+
+    settings.ALLOWED_HOSTS.append('testserver')
+    # Журнал запросов DEBUG не нужен: запросы считает execute_wrapper
+    settings.DEBUG = False
+
+    call_command('migrate', verbosity=0)
+    seed(args.shards)
+
+    print(f'База: {db_path}')
+    print(f'Запросов на эндпоинт: {args.requests}, параллельность: {args.concurrency}')
+
+    results = []
+    for name in args.endpoint or ENDPOINTS:
+        run_worker(*ENDPOINTS[name], args.warmup)
+        results.append(run_endpoint(name, args.requests, args.concurrency))
+
+    print()
+    print_table(results, COLUMNS)
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        print()
+        if regressions:
+            print('Регрессии относительно базового прогона:')
+            for line in regressions:
+                print(f'  {line}')
+            exit_code = 1
+        else:
+            print('Регрессий относительно базового прогона нет')
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({
+                'requests': args.requests,
+                'concurrency': args.concurrency,
+                'shards': args.shards,
+                'python': sys.version.split()[0],
+                'endpoints': {row['endpoint']: row for row in results},
+            }, f, indent=2)
+        print(f'Результаты сохранены в {args.save_baseline}')
+
+    if args.db is None:
+        connection.close()
+        shutil.rmtree(db_path.parent)
+
+    sys.exit(exit_code)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""
+Планы и время запросов чтения по таблице Transaction до и после индексов из Transaction.Meta.
+
+    python -m benchmarks.bench_transaction_indexes --rows 2000000
+
+"До" — схема из 0001_initial: только одиночные индексы внешних ключей.
+"После" — составные индексы из Transaction.Meta.indexes.
+"""
+import argparse
+import random
+import shutil
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from benchmarks.utils import measure, print_table, setup_django
+
+
+FK_INDEXES = {
+    'bench_txn_user_id': 'user_id',
+    'bench_txn_currency_id': 'currency_id',
+}
+
+
+def build_queries(Transaction, Sum, start, end, user_ids):
+    middle = start + (end - start) / 2
+    week = timedelta(days=7)
+    user_id = user_ids[len(user_ids) // 2]
+
+    return {
+        'user_history': lambda: Transaction.objects.filter(user_id=user_id).order_by('-created_at')[:50],
+        'type_period_sum': lambda: Transaction.objects.filter(
+            transaction_type='service_spend', created_at__gte=middle, created_at__lt=middle + week,
+        ).values('transaction_type').annotate(total=Sum('amount')),
+        'currency_period_sum': lambda: Transaction.objects.filter(
+            currency_id='USD', created_at__gte=middle, created_at__lt=middle + week,
+        ).values('currency_id').annotate(total=Sum('amount')),
+        'latest_page': lambda: Transaction.objects.order_by('-created_at', '-id')[:50],
+        'keyset_page': lambda: Transaction.objects.filter(created_at__lt=middle).order_by('-created_at', '-id')[:50],
+    }
+
+
+def seed(connection, rows, user_ids, start, end, batch_size):
+    types = ['account_topup'] * 3 + ['service_spend'] * 6 + ['conversion']
+    span = (end - start).total_seconds()
+    adapt = connection.ops.adapt_datetimefield_value
+    sql = (
+        'INSERT INTO billing_transaction '
+        '(transaction_type, amount, exchange_rate, created_at, currency_id, gross_currency_id, user_id) '
+        'VALUES (%s, %s, %s, %s, %s, %s, %s)'
+    )
+    rnd = random.Random(42)
+
+    with connection.cursor() as cursor:
+        for offset in range(0, rows, batch_size):
+            batch = []
+            for _ in range(min(batch_size, rows - offset)):
+                transaction_type = rnd.choice(types)
+                foreign = transaction_type == 'conversion' or rnd.random() < 0.2
+                batch.append((
+                    transaction_type,
+                    str(Decimal(rnd.randint(100, 10_000_000)).scaleb(-2)),
+                    '85.0' if foreign else None,
+                    adapt(start + timedelta(seconds=rnd.random() * span)),
+                    'USD' if foreign else 'RUB',
+                    'RUB' if foreign else None,
+                    rnd.choice(user_ids),
+                ))
+            cursor.executemany(sql, batch)
+
+
+def run_phase(queries, repeat):
+    results = {}
+    for name, make_query in queries.items():
+        results[name] = {
+            'plan': make_query().explain(),
+            **measure(lambda: list(make_query()), repeat=repeat),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--users', type=int, default=1_000)
+    parser.add_argument('--batch-size', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--db', help='Путь к файлу SQLite (по умолчанию временный)')
+    args = parser.parse_args()
+
+    db_path = setup_django(args.db)
+
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.db import connection, transaction
+    from django.db.models import Sum
+    from billing.models import Currency, Transaction
+
+    call_command('migrate', verbosity=0)
+    Currency.objects.get_or_create(code='RUB', defaults={'name': 'Russian Ruble'})
+    Currency.objects.get_or_create(code='USD', defaults={'name': 'United States Dollar'})
+    User.objects.bulk_create(
+        [User(username=f'bench-{i}') for i in range(args.users)], ignore_conflicts=True,
+    )
+    user_ids = list(User.objects.values_list('id', flat=True))
+
+    with connection.schema_editor() as editor:
+        for index in Transaction._meta.indexes:
+            editor.remove_index(Transaction, index)
+        for name, column in FK_INDEXES.items():
+            editor.execute(f'CREATE INDEX {name} ON billing_transaction ({column})')
+
+    end = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    start = end - timedelta(days=365)
+
+    print(f'База: {db_path}')
+    print(f'Заполнение {args.rows} строк...')
+    started = time.perf_counter()
+    with transaction.atomic():
+        seed(connection, args.rows, user_ids, start, end, args.batch_size)
+    print(f'Заполнено за {time.perf_counter() - started:.1f} с')
+
+    queries = build_queries(Transaction, Sum, start, end, user_ids)
+
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    before = run_phase(queries, args.repeat)
+
+    started = time.perf_counter()
+    with connection.schema_editor() as editor:
+        for name in FK_INDEXES:
+            editor.execute(f'DROP INDEX {name}')
+        for index in Transaction._meta.indexes:
+            editor.add_index(Transaction, index)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    print(f'Индексы построены за {time.perf_counter() - started:.1f} с')
+    after = run_phase(queries, args.repeat)
+
+    print()
+    print_table(
+        [
+            {
+                'query': name,
+                'before_p50_ms': before[name]['p50_ms'],
+                'after_p50_ms': after[name]['p50_ms'],
+                'speedup': before[name]['p50_ms'] / max(after[name]['p50_ms'], 1e-6),
+            }
+            for name in queries
+        ],
+        ['query', 'before_p50_ms', 'after_p50_ms', 'speedup'],
+    )
+
+    for name in queries:
+        print(f'\n== {name}')
+        print(f'-- до:\n{before[name]["plan"]}')
+        print(f'-- после:\n{after[name]["plan"]}')
+
+    if args.db is None:
+        connection.close()
+        shutil.rmtree(db_path.parent)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Время проверки тел запросов транзакций: сериализаторы DRF против
+скомпилированной схемы (BILLING_FAST_VALIDATION).
+
+    python -m benchmarks.bench_validation --iterations 20000
+
+Для каждого эндпоинта замеряются корректный запрос и запрос с ошибкой.
+Работа с БД исключена: валюты берутся из прогретого реестра.
+"""
+import argparse
+import shutil
+import time
+
+from benchmarks.bench_transaction_api import ENDPOINTS, seed
+from benchmarks.utils import print_table, setup_django
+
+
+INVALID = {
+    'conversion': {'sum': '-1', 'currency_id': 'USD', 'gross_currency_id': 'RUB', 'exchange_rate': '85.0'},
+    'service_spend': {'sum': 'abc', 'currency_id': 'RUB'},
+    'account_topup': {'sum': '1', 'currency_id': 'USD'},
+}
+
+COLUMNS = ['endpoint', 'payload', 'drf_us', 'fast_us', 'speedup']
+
+
+def per_call_us(factory, payload, iterations):
+    """Среднее время is_valid() с созданием объекта проверки, микросекунды."""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        factory(data=payload).is_valid()
+    return (time.perf_counter() - started) / iterations * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=20_000, help='Проверок на замер')
+    parser.add_argument('--db', help='Путь к файлу SQLite (по умолчанию временный)')
+    args = parser.parse_args()
+
+    db_path = setup_django(args.db)
+
+    from django.core.management import call_command
+    from django.db import connection
+    from billing.currencies import currency_registry
+    from billing.views.transactions.views import BatchTransactionView
+
+    call_command('migrate', verbosity=0)
+    seed(1)
+    currency_registry.get('RUB')
+
+    rows = []
+    for endpoint, (_, valid) in ENDPOINTS.items():
+        view = BatchTransactionView.transaction_views[endpoint]
+        for name, payload in (('valid', valid), ('invalid', INVALID[endpoint])):
+            # Прогрев и проверка, что оба пути согласны
+            drf, fast = view.serializer_class(data=payload), view.fast_serializer_class(data=payload)
+            assert drf.is_valid() == fast.is_valid() and drf.errors == fast.errors, payload
+
+            drf_us = per_call_us(view.serializer_class, payload, args.iterations)
+            fast_us = per_call_us(view.fast_serializer_class, payload, args.iterations)
+            rows.append({
+                'endpoint': endpoint, 'payload': name,
+                'drf_us': drf_us, 'fast_us': fast_us, 'speedup': drf_us / fast_us,
+            })
+
+    print(f'База: {db_path}, проверок на замер: {args.iterations}')
+    print()
+    print_table(rows, COLUMNS)
+
+    if args.db is None:
+        connection.close()
+        shutil.rmtree(db_path.parent)
+
+
+if __name__ == '__main__':
+    main()
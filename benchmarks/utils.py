@@ -0,0 +1,70 @@
+"""
+Общие помощники для бенчмарков.
+Бенчмарки запускаются из корня проекта: python -m benchmarks.<имя>
+и работают с отдельной базой SQLite, не трогая базу разработки.
+"""
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+
+def setup_django(db_path=None):
+    """
+    Настраивает Django на отдельную базу SQLite и возвращает путь к ней.
+    Без db_path создаётся временный файл.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+    if db_path is None:
+        db_path = Path(tempfile.mkdtemp(prefix='billing-bench-')) / 'bench.sqlite3'
+
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = str(db_path)
+
+    import django
+    django.setup()
+    return Path(db_path)
+
+
+def percentile(values, pct):
+    """Перцентиль по методу ближайшего ранга."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+def measure(func, repeat=20, warmup=2):
+    """Запускает func несколько раз и возвращает сводку по времени в миллисекундах."""
+    for _ in range(warmup):
+        func()
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    return {
+        'min_ms': min(timings),
+        'p50_ms': statistics.median(timings),
+        'p95_ms': percentile(timings, 95),
+        'max_ms': max(timings),
+    }
+
+
+def print_table(rows, columns):
+    """Печатает список словарей выровненной таблицей."""
+    def fmt(value):
+        return f'{value:.3f}' if isinstance(value, float) else str(value)
+
+    widths = {
+        column: max(len(column), *(len(fmt(row[column])) for row in rows))
+        for column in columns
+    }
+    print('  '.join(column.ljust(widths[column]) for column in columns))
+    for row in rows:
+        print('  '.join(fmt(row[column]).ljust(widths[column]) for column in columns))
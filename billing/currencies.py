@@ -0,0 +1,91 @@
+import logging
+import threading
+
+from django.db import DatabaseError
+
+from billing.models import Currency
+
+
+logger = logging.getLogger(__name__)
+
+
+class CurrencyRegistry:
+    """
+    Процессный реестр валют.
+    Валюты меняются крайне редко, поэтому справочник загружается одним запросом
+    и дальше отдаётся из памяти. Сбрасывается сигналами модели Currency
+    и командой init_currencies.
+    """
+
+    def __init__(self):
+        self._currencies = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._currencies is None:
+                self._currencies = {
+                    currency.code: currency for currency in Currency.objects.all()
+                }
+            return self._currencies
+
+    def get(self, code):
+        """
+        Возвращает валюту по коду.
+        Если кода нет в реестре, валюта ищется в БД (она могла появиться
+        в другом процессе), при отсутствии выбрасывается Currency.DoesNotExist.
+        """
+        currencies = self._currencies
+        if currencies is None:
+            currencies = self._load()
+
+        try:
+            return currencies[code]
+        except KeyError:
+            pass
+
+        currency = Currency.objects.get(code=code)
+        with self._lock:
+            if self._currencies is not None:
+                self._currencies = {**self._currencies, code: currency}
+        return currency
+
+    async def aget(self, code):
+        """Асинхронный вариант get() для async-представлений."""
+        currencies = self._currencies
+        if currencies is None:
+            currencies = {currency.code: currency async for currency in Currency.objects.all()}
+            with self._lock:
+                if self._currencies is None:
+                    self._currencies = currencies
+
+        try:
+            return currencies[code]
+        except KeyError:
+            pass
+
+        currency = await Currency.objects.aget(code=code)
+        with self._lock:
+            if self._currencies is not None:
+                self._currencies = {**self._currencies, code: currency}
+        return currency
+
+    def all(self):
+        currencies = self._currencies
+        if currencies is None:
+            currencies = self._load()
+        return list(currencies.values())
+
+    def warm(self):
+        """Прогрев реестра при старте процесса. Ошибки БД не мешают запуску."""
+        try:
+            self._load()
+        except DatabaseError:
+            logger.warning("Не удалось прогреть реестр валют", exc_info=True)
+
+    def invalidate(self):
+        with self._lock:
+            self._currencies = None
+
+
+currency_registry = CurrencyRegistry()
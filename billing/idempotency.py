@@ -0,0 +1,145 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+from billing.models import IdempotencyKey
+
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+StoredResponse = namedtuple('StoredResponse', ['request_hash', 'status', 'body', 'created_at'])
+
+
+class IdempotencyKeyReused(Exception):
+    """Ключ уже использован с другим телом запроса."""
+
+
+class DuplicateIdempotencyKey(Exception):
+    """Параллельный запрос с тем же ключом успел сохранить ответ первым."""
+
+
+def get_request_hash(data):
+    payload = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder, ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Хранилище ответов по ключам идемпотентности.
+    Источник истины — таблица IdempotencyKey, перед ней стоит LRU-кэш процесса,
+    поэтому повтор обычно обслуживается без обращения к БД.
+    """
+
+    def __init__(self):
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self):
+        return timedelta(seconds=getattr(settings, 'BILLING_IDEMPOTENCY_TTL', 24 * 60 * 60))
+
+    @property
+    def cache_size(self):
+        return getattr(settings, 'BILLING_IDEMPOTENCY_CACHE_SIZE', 10_000)
+
+    def _remember(self, scope, key, stored):
+        if not self.cache_size:
+            return
+        with self._lock:
+            self._cache[(scope, key)] = stored
+            self._cache.move_to_end((scope, key))
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _from_cache(self, scope, key, expires_before):
+        with self._lock:
+            stored = self._cache.get((scope, key))
+            if stored is None:
+                return None
+            if stored.created_at < expires_before:
+                del self._cache[(scope, key)]
+                return None
+            self._cache.move_to_end((scope, key))
+            return stored
+
+    def get(self, scope, key, request_hash):
+        """
+        Возвращает сохранённый ответ или None.
+        Выбрасывает IdempotencyKeyReused, если ключ пришёл с другим запросом.
+        """
+        expires_before = timezone.now() - self.ttl
+        stored = self._from_cache(scope, key, expires_before)
+
+        if stored is None:
+            row = (
+                IdempotencyKey.objects
+                .filter(scope=scope, key=key, created_at__gte=expires_before)
+                .values_list('request_hash', 'response_status', 'response_body', 'created_at')
+                .first()
+            )
+            if row is None:
+                return None
+            stored = StoredResponse(*row)
+            self._remember(scope, key, stored)
+
+        if stored.request_hash != request_hash:
+            raise IdempotencyKeyReused(f"Ключ {key} уже использован с другим запросом")
+        return stored
+
+    def save(self, scope, key, request_hash, status, body):
+        """
+        Сохраняет ответ в текущей транзакции БД.
+        Выбрасывает DuplicateIdempotencyKey, если ключ уже занят параллельным запросом.
+        Просроченная запись с тем же ключом, которую ещё не удалил purge, заменяется.
+        """
+        # Тело кодируем так же, как рендерер DRF, чтобы повтор совпадал байт в байт
+        body = json.loads(json.dumps(body, cls=JSONEncoder))
+        try:
+            with transaction.atomic():
+                IdempotencyKey.objects.filter(
+                    scope=scope, key=key, created_at__lt=timezone.now() - self.ttl,
+                ).delete()
+                record = IdempotencyKey.objects.create(
+                    scope=scope,
+                    key=key,
+                    request_hash=request_hash,
+                    response_status=status,
+                    response_body=body,
+                )
+        except IntegrityError:
+            raise DuplicateIdempotencyKey(key)
+
+        stored = StoredResponse(request_hash, status, body, record.created_at)
+        transaction.on_commit(lambda: self._remember(scope, key, stored))
+        return stored
+
+    def purge(self, batch_size=1000):
+        """Удаляет просроченные ключи пачками и возвращает число удалённых записей."""
+        expires_before = timezone.now() - self.ttl
+        expired = IdempotencyKey.objects.filter(created_at__lt=expires_before).order_by('pk')
+        deleted = 0
+        while True:
+            pks = list(expired.values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                break
+            deleted += IdempotencyKey.objects.filter(pk__in=pks).delete()[0]
+
+        with self._lock:
+            for cache_key in [k for k, v in self._cache.items() if v.created_at < expires_before]:
+                del self._cache[cache_key]
+        return deleted
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+idempotency_store = IdempotencyStore()
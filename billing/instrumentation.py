@@ -0,0 +1,294 @@
+"""
+Инструментирование запросов биллинга: время по фазам, число SQL-запросов
+и время ожидания блокировок.
+
+Включается настройкой BILLING_INSTRUMENTATION. Выключенный слой почти
+ничего не стоит: middleware снимается Django при старте (MiddlewareNotUsed),
+а phase() и atomic() без активного профиля возвращают готовые объекты
+без замеров.
+
+Результаты запроса отдаются заголовком Server-Timing, накопленные по процессу
+метрики — в текстовом формате Prometheus на /metrics.
+"""
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.backends.signals import connection_created
+
+
+_NOOP = nullcontext()
+
+_current_profile = ContextVar('billing_request_profile', default=None)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def is_enabled():
+    return getattr(settings, 'BILLING_INSTRUMENTATION', False)
+
+
+class RequestProfile:
+    """Замеры одного запроса. Время хранится в секундах."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.queries = 0
+        self.db_time = 0.0
+        self.lock_wait = 0.0
+        self._locking = False
+        # Фазы, которые закрываются вне with (render), см. close()
+        self._open = []
+
+    @contextmanager
+    def phase(self, name, lock=False):
+        queries = self.queries
+        started = time.perf_counter()
+        locking = self._locking
+        self._locking = locking or lock
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self._locking = locking
+            if lock:
+                self.lock_wait += elapsed
+            duration, phase_queries = self.phases.get(name, (0.0, 0))
+            self.phases[name] = (duration + elapsed, phase_queries + self.queries - queries)
+
+    def execute(self, execute, sql, params, many, context):
+        """Обёртка для connection.execute_wrapper."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.db_time += elapsed
+            # Внутри фазы lock время уже учтено целиком
+            if not self._locking and 'FOR UPDATE' in sql:
+                self.lock_wait += elapsed
+
+    def close(self):
+        """Закрывает фазы, оставшиеся открытыми из-за исключения (например, при рендеринге)."""
+        while self._open:
+            self._open.pop().__exit__(None, None, None)
+
+    def server_timing(self, total):
+        entries = [f'{name};dur={duration * 1000:.3f}' for name, (duration, _) in self.phases.items()]
+        entries.append(f'db;desc="{self.queries} queries";dur={self.db_time * 1000:.3f}')
+        entries.append(f'lock-wait;dur={self.lock_wait * 1000:.3f}')
+        entries.append(f'total;dur={total * 1000:.3f}')
+        return ', '.join(entries)
+
+
+def _execute(execute, sql, params, many, context):
+    """
+    Обёртка соединения, которая передаёт запрос профилю текущего запроса.
+    Профиль берётся из ContextVar, поэтому замеряются и запросы async-view,
+    выполненные через sync_to_async в другом потоке со своим соединением.
+    """
+    profile = _current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile.execute(execute, sql, params, many, context)
+
+
+def install(connection, **kwargs):
+    """Ставит _execute на соединение один раз (и как приёмник connection_created)."""
+    if _execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute)
+
+
+def phase(name):
+    """Контекстный менеджер замера фазы текущего запроса."""
+    profile = _current_profile.get()
+    if profile is None:
+        return _NOOP
+    return profile.phase(name)
+
+
+class _TimedAtomic:
+    def __init__(self, atomic, profile):
+        self.atomic = atomic
+        self.profile = profile
+
+    def __enter__(self):
+        with self.profile.phase('lock', lock=True):
+            return self.atomic.__enter__()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self.atomic.__exit__(exc_type, exc_value, traceback)
+
+
+def atomic(using=None):
+    """
+    transaction.atomic(), вход в который учитывается как фаза lock.
+    На SQLite с transaction_mode=IMMEDIATE блокировка записи берётся
+    именно при открытии транзакции.
+    """
+    profile = _current_profile.get()
+    if profile is None:
+        return transaction.atomic(using=using)
+    return _TimedAtomic(transaction.atomic(using=using), profile)
+
+
+class MetricsRegistry:
+    """Счётчики процесса для /metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._requests = {}
+            self._durations = {}
+            self._phases = {}
+            self._queries = {}
+            self._lock_wait = {}
+
+    def observe(self, view, status, profile, total):
+        with self._lock:
+            self._requests[(view, status)] = self._requests.get((view, status), 0) + 1
+
+            buckets, duration_sum, count = self._durations.get(view, ([0] * len(DURATION_BUCKETS), 0.0, 0))
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if total <= bound:
+                    buckets[i] += 1
+            self._durations[view] = (buckets, duration_sum + total, count + 1)
+
+            for name, (duration, queries) in profile.phases.items():
+                phase_sum, phase_count, phase_queries = self._phases.get((view, name), (0.0, 0, 0))
+                self._phases[(view, name)] = (phase_sum + duration, phase_count + 1, phase_queries + queries)
+
+            self._queries[view] = self._queries.get(view, 0) + profile.queries
+            self._lock_wait[view] = self._lock_wait.get(view, 0.0) + profile.lock_wait
+
+    def render(self):
+        """Текстовый формат экспозиции Prometheus 0.0.4."""
+        with self._lock:
+            lines = [
+                '# HELP billing_requests_total Обработанные запросы.',
+                '# TYPE billing_requests_total counter',
+            ]
+            for (view, status), count in sorted(self._requests.items()):
+                lines.append(f'billing_requests_total{{view="{view}",status="{status}"}} {count}')
+
+            lines += [
+                '# HELP billing_request_duration_seconds Время обработки запроса.',
+                '# TYPE billing_request_duration_seconds histogram',
+            ]
+            for view, (buckets, duration_sum, count) in sorted(self._durations.items()):
+                for bound, bucket in zip(DURATION_BUCKETS, buckets):
+                    lines.append(f'billing_request_duration_seconds_bucket{{view="{view}",le="{bound}"}} {bucket}')
+                lines.append(f'billing_request_duration_seconds_bucket{{view="{view}",le="+Inf"}} {count}')
+                lines.append(f'billing_request_duration_seconds_sum{{view="{view}"}} {duration_sum:.6f}')
+                lines.append(f'billing_request_duration_seconds_count{{view="{view}"}} {count}')
+
+            lines += [
+                '# HELP billing_phase_duration_seconds Время фаз обработки запроса.',
+                '# TYPE billing_phase_duration_seconds summary',
+            ]
+            for (view, name), (phase_sum, phase_count, _) in sorted(self._phases.items()):
+                lines.append(f'billing_phase_duration_seconds_sum{{view="{view}",phase="{name}"}} {phase_sum:.6f}')
+                lines.append(f'billing_phase_duration_seconds_count{{view="{view}",phase="{name}"}} {phase_count}')
+
+            lines += [
+                '# HELP billing_phase_queries_total SQL-запросы по фазам.',
+                '# TYPE billing_phase_queries_total counter',
+            ]
+            for (view, name), (_, _, queries) in sorted(self._phases.items()):
+                lines.append(f'billing_phase_queries_total{{view="{view}",phase="{name}"}} {queries}')
+
+            lines += [
+                '# HELP billing_queries_total SQL-запросы.',
+                '# TYPE billing_queries_total counter',
+            ]
+            for view, queries in sorted(self._queries.items()):
+                lines.append(f'billing_queries_total{{view="{view}"}} {queries}')
+
+            lines += [
+                '# HELP billing_lock_wait_seconds_total Время ожидания блокировок.',
+                '# TYPE billing_lock_wait_seconds_total counter',
+            ]
+            for view, lock_wait in sorted(self._lock_wait.items()):
+                lines.append(f'billing_lock_wait_seconds_total{{view="{view}"}} {lock_wait:.6f}')
+
+        return '\n'.join(lines) + '\n'
+
+
+metrics_registry = MetricsRegistry()
+
+
+class InstrumentationMiddleware:
+    """
+    Профилирует запросы: ставит обёртку на соединения с БД, добавляет
+    заголовок Server-Timing и копит метрики по именам URL.
+    Работает и в синхронной, и в асинхронной цепочке middleware, поэтому
+    async-представления под ASGI не получают лишнего перехода между потоками.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not is_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        # Новые соединения любого потока получают обёртку при открытии
+        connection_created.connect(install, dispatch_uid='billing_instrumentation')
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        install(connections[DEFAULT_DB_ALIAS])
+        profile = RequestProfile()
+        token = _current_profile.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            profile.close()
+            _current_profile.reset(token)
+        return self.finish(request, response, profile)
+
+    async def __acall__(self, request):
+        profile = RequestProfile()
+        token = _current_profile.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            profile.close()
+            _current_profile.reset(token)
+        return self.finish(request, response, profile)
+
+    def finish(self, request, response, profile):
+        total = time.perf_counter() - profile.started
+        response['Server-Timing'] = profile.server_timing(total)
+
+        match = getattr(request, 'resolver_match', None)
+        if match is not None and match.url_name:
+            metrics_registry.observe(match.url_name, response.status_code, profile, total)
+        return response
+
+    def process_template_response(self, request, response):
+        # Ответы DRF рендерятся после выхода из view: замеряем рендеринг отдельной фазой
+        profile = _current_profile.get()
+        if profile is not None:
+            render = profile.phase('render')
+            render.__enter__()
+            profile._open.append(render)
+
+            def finish_render(rendered):
+                profile._open.remove(render)
+                render.__exit__(None, None, None)
+
+            response.add_post_render_callback(finish_render)
+        return response
@@ -0,0 +1,100 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from billing.models import Balance, LedgerEntry, PendingTopUp, Transaction
+from billing.money import exponent_of
+from billing.views.transactions.views import record_daily_aggregates
+
+
+class Command(BaseCommand):
+    help = 'Apply top-ups accepted into the write-behind journal'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--loop', action='store_true', help='Работать непрерывно, ожидая новые записи')
+        parser.add_argument('--interval', type=float, default=1.0, help='Пауза (секунды) при пустом журнале')
+
+    def handle(self, *args, **options):
+        applied = 0
+        while True:
+            processed = self.apply_batch(options['batch_size'])
+            applied += processed
+            if processed:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(f'Applied {applied} pending top-ups')
+
+    def apply_batch(self, batch_size):
+        """
+        Проводит пачку записей журнала в одной транзакции БД и возвращает её размер.
+        Если процесс упадёт до коммита, записи останутся в ожидании и будут
+        проведены следующим запуском, уже проведённые второй раз не выбираются.
+        """
+        with transaction.atomic():
+            # skip_locked: параллельные обработчики берут разные пачки
+            pending = list(
+                PendingTopUp.objects
+                .select_for_update(skip_locked=True, of=('self',))
+                .select_related('user', 'balance_currency')
+                .filter(status=PendingTopUp.Status.PENDING)
+                .order_by('id')[:batch_size]
+            )
+            if not pending:
+                return 0
+
+            totals = {}
+            for topup in pending:
+                key = (topup.balance_currency_id, topup.user_id or 0)
+                totals[key] = totals.get(key, Decimal(0)) + topup.delta
+
+            # Одно зачисление на счёт за пачку, счета в порядке ключа
+            failed = {}
+            for key, total in sorted(totals.items()):
+                currency_id, user_id = key
+                account = Balance.objects.account(user_id or None, currency_id)
+                try:
+                    if total:
+                        account.deposit(total, exponent_of(currency_id))
+                    elif not account.exists():
+                        # Записи с нулевой суммой проводятся без зачисления
+                        raise Balance.DoesNotExist
+                except Balance.DoesNotExist:
+                    failed[key] = f"Баланс для валюты {currency_id} не найден"
+
+            now = timezone.now()
+            accepted = []
+            for topup in pending:
+                topup.processed_at = now
+                error = failed.get((topup.balance_currency_id, topup.user_id or 0))
+                if error:
+                    topup.status = PendingTopUp.Status.FAILED
+                    topup.error = error
+                    continue
+                topup.status = PendingTopUp.Status.APPLIED
+                topup.transaction = Transaction(
+                    transaction_type=Transaction.TransactionType.ACCOUNT_TOPUP,
+                    user=topup.user,
+                    amount=topup.amount,
+                    currency_id=topup.currency_id,
+                    gross_currency_id=topup.gross_currency_id,
+                    exchange_rate=topup.exchange_rate,
+                )
+                accepted.append(topup)
+
+            transactions = Transaction.objects.bulk_create([topup.transaction for topup in accepted])
+            LedgerEntry.objects.bulk_create([
+                entry
+                for topup in accepted
+                for entry in LedgerEntry.objects.build(
+                    topup.transaction, [(topup.balance_currency, topup.delta)], user=topup.user,
+                )
+            ])
+            record_daily_aggregates(transactions)
+            PendingTopUp.objects.bulk_update(pending, ['status', 'transaction', 'error', 'processed_at'])
+        return len(pending)
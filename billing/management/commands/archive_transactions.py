@@ -0,0 +1,63 @@
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from billing.models import ArchivedTransaction, Transaction
+
+
+class Command(BaseCommand):
+    help = 'Move transactions older than the retention period into the archive table'
+
+    fields = (
+        'id', 'user_id', 'transaction_type', 'amount', 'currency_id', 'gross_currency_id',
+        'exchange_rate', 'created_at',
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-months', type=int, default=12,
+            help='Сколько последних месяцев оставить в рабочей таблице, считая текущий',
+        )
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options['keep_months'] < 1:
+            raise CommandError('--keep-months должен быть не меньше 1')
+        cutoff = self.cutoff(options['keep_months'])
+
+        archived = 0
+        while True:
+            moved = self.move_chunk(cutoff, options['chunk_size'])
+            if not moved:
+                break
+            archived += moved
+        self.stdout.write(f'Archived {archived} transactions created before {cutoff.date()}')
+
+    def cutoff(self, keep_months):
+        """Начало самого старого из оставляемых месяцев: месяцы уходят в архив целиком."""
+        today = timezone.localdate()
+        month = today.year * 12 + today.month - keep_months
+        first_day = today.replace(year=month // 12, month=month % 12 + 1, day=1)
+        return timezone.make_aware(datetime.combine(first_day, time.min))
+
+    def move_chunk(self, cutoff, chunk_size):
+        """
+        Переносит очередную пачку в одной транзакции БД: вставка в архив
+        и удаление из рабочей таблицы коммитятся вместе, поэтому прерванный
+        запуск можно просто повторить.
+        """
+        with transaction.atomic():
+            rows = list(
+                Transaction.objects
+                .filter(created_at__lt=cutoff)
+                .order_by('id')
+                .values(*self.fields)[:chunk_size]
+            )
+            if not rows:
+                return 0
+            ArchivedTransaction.objects.bulk_create(ArchivedTransaction(**row) for row in rows)
+            # Связи на Transaction без каскадов, поэтому удаление — один DELETE
+            Transaction.objects.filter(id__in=[row['id'] for row in rows]).delete()
+        return len(rows)
@@ -1,10 +1,29 @@
-from django.core.management.base import BaseCommand
-from billing.models import Currency, Balance
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from billing.models import Currency, Balance, LedgerEntry
 
 
 class Command(BaseCommand):
     help = 'Initialize balances'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='ID пользователя; без параметра создаётся общий счёт')
+
     def handle(self, *args, **options):
+        user = None
+        if options['user'] is not None:
+            try:
+                user = User.objects.get(pk=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"Пользователь {options['user']} не найден")
+
         for currency in Currency.objects.all():
-            Balance.objects.get_or_create(currency=currency, amount=100_000)
+            with transaction.atomic():
+                balance, created = Balance.objects.get_or_create(
+                    user=user, currency=currency, shard=0, defaults={'amount': Decimal(100_000)},
+                )
+                if created:
+                    LedgerEntry.objects.open_account(user, currency, balance.amount)
@@ -1,10 +1,12 @@
 from django.core.management.base import BaseCommand
-from billing.models import Currency, Balance
+from billing.currencies import currency_registry
+from billing.models import Currency
 
 
 class Command(BaseCommand):
     help = 'Initialize currencies'
 
     def handle(self, *args, **options):
-        Currency.objects.get_or_create(code='USD', name='United States Dollar')
-        Currency.objects.get_or_create(code='RUB', name='Russian Ruble')
+        Currency.objects.get_or_create(code='USD', defaults={'name': 'United States Dollar'})
+        Currency.objects.get_or_create(code='RUB', defaults={'name': 'Russian Ruble'})
+        currency_registry.invalidate()
@@ -0,0 +1,101 @@
+import csv
+import json
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from billing.currencies import currency_registry
+from billing.models import Currency, ExchangeRate
+from billing.rates import rate_cache
+
+
+class Command(BaseCommand):
+    help = 'Load exchange rate snapshots from CSV/JSON files or directories'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Файлы .csv/.json или каталоги с ними')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rates = {}
+        for path in self.iter_files(options['paths']):
+            for row in self.read_file(path):
+                rate = self.build_rate(path, row)
+                # Повтор той же пары и момента в файлах: побеждает последний
+                rates[(rate.base_id, rate.quote_id, rate.valid_from)] = rate
+
+        with transaction.atomic():
+            ExchangeRate.objects.bulk_create(
+                rates.values(),
+                batch_size=options['batch_size'],
+                update_conflicts=True,
+                unique_fields=['base', 'quote', 'valid_from'],
+                update_fields=['rate', 'updated_at'],
+            )
+        # bulk_create не отправляет сигналы, сбрасываем кэш явно
+        rate_cache.invalidate()
+        self.stdout.write(f'Loaded {len(rates)} exchange rates')
+
+    def iter_files(self, paths):
+        for name in paths:
+            path = Path(name)
+            if path.is_dir():
+                yield from sorted(p for p in path.iterdir() if p.suffix.lower() in ('.csv', '.json'))
+            elif path.is_file():
+                yield path
+            else:
+                raise CommandError(f'Файл {path} не найден')
+
+    def read_file(self, path):
+        """
+        CSV: колонки base, quote, rate, valid_from.
+        JSON: список строк с теми же ключами либо снимок
+        {"valid_from": ..., "quote": "RUB", "rates": {"USD": "85.0", ...}}
+        (или список таких снимков).
+        """
+        if path.suffix.lower() == '.csv':
+            with path.open(newline='', encoding='utf-8') as f:
+                return list(csv.DictReader(f))
+
+        with path.open(encoding='utf-8') as f:
+            try:
+                data = json.load(f)
+            except ValueError as e:
+                raise CommandError(f'{path}: некорректный JSON: {e}')
+
+        rows = []
+        for item in data if isinstance(data, list) else [data]:
+            if isinstance(item, dict) and isinstance(item.get('rates'), dict):
+                rows.extend(
+                    {'base': base, 'quote': item.get('quote'), 'rate': rate, 'valid_from': item.get('valid_from')}
+                    for base, rate in item['rates'].items()
+                )
+            else:
+                rows.append(item)
+        return rows
+
+    def build_rate(self, path, row):
+        try:
+            base = currency_registry.get(str(row['base']).upper())
+            quote = currency_registry.get(str(row['quote']).upper())
+            rate = Decimal(str(row['rate']))
+            valid_from = datetime.fromisoformat(str(row['valid_from']))
+        except (KeyError, TypeError) as e:
+            raise CommandError(f'{path}: в строке {row} нет поля {e}')
+        except Currency.DoesNotExist:
+            raise CommandError(f'{path}: неизвестная валюта в строке {row}')
+        except (InvalidOperation, ValueError):
+            raise CommandError(f'{path}: некорректный курс или дата в строке {row}')
+
+        if rate <= 0:
+            raise CommandError(f'{path}: курс должен быть больше 0 в строке {row}')
+        if base == quote:
+            raise CommandError(f'{path}: валюты пары должны быть разными в строке {row}')
+        if timezone.is_naive(valid_from):
+            valid_from = timezone.make_aware(valid_from)
+
+        return ExchangeRate(base=base, quote=quote, rate=rate, valid_from=valid_from)
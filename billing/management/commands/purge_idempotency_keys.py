@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from billing.idempotency import idempotency_store
+
+
+class Command(BaseCommand):
+    help = 'Delete idempotency keys older than BILLING_IDEMPOTENCY_TTL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        deleted = idempotency_store.purge(batch_size=options['batch_size'])
+        self.stdout.write(f'Deleted {deleted} expired idempotency keys')
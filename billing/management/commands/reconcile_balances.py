@@ -0,0 +1,194 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F, Max, Q, Sum
+from django.db.models.functions import Round
+from django.utils import timezone
+
+from billing.currencies import currency_registry
+from billing.money import exponent_of, from_minor
+from billing.models import (
+    AggregateWatermark,
+    ArchivedTransaction,
+    Balance,
+    LedgerEntry,
+    ReconciledBalance,
+    Transaction,
+)
+from billing.views.transactions.views import BatchTransactionView
+
+
+WATERMARK = 'balance_reconciliation'
+
+HISTORY_MODELS = (ArchivedTransaction, Transaction)
+
+# Операции в рублях без долей копейки: изменение баланса равно сумме со знаком
+# и считается агрегацией в БД
+RUB_SIGNS = {
+    Transaction.TransactionType.ACCOUNT_TOPUP: 1,
+    Transaction.TransactionType.SERVICE_SPEND: -1,
+}
+
+
+class Command(BaseCommand):
+    help = 'Reconcile balances against the net flow of the transaction history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument(
+            '--lag', type=int, default=60,
+            help='Не сохранять в отметку транзакции моложе стольки секунд: более ранний ID может ещё не быть закоммичен',
+        )
+        parser.add_argument('--rebuild', action='store_true', help='Пересчитать историю с начала')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        cutoff = timezone.now() - timedelta(seconds=options['lag'])
+        errors = []
+
+        with transaction.atomic():
+            watermark = self.lock_watermark()
+            if options['rebuild']:
+                ReconciledBalance.objects.all().delete()
+                watermark.last_transaction_id = 0
+            previous = watermark.last_transaction_id
+            last = max(
+                model.objects.filter(id__gt=previous, created_at__lt=cutoff).aggregate(last=Max('id'))['last'] or 0
+                for model in HISTORY_MODELS
+            ) or previous
+
+            reconciled = {
+                (row.user_id, row.currency_id): row for row in ReconciledBalance.objects.all()
+            }
+            flows = self.flows(previous, last, chunk_size, errors)
+            self.save_checkpoint(reconciled, flows)
+            watermark.last_transaction_id = last
+            watermark.save()
+
+        expected = {key: row.amount for key, row in reconciled.items()}
+        # Суммы журнала и балансов в БД: по целым minor-колонкам при BILLING_MINOR_UNITS
+        total = Sum('amount_minor') if settings.BILLING_MINOR_UNITS else Sum('amount')
+        # Входящие остатки счетов есть только в журнале: проводки без транзакции
+        openings = (
+            LedgerEntry.objects
+            .filter(transaction=None, account=LedgerEntry.Account.CLIENT)
+            .values('user', 'currency')
+            .annotate(total=total)
+            .order_by()
+        )
+        for row in openings:
+            add(expected, (row['user'], row['currency']), stored_amount(row['total'], row['currency']))
+        # Транзакции после отметки не сохраняются, но уже изменили балансы
+        for key, amount in self.flows(last, None, chunk_size, errors).items():
+            add(expected, key, amount)
+
+        balances = {
+            (row['user'], row['currency']): stored_amount(row['total'], row['currency'])
+            for row in Balance.objects.values('user', 'currency').annotate(total=total).order_by()
+        }
+        for key in sorted(set(expected) | set(balances), key=lambda key: (key[1], key[0] or 0)):
+            user_id, currency_id = key
+            actual = Balance.quantize(balances.get(key) or Decimal(0))
+            wanted = Balance.quantize(expected.get(key, Decimal(0)))
+            if actual != wanted:
+                errors.append(
+                    f"Счёт {currency_id}/{user_id or '-'}: баланс {actual}, по транзакциям {wanted}, "
+                    f"разница {actual - wanted}"
+                )
+
+        for error in errors:
+            self.stderr.write(error)
+        if errors:
+            # Счета с операциями во время проверки могут разойтись временно: стоит перепроверить
+            raise CommandError(f'Найдено расхождений: {len(errors)}')
+        self.stdout.write(
+            f'Balances are consistent: {len(balances)} accounts checked, reconciled up to transaction {last}'
+        )
+
+    def lock_watermark(self):
+        AggregateWatermark.objects.get_or_create(name=WATERMARK)
+        return AggregateWatermark.objects.select_for_update().get(name=WATERMARK)
+
+    def flows(self, after, until, chunk_size, errors):
+        """
+        Изменения счетов транзакциями с ID в интервале (after, until]:
+        {(user_id, код валюты): сумма}. Рублёвые операции с целыми копейками
+        суммируются в БД, остальные (курсы, доли копейки) читаются потоком
+        и пересчитываются теми же правилами, что и при проведении.
+        Архивные транзакции учитываются наравне с рабочей таблицей.
+        """
+        totals = {}
+        for model in HISTORY_MODELS:
+            rows = model.objects.filter(id__gt=after)
+            if until is not None:
+                rows = rows.filter(id__lte=until)
+            self.add_flows(totals, rows, chunk_size, errors)
+        return totals
+
+    def add_flows(self, totals, rows, chunk_size, errors):
+        aggregated = Q(
+            currency_id='RUB', transaction_type__in=list(RUB_SIGNS), amount=Round(F('amount'), exponent_of('RUB')),
+        )
+        for row in (
+            rows.filter(aggregated)
+            .values('user', 'transaction_type')
+            .annotate(total=Sum('amount'))
+            .order_by()
+        ):
+            add(totals, (row['user'], 'RUB'), RUB_SIGNS[row['transaction_type']] * row['total'])
+
+        streamed = (
+            rows.exclude(aggregated)
+            .order_by()
+            .values_list('id', 'user_id', 'transaction_type', 'amount', 'currency_id', 'gross_currency_id',
+                         'exchange_rate')
+            .iterator(chunk_size=chunk_size)
+        )
+        for pk, user_id, transaction_type, amount, currency_id, gross_currency_id, exchange_rate in streamed:
+            view = BatchTransactionView.transaction_views[transaction_type]()
+            try:
+                changes = view.get_balance_changes({
+                    'sum': amount,
+                    'currency_id': currency_registry.get(currency_id),
+                    'gross_currency_id': currency_registry.get(gross_currency_id) if gross_currency_id else None,
+                    'exchange_rate': exchange_rate,
+                })
+            except ValueError as e:
+                errors.append(f"Транзакция {pk} не пересчитывается: {e}")
+                continue
+            for currency, delta in changes:
+                delta = Balance.quantize(delta, exponent=currency.exponent)
+                if delta:
+                    add(totals, (user_id, currency.code), delta)
+
+    def save_checkpoint(self, reconciled, flows):
+        """Прибавляет изменения к сохранённым итогам сверки."""
+        changed, created = [], []
+        now = timezone.now()
+        for (user_id, currency_id), amount in flows.items():
+            row = reconciled.get((user_id, currency_id))
+            if row is None:
+                row = reconciled[(user_id, currency_id)] = ReconciledBalance(
+                    user_id=user_id, currency_id=currency_id, amount=Decimal(0),
+                )
+                created.append(row)
+            else:
+                changed.append(row)
+            row.amount = Balance.quantize(row.amount + amount)
+            row.updated_at = now
+        ReconciledBalance.objects.bulk_update(changed, ['amount', 'updated_at'])
+        ReconciledBalance.objects.bulk_create(created)
+
+
+def add(totals, key, amount):
+    totals[key] = totals.get(key, Decimal(0)) + amount
+
+
+def stored_amount(total, currency_id):
+    """Сумма, агрегированная в БД, как Decimal: из минимальных единиц при BILLING_MINOR_UNITS."""
+    if total is None or not settings.BILLING_MINOR_UNITS:
+        return total
+    return from_minor(total, exponent_of(currency_id))
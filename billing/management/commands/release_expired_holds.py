@@ -0,0 +1,58 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from billing.models import Balance, Hold
+
+
+class Command(BaseCommand):
+    help = 'Release service spend holds that expired without capture'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--loop', action='store_true', help='Работать непрерывно, ожидая истечения новых холдов')
+        parser.add_argument('--interval', type=float, default=10.0, help='Пауза (секунды), когда истёкших холдов нет')
+
+    def handle(self, *args, **options):
+        released = 0
+        while True:
+            processed = self.release_batch(options['batch_size'])
+            released += processed
+            if processed:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(f'Released {released} expired holds')
+
+    def release_batch(self, batch_size):
+        """
+        Снимает пачку истёкших холдов в одной транзакции БД и возвращает её размер.
+        Резерв возвращается одним UPDATE на шард баланса за пачку.
+        """
+        with transaction.atomic():
+            # skip_locked: холд, который сейчас списывают или отменяют, достанется следующей пачке
+            expired = list(
+                Hold.objects
+                .select_for_update(skip_locked=True)
+                .filter(status=Hold.Status.ACTIVE, expires_at__lte=timezone.now())
+                .order_by('expires_at')
+                .values_list('id', 'balance_id', 'held')[:batch_size]
+            )
+            if not expired:
+                return 0
+
+            totals = {}
+            for _, balance_id, held in expired:
+                totals[balance_id] = totals.get(balance_id, Decimal(0)) + held
+            # Шарды в порядке ключа, как при блокировке нескольких счетов
+            for balance_id, held in sorted(totals.items()):
+                Balance.objects.release(balance_id, held)
+
+            Hold.objects.filter(id__in=[pk for pk, _, _ in expired]).update(
+                status=Hold.Status.EXPIRED, processed_at=timezone.now(),
+            )
+        return len(expired)
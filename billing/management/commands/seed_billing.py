@@ -0,0 +1,284 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from billing.currencies import currency_registry
+from billing.models import (
+    ArchivedTransaction, Balance, Currency, ExchangeRate, LedgerEntry, Transaction, minor_units,
+)
+from billing.money import MIRROR_ROUNDING, to_minor
+from billing.rates import rate_cache
+from billing.views.transactions.views import BatchTransactionView
+
+
+# Реальные коды идут первыми, дальше генерируются коды вида X0001
+CURRENCY_CODES = (
+    'RUB', 'USD', 'EUR', 'CNY', 'GBP', 'JPY', 'CHF', 'KZT', 'TRY', 'AED',
+    'INR', 'BYN', 'AMD', 'GEL', 'UZS', 'HKD', 'SGD', 'CAD', 'AUD', 'SEK',
+)
+
+TYPE_WEIGHTS = {
+    Transaction.TransactionType.SERVICE_SPEND: 50,
+    Transaction.TransactionType.ACCOUNT_TOPUP: 30,
+    Transaction.TransactionType.CONVERSION: 20,
+}
+
+SEED_USERNAME = 'seed_user_{:07d}'
+
+
+class Command(BaseCommand):
+    help = 'Generate currencies, users, balances and transactions for large-scale testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--currencies', type=int, default=5, help='Число валют, включая RUB')
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--transactions', type=int, default=100_000)
+        parser.add_argument('--days', type=int, default=365, help='За сколько последних дней распределить транзакции')
+        parser.add_argument('--batch-size', type=int, default=20_000)
+        parser.add_argument(
+            '--foreign-share', type=float, default=0.2,
+            help='Доля пополнений и покупок в валюте, отличной от RUB',
+        )
+        parser.add_argument(
+            '--skip-ledger', action='store_true',
+            help='Не писать проводки транзакций (быстрее); входящие остатки пишутся всегда, verify_ledger такие данные не пройдут',
+        )
+        parser.add_argument('--seed', type=int, default=None, help='Зерно генератора для воспроизводимых данных')
+
+    def handle(self, *args, **options):
+        if options['currencies'] < 2:
+            raise CommandError('--currencies должен быть не меньше 2: операции идут между RUB и другой валютой')
+        if options['users'] < 1:
+            raise CommandError('--users должен быть не меньше 1')
+
+        self.random = random.Random(options['seed'])
+        started = time.perf_counter()
+
+        currencies = self.seed_currencies(options['currencies'])
+        rates = self.seed_rates(currencies, options['days'])
+        user_ids = self.seed_users(options['users'])
+
+        net = self.seed_transactions(
+            currencies, rates, user_ids,
+            count=options['transactions'],
+            days=options['days'],
+            batch_size=options['batch_size'],
+            foreign_share=options['foreign_share'],
+            ledger=not options['skip_ledger'],
+        )
+        accounts = self.seed_balances(currencies, user_ids, net)
+
+        if getattr(settings, 'BILLING_DAILY_AGGREGATES_INLINE', True):
+            call_command('update_daily_aggregates', rebuild=True, stdout=self.stdout)
+
+        self.stdout.write(
+            f"Seeded {len(currencies)} currencies, {len(user_ids)} users, {accounts} new balances, "
+            f"{options['transactions']} transactions in {time.perf_counter() - started:.1f}s"
+        )
+
+    def seed_currencies(self, count):
+        codes = list(CURRENCY_CODES[:count])
+        codes += [f'X{number:04d}' for number in range(1, count - len(codes) + 1)]
+        Currency.objects.bulk_create(
+            [Currency(code=code, name=f'Seed {code}') for code in codes], ignore_conflicts=True,
+        )
+        currency_registry.invalidate()
+        return {currency.code: currency for currency in Currency.objects.filter(code__in=codes)}
+
+    def seed_rates(self, currencies, days):
+        """Курс RUB за единицу каждой валюты на начало периода."""
+        rates = {code: Decimal(self.random.randint(100, 15_000)) / 100 for code in currencies if code != 'RUB'}
+        valid_from = timezone.now() - timedelta(days=days + 1)
+        ExchangeRate.objects.bulk_create(
+            [ExchangeRate(base_id=code, quote_id='RUB', rate=rate, valid_from=valid_from) for code, rate in rates.items()],
+            ignore_conflicts=True,
+        )
+        rate_cache.invalidate()
+        return rates
+
+    def seed_users(self, count):
+        usernames = [SEED_USERNAME.format(number) for number in range(count)]
+        # Без паролей: это данные для нагрузки, а не учётные записи
+        User.objects.bulk_create(
+            [User(username=username, password='!') for username in usernames],
+            batch_size=5000,
+            ignore_conflicts=True,
+        )
+        return list(User.objects.filter(username__in=usernames).order_by('id').values_list('id', flat=True))
+
+    def seed_transactions(self, currencies, rates, user_ids, count, days, batch_size, foreign_share, ledger):
+        """
+        Пишет транзакции пачками через executemany с явными ID и датами
+        (bulk_create перезаписал бы created_at текущим временем).
+        Возвращает суммарное изменение счетов {(user_id, код валюты): сумма}.
+        """
+        views = {transaction_type: view() for transaction_type, view in BatchTransactionView.transaction_views.items()}
+        types = list(TYPE_WEIGHTS)
+        weights = list(TYPE_WEIGHTS.values())
+        rub = currencies['RUB']
+        foreign = [currency for code, currency in currencies.items() if code != 'RUB']
+        now = timezone.now()
+        period = days * 24 * 60 * 60
+
+        txn_fields = (
+            'id', 'transaction_type', 'amount', 'currency', 'gross_currency', 'exchange_rate', 'user', 'created_at',
+        )
+        entry_fields = ('transaction', 'user', 'currency', 'account', 'amount', 'amount_minor', 'created_at')
+        # Архив хранит исходные ID: новые не должны с ними совпасть
+        next_id = max(
+            model.objects.aggregate(last=Max('id'))['last'] or 0 for model in (Transaction, ArchivedTransaction)
+        ) + 1
+
+        net = {}
+        written = 0
+        while written < count:
+            size = min(batch_size, count - written)
+            # Даты внутри пачки растут вместе с ID, как у настоящей ленты
+            offsets = sorted(self.random.random() * period for _ in range(size))
+            txn_rows, entry_rows = [], []
+            for offset in offsets:
+                pk = next_id
+                next_id += 1
+                transaction_type = self.random.choices(types, weights)[0]
+                user_id = self.random.choice(user_ids)
+                other = self.random.choice(foreign)
+                rate = rates[other.code] * Decimal(self.random.randint(95, 105)) / 100
+                created_at = now - timedelta(seconds=period - offset)
+                amount = Decimal(self.random.randint(100, 500_000)) / 100
+
+                if transaction_type == Transaction.TransactionType.CONVERSION:
+                    currency, gross_currency = (other, rub) if self.random.random() < 0.5 else (rub, other)
+                elif self.random.random() < foreign_share:
+                    currency, gross_currency = other, rub
+                else:
+                    currency, gross_currency, rate = rub, None, None
+
+                data = {'sum': amount, 'currency_id': currency, 'gross_currency_id': gross_currency, 'exchange_rate': rate}
+                txn_rows.append((
+                    pk, transaction_type, amount, currency.code,
+                    gross_currency.code if gross_currency else None, rate, user_id, created_at,
+                ))
+                for balance_currency, delta in views[transaction_type].get_balance_changes(data):
+                    delta = Balance.quantize(delta, exponent=balance_currency.exponent)
+                    if not delta:
+                        continue
+                    key = (user_id, balance_currency.code)
+                    net[key] = net.get(key, Decimal(0)) + delta
+                    if ledger:
+                        minor = to_minor(delta, balance_currency.exponent, rounding=MIRROR_ROUNDING)
+                        entry_rows.append((
+                            pk, user_id, balance_currency.code, LedgerEntry.Account.CLIENT, delta, minor, created_at,
+                        ))
+                        entry_rows.append((
+                            pk, user_id, balance_currency.code, LedgerEntry.Account.EXTERNAL, -delta, -minor, created_at,
+                        ))
+
+            with transaction.atomic():
+                insert_rows(Transaction, txn_fields, txn_rows)
+                insert_rows(LedgerEntry, entry_fields, entry_rows)
+            written += size
+            self.stdout.write(f'  {written}/{count} transactions')
+
+        reset_sequences(Transaction)
+        return net
+
+    def seed_balances(self, currencies, user_ids, net):
+        """
+        Создаёт недостающие балансы со входящим остатком, которого хватает
+        на все сгенерированные списания, и добавляет изменения к существующим.
+        Существующему балансу, который ушёл бы в минус, тоже добавляется
+        входящий остаток. Возвращает число созданных балансов.
+        """
+        # Изменения пишутся в нулевой шард: проверяем его доступный остаток
+        existing = {
+            (user_id, code): amount - held
+            for user_id, code, amount, held in Balance.objects.filter(
+                user_id__in=user_ids, currency__in=currencies, shard=0,
+            ).values_list('user_id', 'currency_id', 'amount', 'held')
+        }
+        created, openings = [], []
+        with transaction.atomic():
+            for user_id in user_ids:
+                for code in currencies:
+                    delta = net.get((user_id, code), Decimal(0))
+                    if (user_id, code) in existing:
+                        shortfall = -(existing[(user_id, code)] + delta)
+                        if shortfall > 0:
+                            opening = Decimal(100_000) + shortfall
+                            delta += opening
+                            openings.extend(
+                                LedgerEntry.objects.build(None, [(currencies[code], opening)], user=User(pk=user_id))
+                            )
+                        if delta:
+                            Balance.objects.filter(user_id=user_id, currency_id=code, shard=0).update(
+                                amount=F('amount') + delta,
+                                amount_minor=minor_units(F('amount') + delta),
+                                version=F('version') + 1,
+                            )
+                        continue
+                    opening = Decimal(100_000) + max(-delta, Decimal(0))
+                    created.append(Balance(
+                        user_id=user_id, currency_id=code, amount=opening + delta,
+                        amount_minor=to_minor(opening + delta, currencies[code].exponent, rounding=MIRROR_ROUNDING),
+                    ))
+                    # Входящий остаток нужен reconcile_balances и при --skip-ledger
+                    openings.extend(LedgerEntry.objects.build(None, [(currencies[code], opening)], user=User(pk=user_id)))
+            Balance.objects.bulk_create(created, batch_size=5000)
+            LedgerEntry.objects.bulk_create(openings, batch_size=5000)
+        return len(created)
+
+
+def insert_rows(model, fields, rows):
+    """INSERT ... VALUES через executemany, минуя создание моделей."""
+    if not rows:
+        return
+    opts = model._meta
+    columns = [opts.get_field(name) for name in fields]
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        connection.ops.quote_name(opts.db_table),
+        ', '.join(connection.ops.quote_name(field.column) for field in columns),
+        ', '.join(['%s'] * len(columns)),
+    )
+    # Обёртка соединения, а не прокси django.db.connection: прокси заметно
+    # дорог на миллионах значений. Ключи и строки драйвер принимает как есть,
+    # суммы и даты приводятся один раз на значение: у проводок они повторяются
+    wrapper = connections[DEFAULT_DB_ALIAS]
+    converters = [
+        _Prepared(field, wrapper) if field.get_internal_type() in ('DecimalField', 'DateTimeField') else None
+        for field in columns
+    ]
+    with wrapper.cursor() as cursor:
+        cursor.executemany(sql, [
+            [value if convert is None or value is None else convert[value] for convert, value in zip(converters, row)]
+            for row in rows
+        ])
+
+
+class _Prepared(dict):
+    """Кэш значений поля, приведённых к виду для БД."""
+
+    def __init__(self, field, wrapper):
+        super().__init__()
+        self.field = field
+        self.wrapper = wrapper
+
+    def __missing__(self, value):
+        prepared = self[value] = self.field.get_db_prep_save(value, self.wrapper)
+        return prepared
+
+
+def reset_sequences(model):
+    """После вставки с явными ID сдвигаем последовательность первичного ключа (PostgreSQL)."""
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [model]):
+            cursor.execute(sql)
@@ -0,0 +1,37 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import ProtectedError
+from billing.models import Balance
+
+
+class Command(BaseCommand):
+    help = 'Split an account balance into N shards (N=1 merges it back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('currency', help='Код валюты счёта')
+        parser.add_argument('--shards', type=int, required=True)
+        parser.add_argument('--user', type=int, help='ID пользователя; без параметра — общий счёт')
+
+    def handle(self, *args, **options):
+        if options['shards'] < 1:
+            raise CommandError('--shards должно быть не меньше 1')
+
+        user = None
+        if options['user'] is not None:
+            try:
+                user = User.objects.get(pk=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"Пользователь {options['user']} не найден")
+
+        currency = options['currency'].upper()
+        account = Balance.objects.account(user, currency)
+        try:
+            account.reshard(options['shards'])
+        except Balance.DoesNotExist:
+            raise CommandError(f'Баланс для валюты {currency} не найден')
+        except ValueError as e:
+            raise CommandError(str(e))
+        except ProtectedError:
+            raise CommandError(f'На удаляемые шарды счёта {currency} ссылаются другие записи')
+
+        self.stdout.write(f"Balance {currency} split into {options['shards']} shards, total {account.total()}")
@@ -0,0 +1,64 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from billing.models import Balance, BalanceSnapshot, LedgerEntry
+
+
+class Command(BaseCommand):
+    help = 'Checkpoint account balances from ledger entries added since the previous snapshot'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lag', type=int, default=60,
+            help='Не учитывать проводки моложе стольки секунд: более ранний ID может ещё не быть закоммичен',
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(seconds=options['lag'])
+
+        with transaction.atomic():
+            # Каждый запуск учитывает проводки в интервале (previous, last] для всех
+            # счетов сразу, поэтому последний снимок счёта покрывает все его проводки до previous
+            previous = BalanceSnapshot.objects.aggregate(last=Max('last_entry_id'))['last'] or 0
+            last = LedgerEntry.objects.filter(
+                id__gt=previous, created_at__lt=cutoff,
+            ).aggregate(last=Max('id'))['last']
+            if last is None:
+                self.stdout.write('No new ledger entries')
+                return
+
+            # Coalesce: общий счёт без пользователя тоже должен найти свой снимок
+            latest = (
+                BalanceSnapshot.objects
+                .annotate(user_key=Coalesce('user', 0))
+                .filter(currency=OuterRef('currency'), user_key=Coalesce(OuterRef('user'), 0))
+                .order_by('-last_entry_id')
+                .values('amount')[:1]
+            )
+            changes = (
+                LedgerEntry.objects
+                .filter(account=LedgerEntry.Account.CLIENT, id__gt=previous, id__lte=last)
+                .values('user', 'currency')
+                .annotate(delta=Sum('amount'))
+                .annotate(previous_amount=Subquery(latest))
+                .order_by()
+            )
+
+            taken_at = timezone.now()
+            snapshots = BalanceSnapshot.objects.bulk_create(
+                BalanceSnapshot(
+                    user_id=row['user'],
+                    currency_id=row['currency'],
+                    amount=Balance.quantize((row['previous_amount'] or 0) + row['delta']),
+                    last_entry_id=last,
+                    taken_at=taken_at,
+                )
+                for row in changes
+            )
+
+        self.stdout.write(f'Saved {len(snapshots)} snapshots up to ledger entry {last}')
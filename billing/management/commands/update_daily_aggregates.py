@@ -0,0 +1,109 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from billing.models import AggregateWatermark, ArchivedTransaction, Transaction, TransactionDailyAggregate
+
+
+WATERMARK = 'transaction_daily'
+
+
+class Command(BaseCommand):
+    help = 'Catch up daily transaction aggregates past the watermark'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument(
+            '--lag', type=int, default=60,
+            help='Не трогать транзакции моложе стольки секунд: более ранний ID может ещё не быть закоммичен',
+        )
+        parser.add_argument('--rebuild', action='store_true', help='Пересчитать агрегаты по всей таблице')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            self.rebuild()
+        elif getattr(settings, 'BILLING_DAILY_AGGREGATES_INLINE', True):
+            # Агрегаты уже обновлены в транзакциях операций: только сдвигаем отметку,
+            # чтобы переход в отложенный режим не посчитал их второй раз
+            with transaction.atomic():
+                watermark = self.lock_watermark()
+                watermark.last_transaction_id = max(
+                    watermark.last_transaction_id, Transaction.objects.aggregate(last=Max('id'))['last'] or 0,
+                )
+                watermark.save()
+            self.stdout.write(f'Inline mode, watermark moved to {watermark.last_transaction_id}')
+        else:
+            processed = self.catch_up(options['batch_size'], timedelta(seconds=options['lag']))
+            self.stdout.write(f'Aggregated {processed} transactions')
+
+    def lock_watermark(self):
+        AggregateWatermark.objects.get_or_create(name=WATERMARK)
+        return AggregateWatermark.objects.select_for_update().get(name=WATERMARK)
+
+    def catch_up(self, batch_size, lag):
+        cutoff = timezone.now() - lag
+        processed = 0
+        while True:
+            with transaction.atomic():
+                watermark = self.lock_watermark()
+                rows = list(
+                    Transaction.objects
+                    .filter(id__gt=watermark.last_transaction_id)
+                    .order_by('id')
+                    .values_list('id', 'created_at', 'currency_id', 'transaction_type', 'amount')[:batch_size]
+                )
+                fresh = next((i for i, row in enumerate(rows) if row[1] >= cutoff), None)
+                if fresh is not None:
+                    rows = rows[:fresh]
+                if not rows:
+                    return processed
+
+                totals = {}
+                for _, created_at, currency_id, transaction_type, amount in rows:
+                    key = (timezone.localdate(created_at), currency_id, transaction_type)
+                    total, count = totals.get(key, (Decimal(0), 0))
+                    totals[key] = (total + amount, count + 1)
+                TransactionDailyAggregate.objects.add_totals(totals)
+
+                watermark.last_transaction_id = rows[-1][0]
+                watermark.save()
+                processed += len(rows)
+
+            if fresh is not None:
+                return processed
+
+    def rebuild(self):
+        with transaction.atomic():
+            watermark = self.lock_watermark()
+            # Архивные транзакции тоже входят в обороты
+            models = (ArchivedTransaction, Transaction)
+            last_id = max(model.objects.aggregate(last=Max('id'))['last'] or 0 for model in models)
+            TransactionDailyAggregate.objects.all().delete()
+            totals = {}
+            for model in models:
+                for row in (
+                    model.objects
+                    .filter(id__lte=last_id)
+                    .annotate(day=TruncDate('created_at'))
+                    .values('day', 'currency_id', 'transaction_type')
+                    .annotate(amount=Sum('amount'), count=Count('id'))
+                    .order_by()
+                ):
+                    key = (row['day'], row['currency_id'], row['transaction_type'])
+                    total, count = totals.get(key, (Decimal(0), 0))
+                    totals[key] = (total + row['amount'], count + row['count'])
+            TransactionDailyAggregate.objects.bulk_create(
+                TransactionDailyAggregate(
+                    day=day, currency_id=currency_id, transaction_type=transaction_type, amount=amount, count=count,
+                )
+                for (day, currency_id, transaction_type), (amount, count) in totals.items()
+            )
+            watermark.last_transaction_id = last_id
+            watermark.save()
+        self.stdout.write(f'Aggregates rebuilt up to transaction {last_id}')
@@ -0,0 +1,119 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, Sum
+
+from billing.models import Balance, BalanceSnapshot, LedgerEntry
+from billing.money import MIRROR_ROUNDING, exponent_of, from_minor, to_minor
+
+
+def account_key(user_id, currency_id):
+    # Тот же порядок, что и order_by(currency, user NULLS FIRST)
+    return currency_id, user_id is not None, user_id or 0
+
+
+class Command(BaseCommand):
+    help = 'Stream-check ledger entries against balance snapshots and current balances'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        errors = []
+        # При BILLING_MINOR_UNITS суммы читаются из целых minor-колонок, снимки
+        # переводятся в минимальные единицы, а в сообщения выводятся как Decimal
+        self.minor = settings.BILLING_MINOR_UNITS
+        field = 'amount_minor' if self.minor else 'amount'
+        self.zero = 0 if self.minor else Decimal(0)
+        if self.minor and (
+            Balance.objects.filter(amount_minor=None).exists() or LedgerEntry.objects.filter(amount_minor=None).exists()
+        ):
+            raise CommandError('Есть балансы или проводки без amount_minor: сверка в минимальных единицах невозможна')
+
+        unbalanced = (
+            LedgerEntry.objects
+            .values('transaction_id', 'currency_id')
+            .annotate(total=Sum(field))
+            .exclude(total=0)
+            .order_by()
+        )
+        for row in unbalanced.iterator(chunk_size=chunk_size):
+            errors.append(
+                f"Проводки транзакции {row['transaction_id']} в {row['currency_id']} не сходятся: "
+                f"{self.show(row['total'], row['currency_id'])}"
+            )
+
+        order = ('currency_id', F('user_id').asc(nulls_first=True))
+        entries = (
+            LedgerEntry.objects
+            .filter(account=LedgerEntry.Account.CLIENT)
+            .order_by(*order, 'id')
+            .values_list('user_id', 'currency_id', 'id', field)
+            .iterator(chunk_size=chunk_size)
+        )
+        snapshots = (
+            BalanceSnapshot.objects
+            .order_by(*order, 'last_entry_id')
+            .values_list('user_id', 'currency_id', 'last_entry_id', 'amount')
+            .iterator(chunk_size=chunk_size)
+        )
+        balances = {
+            account_key(row['user'], row['currency']): row['total']
+            for row in Balance.objects.values('user', 'currency').annotate(total=Sum(field)).order_by()
+        }
+
+        ledger_totals = self.walk(entries, snapshots, errors)
+
+        for key in sorted(set(balances) | set(ledger_totals)):
+            expected = ledger_totals.get(key, self.zero)
+            actual = balances.get(key, self.zero)
+            if expected != actual:
+                currency_id, _, user_id = key
+                errors.append(
+                    f"Счёт {currency_id}/{user_id or '-'}: баланс {self.show(actual, currency_id)}, "
+                    f"по журналу {self.show(expected, currency_id)}"
+                )
+
+        for error in errors:
+            self.stderr.write(error)
+        if errors:
+            raise CommandError(f'Найдено расхождений: {len(errors)}')
+        self.stdout.write(f'Ledger is consistent: {len(ledger_totals)} accounts checked')
+
+    def walk(self, entries, snapshots, errors):
+        """
+        Один проход по отсортированным проводкам и снимкам: на каждом снимке
+        накопленная сумма проводок счёта должна совпасть с его остатком.
+        Возвращает итоги по счетам.
+        """
+        totals = {}
+        snapshot = next(snapshots, None)
+        for user_id, currency_id, entry_id, amount in entries:
+            key = account_key(user_id, currency_id)
+            snapshot = self.check_snapshots(snapshots, snapshot, totals, errors, until=(key, entry_id))
+            totals[key] = totals.get(key, self.zero) + amount
+        self.check_snapshots(snapshots, snapshot, totals, errors, until=None)
+        return totals
+
+    def check_snapshots(self, snapshots, snapshot, totals, errors, until):
+        """Сверяет снимки, которые в порядке обхода идут раньше проводки until."""
+        while snapshot is not None:
+            user_id, currency_id, last_entry_id, amount = snapshot
+            key = account_key(user_id, currency_id)
+            if until is not None and (key, last_entry_id) >= until:
+                return snapshot
+            expected = totals.get(key, self.zero)
+            if self.minor:
+                amount = to_minor(amount, exponent_of(currency_id), rounding=MIRROR_ROUNDING)
+            if expected != amount:
+                errors.append(
+                    f"Снимок {currency_id}/{user_id or '-'} до #{last_entry_id}: {self.show(amount, currency_id)}, "
+                    f"по журналу {self.show(expected, currency_id)}"
+                )
+            snapshot = next(snapshots, None)
+        return None
+
+    def show(self, amount, currency_id):
+        return from_minor(amount, exponent_of(currency_id)) if self.minor else amount
@@ -0,0 +1,31 @@
+# Generated by Django 6.0.1 on 2026-10-18 06:16
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0002_transaction_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=50, verbose_name='Область ключа')),
+                ('key', models.CharField(max_length=255, verbose_name='Ключ идемпотентности')),
+                ('request_hash', models.CharField(max_length=64, verbose_name='Хэш запроса')),
+                ('response_status', models.PositiveSmallIntegerField(verbose_name='HTTP-статус ответа')),
+                ('response_body', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Тело ответа')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата создания записи')),
+            ],
+            options={
+                'verbose_name': 'Ключ идемпотентности',
+                'verbose_name_plural': 'Ключи идемпотентности',
+                'constraints': [models.UniqueConstraint(fields=('scope', 'key'), name='billing_idempotency_scope_key_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 6.0.1 on 2026-10-18 06:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def number_duplicate_balances(apps, schema_editor):
+    """
+    Несколько общих балансов одной валюты (init_balances мог создать дубликаты)
+    становятся шардами одного счёта, иначе уникальное ограничение не применится.
+    """
+    Balance = apps.get_model('billing', 'Balance')
+    accounts = {}
+    for balance in Balance.objects.order_by('pk'):
+        accounts.setdefault(balance.currency_id, []).append(balance)
+
+    for shards in accounts.values():
+        if len(shards) == 1:
+            continue
+        for number, balance in enumerate(shards):
+            balance.shard = number
+            balance.shard_count = len(shards)
+            balance.save(update_fields=['shard', 'shard_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0003_idempotency_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='balance',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Номер шарда'),
+        ),
+        migrations.AddField(
+            model_name='balance',
+            name='shard_count',
+            field=models.PositiveSmallIntegerField(default=1, verbose_name='Число шардов счёта'),
+        ),
+        migrations.AddField(
+            model_name='balance',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='balances', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.RunPython(number_duplicate_balances, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='balance',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', False)), fields=('user', 'currency', 'shard'), name='billing_balance_user_currency_shard_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='balance',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', True)), fields=('currency', 'shard'), name='billing_balance_global_currency_shard_uniq'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 6.0.1 on 2026-10-18 06:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0004_balance_user_shards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AggregateWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Агрегат')),
+                ('last_transaction_id', models.BigIntegerField(default=0, verbose_name='ID последней учтённой транзакции')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Отметка пересчёта агрегатов',
+                'verbose_name_plural': 'Отметки пересчёта агрегатов',
+            },
+        ),
+        migrations.CreateModel(
+            name='TransactionDailyAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('transaction_type', models.CharField(choices=[('conversion', 'Конвертация валюты'), ('service_spend', 'Покупка услуги'), ('account_topup', 'Пополнение аккаунта')], max_length=50, verbose_name='Тип транзакции')),
+                ('amount', models.DecimalField(decimal_places=5, default=0, max_digits=30, verbose_name='Сумма')),
+                ('count', models.PositiveBigIntegerField(default=0, verbose_name='Число транзакций')),
+                ('currency', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='daily_aggregates', to='billing.currency', verbose_name='Валюта')),
+            ],
+            options={
+                'verbose_name': 'Дневной оборот',
+                'verbose_name_plural': 'Дневные обороты',
+                'constraints': [models.UniqueConstraint(fields=('day', 'currency', 'transaction_type'), name='billing_daily_agg_day_cur_type_uniq')],
+            },
+        ),
+    ]
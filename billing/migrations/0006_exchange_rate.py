@@ -0,0 +1,30 @@
+# Generated by Django 6.0.1 on 2026-10-18 06:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0005_daily_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rate', models.DecimalField(decimal_places=16, max_digits=35, verbose_name='Курс')),
+                ('valid_from', models.DateTimeField(verbose_name='Действует с')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата загрузки')),
+                ('base', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='base_rates', to='billing.currency', verbose_name='Базовая валюта')),
+                ('quote', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='quote_rates', to='billing.currency', verbose_name='Котируемая валюта')),
+            ],
+            options={
+                'verbose_name': 'Курс валюты',
+                'verbose_name_plural': 'Курсы валют',
+                'constraints': [models.UniqueConstraint(fields=('base', 'quote', 'valid_from'), name='billing_rate_base_quote_valid_from_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 6.0.1 on 2026-10-18 06:31
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def open_existing_accounts(apps, schema_editor):
+    """Текущие остатки счетов становятся входящими проводками журнала."""
+    Balance = apps.get_model('billing', 'Balance')
+    LedgerEntry = apps.get_model('billing', 'LedgerEntry')
+    entries = []
+    for row in Balance.objects.values('user_id', 'currency_id').annotate(total=Sum('amount')).order_by():
+        if not row['total']:
+            continue
+        for account, amount in (('client', row['total']), ('external', -row['total'])):
+            entries.append(LedgerEntry(
+                user_id=row['user_id'], currency_id=row['currency_id'], account=account, amount=amount,
+            ))
+    LedgerEntry.objects.bulk_create(entries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0006_exchange_rate'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=20, verbose_name='Остаток')),
+                ('last_entry_id', models.BigIntegerField(verbose_name='ID последней учтённой проводки')),
+                ('taken_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Момент снимка')),
+                ('currency', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='balance_snapshots', to='billing.currency', verbose_name='Валюта')),
+                ('user', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='balance_snapshots', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Снимок баланса',
+                'verbose_name_plural': 'Снимки балансов',
+                'indexes': [models.Index(fields=['currency', 'user', 'last_entry_id'], name='billing_snapshot_account_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account', models.CharField(choices=[('client', 'Счёт клиента'), ('external', 'Внешний счёт')], max_length=20, verbose_name='Счёт')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=20, verbose_name='Сумма')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания записи')),
+                ('currency', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entries', to='billing.currency', verbose_name='Валюта')),
+                ('transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entries', to='billing.transaction', verbose_name='Транзакция')),
+                ('user', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entries', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Проводка',
+                'verbose_name_plural': 'Проводки',
+                'indexes': [models.Index(fields=['currency', 'user', 'account', 'id'], name='billing_ledger_account_id_idx')],
+            },
+        ),
+        migrations.RunPython(open_existing_accounts, migrations.RunPython.noop),
+    ]
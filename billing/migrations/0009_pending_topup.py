@@ -0,0 +1,39 @@
+# Generated by Django 6.0.1 on 2026-10-18 06:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0008_balance_reconciliation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingTopUp',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=5, max_digits=20, verbose_name='Сумма')),
+                ('exchange_rate', models.DecimalField(blank=True, decimal_places=16, max_digits=35, null=True, verbose_name='Обменный курс')),
+                ('delta', models.DecimalField(decimal_places=2, max_digits=20, verbose_name='Сумма зачисления')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает проведения'), ('applied', 'Проведено'), ('failed', 'Отклонено')], default='pending', max_length=20, verbose_name='Статус')),
+                ('error', models.TextField(blank=True, verbose_name='Причина отказа')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата приёма')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата проведения')),
+                ('balance_currency', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='credited_pending_topups', to='billing.currency', verbose_name='Валюта зачисления')),
+                ('currency', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='pending_topups', to='billing.currency', verbose_name='Валюта')),
+                ('gross_currency', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='gross_pending_topups', to='billing.currency', verbose_name='Валюта для обмена')),
+                ('transaction', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pending_topup', to='billing.transaction', verbose_name='Транзакция')),
+                ('user', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='pending_topups', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Пополнение в очереди',
+                'verbose_name_plural': 'Пополнения в очереди',
+                'indexes': [models.Index(condition=models.Q(('status', 'pending')), fields=['id'], name='billing_pending_topup_q_idx')],
+            },
+        ),
+    ]
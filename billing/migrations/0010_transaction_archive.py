@@ -0,0 +1,46 @@
+# Generated by Django 6.0.1 on 2026-10-18 06:37
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0009_pending_topup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ledgerentry',
+            name='transaction',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='ledger_entries', to='billing.transaction', verbose_name='Транзакция'),
+        ),
+        migrations.AlterField(
+            model_name='pendingtopup',
+            name='transaction',
+            field=models.OneToOneField(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='pending_topup', to='billing.transaction', verbose_name='Транзакция'),
+        ),
+        migrations.CreateModel(
+            name='ArchivedTransaction',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_type', models.CharField(choices=[('conversion', 'Конвертация валюты'), ('service_spend', 'Покупка услуги'), ('account_topup', 'Пополнение аккаунта')], max_length=50, verbose_name='Тип транзакции')),
+                ('amount', models.DecimalField(decimal_places=5, max_digits=20, verbose_name='Сумма')),
+                ('exchange_rate', models.DecimalField(blank=True, decimal_places=16, max_digits=35, null=True, verbose_name='Обменный курс')),
+                ('created_at', models.DateTimeField(verbose_name='Дата создания записи')),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата переноса в архив')),
+                ('currency', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='archived_transactions', to='billing.currency', verbose_name='Валюта')),
+                ('gross_currency', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='gross_archived_transactions', to='billing.currency', verbose_name='Валюта для обмена')),
+                ('user', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_transactions', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Архивная транзакция',
+                'verbose_name_plural': 'Архивные транзакции',
+                'indexes': [models.Index(fields=['created_at', 'id'], name='billing_archive_created_id_idx')],
+            },
+        ),
+    ]
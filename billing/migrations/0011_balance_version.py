@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 06:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0010_transaction_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='balance',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0, verbose_name='Версия'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 6.0.1 on 2026-10-18 07:02
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Cast, Round
+
+
+def fill_minor_units(apps, schema_editor):
+    """Переводит существующие остатки и проводки в минимальные единицы, по валюте за запрос."""
+    Currency = apps.get_model('billing', 'Currency')
+    for model_name in ('Balance', 'LedgerEntry'):
+        model = apps.get_model('billing', model_name)
+        for currency in Currency.objects.all():
+            model.objects.filter(currency=currency, amount_minor=None).update(
+                amount_minor=Cast(Round(F('amount') * 10 ** currency.exponent), models.BigIntegerField()),
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0011_balance_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='balance',
+            name='amount_minor',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='Баланс в минимальных единицах'),
+        ),
+        migrations.AddField(
+            model_name='currency',
+            name='exponent',
+            field=models.PositiveSmallIntegerField(default=2, validators=[django.core.validators.MaxValueValidator(2)], verbose_name='Знаков минимальной единицы'),
+        ),
+        migrations.AddField(
+            model_name='ledgerentry',
+            name='amount_minor',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='Сумма в минимальных единицах'),
+        ),
+        migrations.RunPython(fill_minor_units, migrations.RunPython.noop),
+    ]
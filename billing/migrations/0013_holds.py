@@ -0,0 +1,44 @@
+# Generated by Django 6.0.1 on 2026-10-18 07:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0012_minor_units'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='balance',
+            name='held',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=20, verbose_name='Зарезервировано'),
+        ),
+        migrations.CreateModel(
+            name='Hold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=5, max_digits=20, verbose_name='Сумма')),
+                ('exchange_rate', models.DecimalField(blank=True, decimal_places=16, max_digits=35, null=True, verbose_name='Обменный курс')),
+                ('held', models.DecimalField(decimal_places=2, max_digits=20, verbose_name='Сумма резерва')),
+                ('status', models.CharField(choices=[('active', 'Активен'), ('captured', 'Списан'), ('voided', 'Отменён'), ('expired', 'Истёк')], default='active', max_length=20, verbose_name='Статус')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата авторизации')),
+                ('expires_at', models.DateTimeField(verbose_name='Срок действия')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата завершения')),
+                ('balance', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='holds', to='billing.balance', verbose_name='Шард баланса')),
+                ('currency', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='holds', to='billing.currency', verbose_name='Валюта')),
+                ('gross_currency', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='gross_holds', to='billing.currency', verbose_name='Валюта для обмена')),
+                ('transaction', models.OneToOneField(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='hold', to='billing.transaction', verbose_name='Транзакция')),
+                ('user', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='holds', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Холд',
+                'verbose_name_plural': 'Холды',
+                'indexes': [models.Index(condition=models.Q(('status', 'active')), fields=['expires_at'], name='billing_hold_expiry_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-18 07:24
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0013_holds'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='currency',
+            name='exponent',
+            field=models.PositiveSmallIntegerField(default=2, validators=[django.core.validators.MinValueValidator(2), django.core.validators.MaxValueValidator(2)], verbose_name='Знаков минимальной единицы'),
+        ),
+        migrations.AddConstraint(
+            model_name='currency',
+            constraint=models.CheckConstraint(condition=models.Q(('exponent', 2)), name='billing_currency_exponent_check'),
+        ),
+    ]
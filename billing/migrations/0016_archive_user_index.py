@@ -0,0 +1,19 @@
+# Generated by Django 6.0.1 on 2026-10-18 07:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0015_exchange_rate_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='archivedtransaction',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='billing_archive_user_crt_idx'),
+        ),
+    ]
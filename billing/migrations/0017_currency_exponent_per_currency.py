@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-18 07:36
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0016_archive_user_index'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='currency',
+            name='billing_currency_exponent_check',
+        ),
+        migrations.AlterField(
+            model_name='currency',
+            name='exponent',
+            field=models.PositiveSmallIntegerField(default=2, validators=[django.core.validators.MaxValueValidator(2)], verbose_name='Знаков минимальной единицы'),
+        ),
+    ]
@@ -1,6 +1,14 @@
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Power, Round
+from django.db.models.sql import UpdateQuery
 from django.contrib.auth.models import User
-from decimal import Decimal
+from django.core.validators import MaxValueValidator
+from django.utils import timezone
+from decimal import ROUND_DOWN, Decimal
+
+from billing.money import exponent_of, to_minor
 
 
 class Currency(models.Model):
@@ -16,6 +24,15 @@ class Currency(models.Model):
         verbose_name="Название валюты",
         blank=True,
     )
+    # Знаков после запятой в минимальной единице, см. billing.money.
+    # Не больше точности Decimal-колонок балансов и проводок: суммы счетов
+    # валюты округляются до exponent знаков (Balance.quantize), поэтому
+    # amount_minor — точная копия amount
+    exponent = models.PositiveSmallIntegerField(
+        verbose_name="Знаков минимальной единицы",
+        default=2,
+        validators=[MaxValueValidator(2)],
+    )
 
     class Meta:
         verbose_name = "Валюта"
@@ -35,6 +52,7 @@ class Transaction(models.Model):
         SERVICE_SPEND = "service_spend", "Покупка услуги"
         ACCOUNT_TOPUP = "account_topup", "Пополнение аккаунта"
 
+    # Индексы по user и currency покрываются составными индексами из Meta
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -42,6 +60,7 @@ class Transaction(models.Model):
         verbose_name="Пользователь",
         null=True,
         blank=True,
+        db_index=False,
     )
     transaction_type = models.CharField(verbose_name="Тип транзакции", max_length=50, choices=TransactionType.choices)
     amount = models.DecimalField(max_digits=20, decimal_places=5, verbose_name="Сумма")
@@ -49,6 +68,7 @@ class Transaction(models.Model):
         "Currency", on_delete=models.PROTECT,
         verbose_name="Валюта",
         related_name="currency_transactions",
+        db_index=False,
     )
 
     # Поля для конвертации валют
@@ -71,6 +91,13 @@ class Transaction(models.Model):
     class Meta:
         verbose_name = "Транзакция"
         verbose_name_plural = "Транзакции"
+        indexes = [
+            # Лента истории и постраничный обход по ключу (created_at, id)
+            models.Index(fields=["created_at", "id"], name="billing_txn_created_id_idx"),
+            models.Index(fields=["user", "created_at"], name="billing_txn_user_created_idx"),
+            models.Index(fields=["transaction_type", "created_at"], name="billing_txn_type_created_idx"),
+            models.Index(fields=["currency", "created_at"], name="billing_txn_cur_created_idx"),
+        ]
 
     def __str__(self):
         return f"{self.pk} {self.get_transaction_type_display()} {self.amount}"
@@ -79,7 +106,357 @@ class Transaction(models.Model):
         return self.TransactionType(self.transaction_type).label
 
 
+class ArchivedTransaction(models.Model):
+    """
+    Транзакция, перенесённая из Transaction командой archive_transactions.
+    Строка сохраняет исходный ID, поэтому проводки журнала и сохранённые
+    ответы по-прежнему ссылаются на неё. История читает обе таблицы.
+    """
+    id = models.BigIntegerField(primary_key=True, verbose_name="ID")
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="archived_transactions",
+        verbose_name="Пользователь",
+        null=True,
+        blank=True,
+        db_index=False,
+    )
+    transaction_type = models.CharField(verbose_name="Тип транзакции", max_length=50, choices=Transaction.TransactionType.choices)
+    amount = models.DecimalField(max_digits=20, decimal_places=5, verbose_name="Сумма")
+    currency = models.ForeignKey(
+        "Currency", on_delete=models.PROTECT,
+        verbose_name="Валюта",
+        related_name="archived_transactions",
+        db_index=False,
+    )
+    gross_currency = models.ForeignKey(
+        "Currency",
+        on_delete=models.PROTECT,
+        verbose_name="Валюта для обмена",
+        related_name="gross_archived_transactions",
+        null=True,
+        blank=True,
+        db_index=False,
+    )
+    exchange_rate = models.DecimalField(
+        max_digits=35,
+        decimal_places=16,
+        verbose_name="Обменный курс",
+        null=True,
+        blank=True,
+    )
+    created_at = models.DateTimeField(verbose_name="Дата создания записи")
+    archived_at = models.DateTimeField(default=timezone.now, verbose_name="Дата переноса в архив")
+
+    class Meta:
+        verbose_name = "Архивная транзакция"
+        verbose_name_plural = "Архивные транзакции"
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="billing_archive_created_id_idx"),
+            # История счёта: ветка архива в UNION ALL фильтруется по пользователю
+            models.Index(fields=["user", "created_at", "id"], name="billing_archive_user_crt_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.pk} {self.transaction_type} {self.amount}"
+
+
+class ExchangeRate(models.Model):
+    """
+    Курс валюты: одна единица base стоит rate единиц quote
+    начиная с момента valid_from и до следующего снимка по этой паре.
+    """
+    base = models.ForeignKey(
+        "Currency", on_delete=models.PROTECT,
+        verbose_name="Базовая валюта",
+        related_name="base_rates",
+        db_index=False,
+    )
+    quote = models.ForeignKey(
+        "Currency", on_delete=models.PROTECT,
+        verbose_name="Котируемая валюта",
+        related_name="quote_rates",
+    )
+    rate = models.DecimalField(max_digits=35, decimal_places=16, verbose_name="Курс")
+    valid_from = models.DateTimeField(verbose_name="Действует с")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата загрузки")
+    # Меняется при каждой записи, в том числе при исправлении курса загрузчиком:
+    # по нему кэши курсов других процессов замечают изменение (RateCache)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
+
+    class Meta:
+        verbose_name = "Курс валюты"
+        verbose_name_plural = "Курсы валют"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["base", "quote", "valid_from"], name="billing_rate_base_quote_valid_from_uniq",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.base_id}/{self.quote_id} {self.rate} с {self.valid_from}"
+
+
+def minor_units(amount, exponent=None):
+    """
+    SQL-выражение: сумма amount в минимальных единицах валюты строки.
+    Копия Decimal-колонки округляется так же, как MIRROR_ROUNDING.
+    Без exponent число знаков читается из Currency подзапросом.
+    """
+    if exponent is None:
+        exponent = Subquery(Currency.objects.filter(code=OuterRef('currency_id')).values('exponent')[:1])
+        scale = Power(10, exponent, output_field=models.DecimalField())
+    else:
+        scale = 10 ** exponent
+    return Cast(Round(amount * scale), models.BigIntegerField())
+
+
+class BalanceVersionConflict(Exception):
+    """Шард счёта изменён другой операцией после чтения: оптимистичную запись нужно повторить."""
+
+
+class BalanceQuerySet(models.QuerySet):
+    """
+    Атомарные изменения баланса на стороне БД.
+    Изменение выполняется одним UPDATE с F()-выражением, а условие
+    amount - held >= X защищает от ухода в минус и от траты зарезервированных
+    холдами средств (held) без предварительного чтения строки.
+    Новое значение возвращается через RETURNING, если бэкенд его поддерживает.
+
+    Любая запись остатка увеличивает version шарда: на этом построены
+    оптимистичные изменения (apply_versioned_delta). Вместе с amount
+    пересчитывается amount_minor (minor_units).
+
+    Счёт (пользователь + валюта) может состоять из нескольких строк-шардов:
+    изменение попадает в случайный подходящий шард, поэтому параллельные
+    операции по одному счёту не ждут блокировку одной строки.
+    Остаток счёта — сумма шардов.
+    """
+
+    def account(self, user, currency):
+        """Все шарды счёта. user=None — общий счёт без пользователя."""
+        return self.filter(user=user, currency=currency)
+
+    def total(self):
+        return self.aggregate(total=Sum('amount'))['total']
+
+    def lock(self):
+        """
+        Блокирует строки выборки одним SELECT ... FOR UPDATE в порядке первичного ключа.
+        Несколько строк балансов блокируются только так: при общем порядке
+        встречные операции ждут друг друга, а не взаимоблокируются.
+        """
+        return list(self.select_for_update().order_by('pk'))
+
+    def _update_amount(self, expression, exponent=None, extra=None, **guard):
+        """
+        Меняет один случайный шард из выборки, подходящий под guard;
+        extra — дополнительные значения того же UPDATE.
+        Возвращает новый остаток выборки или None, если подходящего шарда нет.
+        """
+        shard = self.filter(**guard).order_by('?').values('pk')[:1]
+        query = self.model._base_manager.filter(pk=Subquery(shard)).filter(**guard).query.chain(UpdateQuery)
+        query.add_update_values({
+            'amount': expression, 'amount_minor': minor_units(expression, exponent), 'version': F('version') + 1,
+            **(extra or {}),
+        })
+        opts = self.model._meta
+        with transaction.mark_for_rollback_on_error(using=self.db):
+            rows = query.get_compiler(self.db).execute_returning_sql(
+                [opts.get_field('amount'), opts.get_field('shard_count')]
+            )
+
+        if not rows:
+            return None
+        if rows[0] and rows[0][1] == 1:
+            return rows[0][0]
+        # Шардов несколько или бэкенд без RETURNING: дочитываем сумму
+        return self.total()
+
+    def withdraw(self, amount, exponent=None):
+        """
+        Списывает amount и возвращает новый остаток.
+        Выбрасывает DoesNotExist, если баланса нет, и ValueError,
+        если средств недостаточно. exponent — Currency.exponent счёта:
+        сумма округляется до него. Без exponent сумма округляется до точности
+        поля, а exponent для amount_minor читается из БД — так можно только
+        для валют с exponent = 2.
+        """
+        assert isinstance(amount, Decimal)
+        assert amount > 0
+
+        amount = self.model.quantize(amount, exponent=exponent)
+        new_amount = self._update_amount(F('amount') - amount, exponent, amount__gte=F('held') + amount)
+        if new_amount is not None:
+            return new_amount
+
+        # Ни в одном шарде не хватает суммы целиком: блокируем все шарды счёта
+        # в порядке первичного ключа и списываем по частям
+        with transaction.atomic(using=self.db):
+            shards = self.lock()
+            if not shards:
+                raise self.model.DoesNotExist("Balance matching query does not exist.")
+            available = sum(shard.available for shard in shards)
+            if available < amount:
+                raise ValueError(
+                    f"Недостаточно средств. Доступно: {available} {shards[0].currency.code}"
+                )
+            self.apply_locked_delta(shards, -amount)
+        return sum(shard.amount for shard in shards)
+
+    def deposit(self, amount, exponent=None):
+        """Зачисляет amount и возвращает новый остаток. exponent — как в withdraw()."""
+        assert isinstance(amount, Decimal)
+        assert amount > 0
+
+        new_amount = self._update_amount(F('amount') + self.model.quantize(amount, exponent=exponent), exponent)
+        if new_amount is None:
+            raise self.model.DoesNotExist("Balance matching query does not exist.")
+        return new_amount
+
+    def apply_locked_delta(self, shards, delta):
+        """
+        Применяет изменение к уже заблокированным шардам одного счёта.
+        Зачисление уходит в первый шард, списание забирается с самых крупных.
+        Вызывающий код отвечает за проверку достаточности средств.
+        """
+        exponent = exponent_of(shards[0].currency_id)
+        for shard, shard_delta in self.split_delta(shards, delta):
+            self.filter(pk=shard.pk).update(
+                amount=F('amount') + shard_delta,
+                amount_minor=minor_units(F('amount') + shard_delta, exponent),
+                version=F('version') + 1,
+            )
+            shard.amount += shard_delta
+            shard.version += 1
+
+    def apply_versioned_delta(self, shards, delta):
+        """
+        Оптимистичный вариант apply_locked_delta для шардов, прочитанных без блокировки:
+        каждый шард меняется, только если его version не изменилась с момента чтения,
+        иначе выбрасывается BalanceVersionConflict. Вызывающий код откатывает
+        транзакцию и повторяет операцию с новым чтением.
+        """
+        exponent = exponent_of(shards[0].currency_id)
+        for shard, shard_delta in self.split_delta(shards, delta):
+            updated = self.filter(pk=shard.pk, version=shard.version).update(
+                amount=F('amount') + shard_delta,
+                amount_minor=minor_units(F('amount') + shard_delta, exponent),
+                version=F('version') + 1,
+            )
+            if not updated:
+                raise BalanceVersionConflict(f"Баланс {shard.currency_id} изменён параллельной операцией")
+            shard.amount += shard_delta
+            shard.version += 1
+
+    def reserve(self, amount):
+        """
+        Резервирует amount под холд в одном шарде счёта, где хватает доступного
+        остатка: UPDATE held = held + X WHERE amount - held >= X. Холд живёт
+        в одном шарде, чтобы списание меняло одну строку. Возвращает ID шарда.
+        Выбрасывает DoesNotExist, если баланса нет, и ValueError, если ни в одном
+        шарде не хватает средств.
+        """
+        assert isinstance(amount, Decimal)
+        assert amount > 0
+
+        amount = self.model.quantize(amount)
+        enough = {'amount__gte': F('held') + amount}
+        # Кандидаты в случайном порядке: шард мог измениться после чтения, тогда пробуем следующий
+        for pk in self.filter(**enough).order_by('?').values_list('pk', flat=True):
+            if self.filter(pk=pk, **enough).update(held=F('held') + amount, version=F('version') + 1):
+                return pk
+
+        shards = list(self.all())
+        if not shards:
+            raise self.model.DoesNotExist("Balance matching query does not exist.")
+        available = sum(shard.available for shard in shards)
+        if available < amount:
+            raise ValueError(f"Недостаточно средств. Доступно: {available} {shards[0].currency_id}")
+        raise ValueError(
+            f"Недостаточно средств в одном шарде счёта для резерва {amount} {shards[0].currency_id}. "
+            f"Доступно в шарде: {max(shard.available for shard in shards)}"
+        )
+
+    def capture(self, shard_id, amount, exponent=None):
+        """
+        Списывает резерв холда с его шарда: amount и held уменьшаются одним UPDATE
+        строки shard_id без проверки остатка — средства гарантирует резерв.
+        Возвращает новый остаток счёта.
+        """
+        return self._update_amount(F('amount') - amount, exponent, {'held': F('held') - amount}, pk=shard_id)
+
+    def release(self, shard_id, amount):
+        """Снимает резерв холда (отмена или истечение срока)."""
+        self.filter(pk=shard_id).update(held=F('held') - amount, version=F('version') + 1)
+
+    @staticmethod
+    def split_delta(shards, delta):
+        """
+        Пары (шард, изменение): зачисление уходит в первый шард, списание забирается
+        с самых крупных по доступному остатку, не трогая зарезервированное.
+        """
+        if delta > 0:
+            return [(shards[0], delta)]
+
+        parts = []
+        remaining = -delta
+        for shard in sorted(shards, key=lambda shard: shard.available, reverse=True):
+            if not remaining:
+                break
+            take = min(shard.available, remaining)
+            if take > 0:
+                parts.append((shard, -take))
+                remaining -= take
+        return parts
+
+    def reshard(self, shards):
+        """
+        Делит счёт на заданное число шардов, распределяя остаток поровну.
+        shards=1 собирает счёт обратно в одну строку.
+        """
+        assert shards >= 1
+
+        with transaction.atomic(using=self.db):
+            existing = sorted(self.lock(), key=lambda shard: shard.shard)
+            if not existing:
+                raise self.model.DoesNotExist("Balance matching query does not exist.")
+            if any(shard.held for shard in existing):
+                raise ValueError("У счёта есть активные холды: перешардировать можно после их списания или отмены")
+            template = existing[0]
+            total = sum(shard.amount for shard in existing)
+
+            exponent = exponent_of(template.currency_id)
+            share = self.model.quantize(total / shards, rounding=ROUND_DOWN, exponent=exponent)
+            amounts = [total - share * (shards - 1)] + [share] * (shards - 1)
+
+            removed = [shard for shard in existing if shard.shard >= shards]
+            if removed:
+                # Завершённые холды ссылаются на удаляемые шарды — переносим их на нулевой
+                Hold.objects.filter(balance__in=removed).update(balance=template)
+                self.filter(pk__in=[shard.pk for shard in removed]).delete()
+            by_number = {shard.shard: shard for shard in existing}
+            for number, amount in enumerate(amounts):
+                balance = by_number.get(number) or self.model(
+                    user_id=template.user_id, currency_id=template.currency_id, shard=number,
+                )
+                balance.amount = amount
+                balance.shard_count = shards
+                if balance.pk is not None:
+                    balance.version += 1
+                balance.save()
+
+
 class Balance(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="balances",
+        verbose_name="Пользователь",
+        null=True,
+        blank=True,
+    )
     amount = models.DecimalField(
         max_digits=20,
         decimal_places=2,
@@ -92,31 +469,498 @@ class Balance(models.Model):
         verbose_name="Валюта",
         related_name="balances",
     )
+    shard = models.PositiveSmallIntegerField(verbose_name="Номер шарда", default=0)
+    shard_count = models.PositiveSmallIntegerField(verbose_name="Число шардов счёта", default=1)
+    # Растёт при каждой записи остатка, см. BalanceQuerySet.apply_versioned_delta
+    version = models.PositiveBigIntegerField(verbose_name="Версия", default=0)
+    # amount в минимальных единицах валюты, пишется вместе с amount.
+    # NULL — строка записана в обход модели и ещё не переведена
+    amount_minor = models.BigIntegerField(verbose_name="Баланс в минимальных единицах", null=True, blank=True)
+    # Сумма активных холдов шарда (Hold): доступно amount - held, без SUM по холдам
+    held = models.DecimalField(max_digits=20, decimal_places=2, verbose_name="Зарезервировано", default=0)
+
+    objects = BalanceQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Баланс"
         verbose_name_plural = "Балансы"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "currency", "shard"],
+                condition=models.Q(user__isnull=False),
+                name="billing_balance_user_currency_shard_uniq",
+            ),
+            models.UniqueConstraint(
+                fields=["currency", "shard"],
+                condition=models.Q(user__isnull=True),
+                name="billing_balance_global_currency_shard_uniq",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.amount} {self.currency.code}"
 
+    def save(self, *args, **kwargs):
+        exponent = self.currency.exponent
+        self.amount = self.quantize(Decimal(self.amount), exponent=exponent)
+        self.amount_minor = to_minor(self.amount, exponent)
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def quantize(cls, amount, rounding=None, exponent=None):
+        """
+        Округляет сумму до exponent знаков валюты счёта (Currency.exponent),
+        без exponent — до точности поля amount, как это сделала бы БД при записи.
+        """
+        if exponent is None:
+            exponent = cls._meta.get_field('amount').decimal_places
+        return amount.quantize(Decimal(1).scaleb(-exponent), rounding=rounding)
+
+    @property
+    def available(self):
+        """Остаток за вычетом резервов холдов."""
+        return self.amount - self.held
+
     def check_sufficient_balance(self, amount):
-        if self.amount < amount:
+        if self.available < amount:
             raise ValueError(
-                f"Недостаточно средств. Доступно: {self.amount} {self.currency.code}"
+                f"Недостаточно средств. Доступно: {self.available} {self.currency.code}"
             )
 
     def withdraw(self, amount):
-        assert isinstance(amount, Decimal)
-        assert amount > 0
-
-        self.check_sufficient_balance(amount)
-        self.amount -= amount
-        self.save()
+        self.amount = Balance.objects.filter(pk=self.pk).withdraw(amount, exponent_of(self.currency_id))
 
     def deposit(self, amount):
-        assert isinstance(amount, Decimal)
-        assert amount > 0
+        self.amount = Balance.objects.filter(pk=self.pk).deposit(amount, exponent_of(self.currency_id))
+
+
+class IdempotencyKey(models.Model):
+    """
+    Сохранённый ответ на запрос с заголовком Idempotency-Key.
+    Повтор запроса с тем же ключом возвращает этот ответ без повторного
+    изменения балансов.
+    """
+    scope = models.CharField(max_length=50, verbose_name="Область ключа")
+    key = models.CharField(max_length=255, verbose_name="Ключ идемпотентности")
+    request_hash = models.CharField(max_length=64, verbose_name="Хэш запроса")
+    response_status = models.PositiveSmallIntegerField(verbose_name="HTTP-статус ответа")
+    response_body = models.JSONField(encoder=DjangoJSONEncoder, verbose_name="Тело ответа")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Дата создания записи")
+
+    class Meta:
+        verbose_name = "Ключ идемпотентности"
+        verbose_name_plural = "Ключи идемпотентности"
+        constraints = [
+            models.UniqueConstraint(fields=["scope", "key"], name="billing_idempotency_scope_key_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}:{self.key}"
+
+
+class TransactionDailyAggregateQuerySet(models.QuerySet):
+
+    def record(self, transactions):
+        """Добавляет транзакции к дневным агрегатам в текущей транзакции БД."""
+        totals = {}
+        for txn in transactions:
+            key = (timezone.localdate(txn.created_at), txn.currency_id, txn.transaction_type)
+            amount, count = totals.get(key, (Decimal(0), 0))
+            totals[key] = (amount + txn.amount, count + 1)
+        self.add_totals(totals)
+
+    def add_totals(self, totals):
+        """
+        Прибавляет суммы к агрегатам.
+        totals: {(день, код валюты, тип транзакции): (сумма, число транзакций)}.
+        Строки обновляются в порядке ключа, чтобы параллельные транзакции
+        не блокировали друг друга крест-накрест.
+        """
+        for (day, currency_id, transaction_type), (amount, count) in sorted(totals.items()):
+            row = self.filter(day=day, currency_id=currency_id, transaction_type=transaction_type)
+            increment = {'amount': F('amount') + amount, 'count': F('count') + count}
+            if row.update(**increment):
+                continue
+            try:
+                with transaction.atomic(using=self.db):
+                    self.create(
+                        day=day, currency_id=currency_id, transaction_type=transaction_type,
+                        amount=amount, count=count,
+                    )
+            except IntegrityError:
+                # Строку за этот день успела создать параллельная транзакция
+                row.update(**increment)
+
+
+class TransactionDailyAggregate(models.Model):
+    """
+    Оборот по дням, валютам и типам транзакций.
+    Поддерживается инкрементально: при записи транзакции
+    (BILLING_DAILY_AGGREGATES_INLINE) или командой update_daily_aggregates.
+    """
+    day = models.DateField(verbose_name="День")
+    currency = models.ForeignKey(
+        "Currency", on_delete=models.PROTECT,
+        verbose_name="Валюта",
+        related_name="daily_aggregates",
+        db_index=False,
+    )
+    transaction_type = models.CharField(
+        verbose_name="Тип транзакции", max_length=50, choices=Transaction.TransactionType.choices,
+    )
+    amount = models.DecimalField(max_digits=30, decimal_places=5, verbose_name="Сумма", default=0)
+    count = models.PositiveBigIntegerField(verbose_name="Число транзакций", default=0)
+
+    objects = TransactionDailyAggregateQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Дневной оборот"
+        verbose_name_plural = "Дневные обороты"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "currency", "transaction_type"], name="billing_daily_agg_day_cur_type_uniq",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.currency_id} {self.transaction_type}: {self.amount}"
 
-        self.amount += amount
-        self.save()
+
+class AggregateWatermark(models.Model):
+    """Последняя транзакция, учтённая отложенным пересчётом агрегатов."""
+    name = models.CharField(max_length=50, unique=True, verbose_name="Агрегат")
+    last_transaction_id = models.BigIntegerField(default=0, verbose_name="ID последней учтённой транзакции")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+
+    class Meta:
+        verbose_name = "Отметка пересчёта агрегатов"
+        verbose_name_plural = "Отметки пересчёта агрегатов"
+
+    def __str__(self):
+        return f"{self.name}: {self.last_transaction_id}"
+
+
+class LedgerEntryQuerySet(models.QuerySet):
+
+    def record(self, txn, changes, user=None):
+        """
+        Записывает проводки транзакции: изменение счёта клиента
+        и встречную проводку внешнего счёта той же валюты.
+        changes — пары (валюта, изменение баланса), как их применяет Balance.
+        """
+        return self.bulk_create(self.build(txn, changes, user))
+
+    def build(self, txn, changes, user=None):
+        entries = []
+        for currency, delta in changes:
+            exponent = exponent_of(currency)
+            delta = Balance.quantize(delta, exponent=exponent)
+            if not delta:
+                continue
+            minor = to_minor(delta, exponent)
+            entries.append(self.model(
+                transaction=txn, user=user, currency=currency,
+                account=LedgerEntry.Account.CLIENT, amount=delta, amount_minor=minor,
+            ))
+            entries.append(self.model(
+                transaction=txn, user=user, currency=currency,
+                account=LedgerEntry.Account.EXTERNAL, amount=-delta, amount_minor=-minor,
+            ))
+        return entries
+
+    def open_account(self, user, currency, amount):
+        """Входящий остаток счёта, созданного без транзакции (init_balances)."""
+        return self.record(None, [(currency, amount)], user=user)
+
+    def account(self, user, currency):
+        return self.filter(user=user, currency=currency, account=LedgerEntry.Account.CLIENT)
+
+    def balance_at(self, user, currency, at=None):
+        """
+        Остаток счёта на момент at (по умолчанию сейчас): последний снимок
+        не позже at плюс проводки после него. Число читаемых проводок
+        ограничено периодом между снимками.
+        """
+        at = at or timezone.now()
+        snapshot = (
+            BalanceSnapshot.objects
+            .filter(user=user, currency=currency, taken_at__lte=at)
+            .order_by('-last_entry_id')
+            .values_list('amount', 'last_entry_id')
+            .first()
+        )
+        amount, last_entry_id = snapshot or (Decimal(0), 0)
+        delta = self.account(user, currency).filter(
+            id__gt=last_entry_id, created_at__lte=at,
+        ).aggregate(total=Sum('amount'))['total']
+        return Balance.quantize(amount + (delta or 0))
+
+
+class LedgerEntry(models.Model):
+    """
+    Проводка журнала. Записи только добавляются: каждая транзакция даёт
+    пару проводок на валюту — по счёту клиента и встречную по внешнему
+    счёту, так что сумма проводок транзакции в каждой валюте равна нулю.
+    Сумма клиентских проводок счёта равна его балансу.
+    """
+    class Account(models.TextChoices):
+        CLIENT = "client", "Счёт клиента"
+        EXTERNAL = "external", "Внешний счёт"
+
+    # Без ограничения в БД: транзакция может уйти в ArchivedTransaction с тем же ID
+    transaction = models.ForeignKey(
+        "Transaction", on_delete=models.DO_NOTHING,
+        verbose_name="Транзакция",
+        related_name="ledger_entries",
+        null=True,
+        blank=True,
+        db_constraint=False,
+    )
+    user = models.ForeignKey(
+        User, on_delete=models.PROTECT,
+        verbose_name="Пользователь",
+        related_name="ledger_entries",
+        null=True,
+        blank=True,
+        db_index=False,
+    )
+    currency = models.ForeignKey(
+        "Currency", on_delete=models.PROTECT,
+        verbose_name="Валюта",
+        related_name="ledger_entries",
+        db_index=False,
+    )
+    account = models.CharField(verbose_name="Счёт", max_length=20, choices=Account.choices)
+    amount = models.DecimalField(max_digits=20, decimal_places=2, verbose_name="Сумма")
+    # amount в минимальных единицах валюты, см. Balance.amount_minor
+    amount_minor = models.BigIntegerField(verbose_name="Сумма в минимальных единицах", null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания записи")
+
+    objects = LedgerEntryQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Проводка"
+        verbose_name_plural = "Проводки"
+        indexes = [
+            # Остаток счёта: проводки после последнего снимка
+            models.Index(fields=["currency", "user", "account", "id"], name="billing_ledger_account_id_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.pk} {self.account} {self.amount} {self.currency_id}"
+
+
+class BalanceSnapshot(models.Model):
+    """
+    Остаток счёта по всем клиентским проводкам с ID не больше last_entry_id.
+    Создаётся командой snapshot_balances.
+    """
+    user = models.ForeignKey(
+        User, on_delete=models.PROTECT,
+        verbose_name="Пользователь",
+        related_name="balance_snapshots",
+        null=True,
+        blank=True,
+        db_index=False,
+    )
+    currency = models.ForeignKey(
+        "Currency", on_delete=models.PROTECT,
+        verbose_name="Валюта",
+        related_name="balance_snapshots",
+        db_index=False,
+    )
+    amount = models.DecimalField(max_digits=20, decimal_places=2, verbose_name="Остаток")
+    last_entry_id = models.BigIntegerField(verbose_name="ID последней учтённой проводки")
+    taken_at = models.DateTimeField(default=timezone.now, verbose_name="Момент снимка")
+
+    class Meta:
+        verbose_name = "Снимок баланса"
+        verbose_name_plural = "Снимки балансов"
+        indexes = [
+            models.Index(fields=["currency", "user", "last_entry_id"], name="billing_snapshot_account_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.currency_id} {self.user_id}: {self.amount} до #{self.last_entry_id}"
+
+
+class ReconciledBalance(models.Model):
+    """
+    Ожидаемое изменение счёта по истории транзакций с ID не больше отметки
+    AggregateWatermark 'balance_reconciliation'. Ведётся командой
+    reconcile_balances, чтобы следующий запуск читал только новые транзакции.
+    """
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        verbose_name="Пользователь",
+        related_name="reconciled_balances",
+        null=True,
+        blank=True,
+        db_index=False,
+    )
+    currency = models.ForeignKey(
+        "Currency", on_delete=models.PROTECT,
+        verbose_name="Валюта",
+        related_name="reconciled_balances",
+        db_index=False,
+    )
+    amount = models.DecimalField(max_digits=20, decimal_places=2, verbose_name="Изменение по транзакциям", default=0)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+
+    class Meta:
+        verbose_name = "Сверенный баланс"
+        verbose_name_plural = "Сверенные балансы"
+
+    def __str__(self):
+        return f"{self.currency_id} {self.user_id}: {self.amount}"
+
+
+class PendingTopUp(models.Model):
+    """
+    Принятое, но ещё не проведённое пополнение (BILLING_TOPUP_WRITE_BEHIND).
+    Запрос только добавляет строку журнала, не блокируя баланс. Команда
+    apply_pending_topups проводит журнал пачками: зачисление, транзакции
+    и отметка о проведении коммитятся вместе, поэтому каждая запись
+    применяется ровно один раз.
+    """
+    class Status(models.TextChoices):
+        PENDING = "pending", "Ожидает проведения"
+        APPLIED = "applied", "Проведено"
+        FAILED = "failed", "Отклонено"
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        verbose_name="Пользователь",
+        related_name="pending_topups",
+        null=True,
+        blank=True,
+        db_index=False,
+    )
+    amount = models.DecimalField(max_digits=20, decimal_places=5, verbose_name="Сумма")
+    currency = models.ForeignKey(
+        "Currency", on_delete=models.PROTECT,
+        verbose_name="Валюта",
+        related_name="pending_topups",
+        db_index=False,
+    )
+    gross_currency = models.ForeignKey(
+        "Currency", on_delete=models.PROTECT,
+        verbose_name="Валюта для обмена",
+        related_name="gross_pending_topups",
+        null=True,
+        blank=True,
+        db_index=False,
+    )
+    exchange_rate = models.DecimalField(
+        max_digits=35, decimal_places=16, verbose_name="Обменный курс", null=True, blank=True,
+    )
+    balance_currency = models.ForeignKey(
+        "Currency", on_delete=models.PROTECT,
+        verbose_name="Валюта зачисления",
+        related_name="credited_pending_topups",
+        db_index=False,
+    )
+    delta = models.DecimalField(max_digits=20, decimal_places=2, verbose_name="Сумма зачисления")
+    status = models.CharField(
+        verbose_name="Статус", max_length=20, choices=Status.choices, default=Status.PENDING,
+    )
+    transaction = models.OneToOneField(
+        "Transaction", on_delete=models.DO_NOTHING,
+        verbose_name="Транзакция",
+        related_name="pending_topup",
+        null=True,
+        blank=True,
+        db_constraint=False,
+    )
+    error = models.TextField(verbose_name="Причина отказа", blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата приёма")
+    processed_at = models.DateTimeField(verbose_name="Дата проведения", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Пополнение в очереди"
+        verbose_name_plural = "Пополнения в очереди"
+        indexes = [
+            # Обработчик читает только ожидающие записи в порядке приёма
+            models.Index(
+                fields=["id"], condition=models.Q(status="pending"), name="billing_pending_topup_q_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.pk} {self.status} {self.delta} {self.balance_currency_id}"
+
+
+class Hold(models.Model):
+    """
+    Резерв средств под покупку услуги: авторизация сейчас, списание позже.
+    Сумма резерва учтена счётчиком Balance.held шарда balance, поэтому
+    доступный остаток считается без SUM по холдам. Списание (capture)
+    меняет только этот шард, отмена (void) и истечение срока
+    (release_expired_holds) возвращают резерв.
+    """
+    class Status(models.TextChoices):
+        ACTIVE = "active", "Активен"
+        CAPTURED = "captured", "Списан"
+        VOIDED = "voided", "Отменён"
+        EXPIRED = "expired", "Истёк"
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        verbose_name="Пользователь",
+        related_name="holds",
+        null=True,
+        blank=True,
+        db_index=False,
+    )
+    balance = models.ForeignKey(
+        "Balance", on_delete=models.PROTECT,
+        verbose_name="Шард баланса",
+        related_name="holds",
+        db_index=False,
+    )
+    amount = models.DecimalField(max_digits=20, decimal_places=5, verbose_name="Сумма")
+    currency = models.ForeignKey(
+        "Currency", on_delete=models.PROTECT,
+        verbose_name="Валюта",
+        related_name="holds",
+        db_index=False,
+    )
+    gross_currency = models.ForeignKey(
+        "Currency", on_delete=models.PROTECT,
+        verbose_name="Валюта для обмена",
+        related_name="gross_holds",
+        null=True,
+        blank=True,
+        db_index=False,
+    )
+    exchange_rate = models.DecimalField(
+        max_digits=35, decimal_places=16, verbose_name="Обменный курс", null=True, blank=True,
+    )
+    held = models.DecimalField(max_digits=20, decimal_places=2, verbose_name="Сумма резерва")
+    status = models.CharField(
+        verbose_name="Статус", max_length=20, choices=Status.choices, default=Status.ACTIVE,
+    )
+    transaction = models.OneToOneField(
+        "Transaction", on_delete=models.DO_NOTHING,
+        verbose_name="Транзакция",
+        related_name="hold",
+        null=True,
+        blank=True,
+        db_constraint=False,
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата авторизации")
+    expires_at = models.DateTimeField(verbose_name="Срок действия")
+    processed_at = models.DateTimeField(verbose_name="Дата завершения", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Холд"
+        verbose_name_plural = "Холды"
+        indexes = [
+            # Сборщик читает только активные холды в порядке истечения
+            models.Index(
+                fields=["expires_at"], condition=models.Q(status="active"), name="billing_hold_expiry_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.pk} {self.status} {self.held} {self.balance_id}"
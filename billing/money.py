@@ -0,0 +1,39 @@
+"""
+Суммы в минимальных единицах валюты (копейки, центы, иены).
+
+Currency.exponent — число знаков дробной части валюты: 2 для RUB и USD,
+0 для JPY. Сумма X хранится в minor-колонках как целое X * 10^exponent,
+так что агрегация и сверка считают целые числа, а не Decimal.
+Округление явное: to_minor без rounding отказывается от суммы,
+которая не укладывается в целое число минимальных единиц.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+
+# Округление копий Decimal-колонок: совпадает с ROUND() в SQL (половина — от нуля)
+MIRROR_ROUNDING = ROUND_HALF_UP
+
+
+def to_minor(amount, exponent, rounding=None):
+    """
+    Сумма в минимальных единицах. Без rounding дробная часть единицы —
+    ошибка (ValueError), с rounding сумма округляется этим способом.
+    """
+    units = Decimal(amount).scaleb(exponent)
+    integral = units.to_integral_value(rounding=rounding or MIRROR_ROUNDING)
+    if rounding is None and integral != units:
+        raise ValueError(f"Сумма {amount} не кратна минимальной единице валюты (знаков после запятой: {exponent})")
+    return int(integral)
+
+
+def from_minor(units, exponent):
+    """Decimal с exponent знаками после запятой: from_minor(12345, 2) == Decimal('123.45')."""
+    return Decimal(units).scaleb(-exponent)
+
+
+def exponent_of(currency):
+    """Число знаков валюты по объекту Currency или коду (через реестр валют)."""
+    if isinstance(currency, str):
+        from billing.currencies import currency_registry
+        currency = currency_registry.get(currency)
+    return currency.exponent
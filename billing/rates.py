@@ -0,0 +1,197 @@
+import threading
+import time
+from bisect import bisect_right
+from collections import deque
+from decimal import Context, Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from billing.models import ExchangeRate
+
+
+RATE_FIELD = ExchangeRate._meta.get_field('rate')
+RATE_EXPONENT = Decimal(1).scaleb(-RATE_FIELD.decimal_places)
+RATE_CONTEXT = Context(prec=RATE_FIELD.max_digits)
+
+
+def quantize_rate(rate):
+    """Округляет вычисленный курс до точности поля курса, как его сохранит БД."""
+    return rate.quantize(RATE_EXPONENT, context=RATE_CONTEXT)
+
+
+class RateTable:
+    """
+    Неизменяемый снимок курсов.
+    По каждой паре хранятся отсортированные моменты начала действия и курсы,
+    курс на момент времени находится бинарным поиском за O(log n).
+
+    Пары без прямого курса считаются через промежуточные валюты по пути
+    с наименьшим числом пересчётов. Текущие курсы всех пар вычисляются
+    один раз и действуют до начала следующего снимка, поэтому поиск
+    текущего курса — обращение к словарю.
+    """
+
+    def __init__(self, rows):
+        pairs = {}
+        for base, quote, valid_from, rate in sorted(rows, key=lambda row: row[2]):
+            times, rates = pairs.setdefault((base, quote), ([], []))
+            times.append(valid_from)
+            rates.append(rate)
+        self._pairs = pairs
+        self._changes = sorted({valid_from for times, _ in pairs.values() for valid_from in times})
+        # (момент следующего снимка, {(base, quote): курс})
+        self._current = None
+
+    def _find(self, base, quote, at):
+        pair = self._pairs.get((base, quote))
+        if pair is None:
+            return None
+        times, rates = pair
+        index = bisect_right(times, at) - 1
+        return rates[index] if index >= 0 else None
+
+    def _graph(self, at):
+        """Курсы на момент at как граф: {валюта: {валюта: курс}} в обе стороны."""
+        graph = {}
+        for base, quote in self._pairs:
+            rate = self._find(base, quote, at)
+            if rate is None:
+                continue
+            graph.setdefault(base, {})[quote] = rate
+            # Обратное ребро не заменяет прямой курс, если он задан отдельно
+            graph.setdefault(quote, {}).setdefault(base, Decimal(1) / rate)
+        # Порядок обхода не зависит от порядка строк: путь выбирается детерминированно
+        return {currency: dict(sorted(edges.items())) for currency, edges in graph.items()}
+
+    @staticmethod
+    def _paths_from(graph, base):
+        """Курсы base ко всем достижимым валютам: обход в ширину, короткий путь — меньше пересчётов."""
+        rates = {base: Decimal(1)}
+        queue = deque([base])
+        while queue and len(rates) < len(graph):
+            currency = queue.popleft()
+            for quote, rate in graph[currency].items():
+                if quote not in rates:
+                    rates[quote] = rates[currency] * rate
+                    queue.append(quote)
+        return rates
+
+    @classmethod
+    def _rates_from(cls, graph, base):
+        # Вычисленный курс округляется до точности поля, как его сохранит транзакция:
+        # изменения балансов и сверка считаются по одному и тому же курсу
+        rates = {}
+        for quote, rate in cls._paths_from(graph, base).items():
+            try:
+                rate = quantize_rate(rate)
+            except InvalidOperation:
+                # Курс не помещается в поле курса: такую пару не провести
+                continue
+            if quote != base and rate:
+                rates[quote] = rate
+        return rates
+
+    def current_rates(self):
+        """Текущие курсы всех достижимых пар {(base, quote): курс}; пересчитываются со следующим снимком."""
+        now = timezone.now()
+        current = self._current
+        if current is None or (current[0] is not None and now >= current[0]):
+            index = bisect_right(self._changes, now)
+            expires = self._changes[index] if index < len(self._changes) else None
+            graph = self._graph(now)
+            table = {
+                (base, quote): rate
+                for base in graph
+                for quote, rate in self._rates_from(graph, base).items()
+            }
+            current = self._current = (expires, table)
+        return current[1]
+
+    def get(self, base, quote, at=None):
+        """
+        Курс: сколько единиц quote стоит одна единица base на момент at
+        (по умолчанию сейчас). Если задана только обратная пара, курс
+        вычисляется из неё, если нет и её — через промежуточные валюты.
+        Возвращает None, если пары нельзя связать.
+        """
+        if at is None:
+            return self.current_rates().get((base, quote))
+        rate = self._find(base, quote, at)
+        if rate is not None:
+            return rate
+        graph = self._graph(at)
+        if base not in graph:
+            return None
+        return self._rates_from(graph, base).get(quote)
+
+
+class RateCache:
+    """
+    Процессный кэш курсов валют.
+    Таблица загружается целиком одним запросом. Не чаще раза в
+    BILLING_RATE_CACHE_TTL секунд кэш сверяет с БД максимальный ID, число
+    строк и последний updated_at и перечитывает таблицу, если появились
+    новые снимки или исправлены старые. В своём
+    процессе кэш сбрасывается сигналами ExchangeRate и командой
+    load_exchange_rates сразу.
+    """
+    # Версия таблицы: меняется с каждой вставкой, удалением и исправлением курса
+    VERSION = {'last': Max('id'), 'total': Count('id'), 'updated': Max('updated_at')}
+
+    def __init__(self):
+        self._table = None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'BILLING_RATE_CACHE_TTL', 60)
+
+    def _rows(self):
+        return ExchangeRate.objects.values_list('base_id', 'quote_id', 'valid_from', 'rate')
+
+    def _version_query(self):
+        return ExchangeRate.objects.aggregate(**self.VERSION)
+
+    def _is_fresh(self):
+        return self._table is not None and time.monotonic() - self._checked_at < self.ttl
+
+    def _store(self, version, rows):
+        with self._lock:
+            if rows is not None:
+                self._table = RateTable(rows)
+                self._version = version
+            self._checked_at = time.monotonic()
+            return self._table
+
+    def snapshot(self):
+        """Текущий снимок курсов, при необходимости перечитанный из БД."""
+        if self._is_fresh():
+            return self._table
+        version = self._version_query()
+        rows = list(self._rows()) if self._table is None or version != self._version else None
+        return self._store(version, rows)
+
+    async def asnapshot(self):
+        """Асинхронный вариант snapshot() для async-представлений."""
+        if self._is_fresh():
+            return self._table
+        version = await ExchangeRate.objects.aaggregate(**self.VERSION)
+        rows = None
+        if self._table is None or version != self._version:
+            rows = [row async for row in self._rows()]
+        return self._store(version, rows)
+
+    def get(self, base, quote, at=None):
+        return self.snapshot().get(base, quote, at)
+
+    def invalidate(self):
+        with self._lock:
+            self._table = None
+            self._version = None
+
+
+rate_cache = RateCache()
@@ -0,0 +1,178 @@
+"""
+JSON-рендерер и парсер API биллинга (BILLING_JSON_BACKEND).
+
+Ответы совпадают с JSONRenderer DRF байт в байт: компактные разделители,
+UTF-8 без экранирования, \\u2028 и \\u2029 экранируются, даты в ISO 8601
+с Z для UTC, Decimal как число с плавающей точкой. Для этого вместо
+json.dumps с новым JSONEncoder на каждый ответ используется один
+настроенный кодировщик, а если установлен orjson — он.
+
+orjson пишет даты сам (в том же формате), а Decimal получает готовым
+фрагментом от стандартного кодировщика. msgspec пишет Decimal по-своему,
+поэтому ответы он не кодирует и используется только для разбора.
+Неподходящие случаи (отступы, NaN, целые больше 64 бит, не-UTF-8
+кодировки, ошибки разбора) обрабатывает реализация DRF.
+"""
+import json
+from functools import lru_cache
+from io import BytesIO
+from json.encoder import c_make_encoder, encode_basestring, encode_basestring_ascii
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.json import strict_constant
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+BACKENDS = ('auto', 'orjson', 'msgspec', 'stdlib')
+
+UTF8 = ('utf-8', 'utf8')
+
+
+class StdlibBackend:
+    name = 'stdlib'
+
+    def __init__(self, renderer):
+        self.encoder = renderer.encoder_class(
+            ensure_ascii=renderer.ensure_ascii,
+            allow_nan=not renderer.strict,
+            separators=(',', ':') if renderer.compact else (', ', ': '),
+        )
+        # JSONEncoder.encode() собирает C-кодировщик заново на каждый ответ, здесь он один.
+        # Без проверки циклов: у ответов API их не бывает, а глубокая рекурсия всё равно ошибка
+        self.c_encoder = c_make_encoder and c_make_encoder(
+            None, self.encoder.default,
+            encode_basestring_ascii if renderer.ensure_ascii else encode_basestring,
+            None, self.encoder.key_separator, self.encoder.item_separator,
+            False, False, self.encoder.allow_nan,
+        )
+        self.parse_constant = strict_constant if renderer.strict else None
+        # json.loads с parse_constant создаёт JSONDecoder на каждый вызов
+        self.decoder = json.JSONDecoder(parse_constant=self.parse_constant)
+
+    def dumps(self, data):
+        ret = ''.join(self.c_encoder(data, 0)) if self.c_encoder else self.encoder.encode(data)
+        if '\u2028' in ret or '\u2029' in ret:
+            ret = ret.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029')
+        return ret.encode()
+
+    def loads(self, body):
+        # Тело декодируется как строка: json.loads(bytes) угадывал бы UTF-16 и UTF-32
+        return self.decoder.decode(body.decode())
+
+
+class OrjsonBackend(StdlibBackend):
+    name = 'orjson'
+
+    def __init__(self, renderer):
+        super().__init__(renderer)
+        # Без ensure_ascii и компактного вида orjson не повторит вывод DRF
+        self.native = not renderer.ensure_ascii and renderer.compact
+        self.options = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+        self.strict = renderer.strict
+        self.orjson_loads = self.parse_constant is not None
+
+    def dumps(self, data):
+        if not self.native:
+            return super().dumps(data)
+        try:
+            ret = orjson.dumps(data, default=self.default, option=self.options)
+        except orjson.JSONEncodeError:
+            # Целые больше 64 бит, вложенность глубже 255 уровней и прочее — как в DRF
+            return super().dumps(data)
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        if self.strict and b'null' in ret and _has_nan(data):
+            # orjson пишет NaN и бесконечность как null, DRF в строгом режиме их не пропускает
+            return super().dumps(data)
+        return ret
+
+    def default(self, obj):
+        # Decimal и остальные типы DRF кодирует через default(): отдаём его результат готовым JSON
+        return orjson.Fragment(self.encoder.encode(self.encoder.default(obj)).encode())
+
+    def loads(self, body):
+        # orjson не принимает NaN и Infinity, как и строгий режим DRF; нестрогий разбирает stdlib
+        return orjson.loads(body) if self.orjson_loads else super().loads(body)
+
+
+class MsgspecBackend(StdlibBackend):
+    name = 'msgspec'
+
+    def __init__(self, renderer):
+        super().__init__(renderer)
+        self.msgspec_decoder = msgspec.json.Decoder()
+
+    def loads(self, body):
+        return self.msgspec_decoder.decode(body)
+
+
+def _has_nan(data):
+    if isinstance(data, float):
+        return data != data or data in (float('inf'), float('-inf'))
+    if isinstance(data, dict):
+        return any(_has_nan(value) for value in data.values())
+    if isinstance(data, (list, tuple)):
+        return any(_has_nan(value) for value in data)
+    return False
+
+
+@lru_cache(maxsize=None)
+def get_backend(name, renderer_class=JSONRenderer):
+    """Бэкенд по имени из BACKENDS; auto выбирает самый быстрый из установленных."""
+    if name not in BACKENDS:
+        raise ImproperlyConfigured(f'BILLING_JSON_BACKEND: {name!r}, ожидается одно из {", ".join(BACKENDS)}')
+    if name == 'auto':
+        name = 'orjson' if orjson is not None else 'msgspec' if msgspec is not None else 'stdlib'
+    if name == 'orjson':
+        if orjson is None:
+            raise ImproperlyConfigured('BILLING_JSON_BACKEND = orjson, но пакет orjson не установлен')
+        return OrjsonBackend(renderer_class())
+    if name == 'msgspec':
+        if msgspec is None:
+            raise ImproperlyConfigured('BILLING_JSON_BACKEND = msgspec, но пакет msgspec не установлен')
+        return MsgspecBackend(renderer_class())
+    return StdlibBackend(renderer_class())
+
+
+def current_backend(renderer_class=JSONRenderer):
+    return get_backend(getattr(settings, 'BILLING_JSON_BACKEND', 'auto'), renderer_class)
+
+
+class BillingJSONRenderer(JSONRenderer):
+    """JSONRenderer с тем же выводом и кодированием через выбранный бэкенд."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # Отступы (indent в Accept или в контексте браузерного API) — редкий случай, его ведёт DRF
+        if (accepted_media_type and ';' in accepted_media_type) or (renderer_context and 'indent' in renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+        return current_backend(type(self)).dumps(data)
+
+
+class BillingJSONParser(JSONParser):
+    """JSONParser, который разбирает UTF-8 тело бэкендом; ошибки и прочие кодировки — через DRF."""
+    renderer_class = BillingJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        if encoding.lower() not in UTF8:
+            return super().parse(stream, media_type, parser_context)
+        body = stream.read()
+        try:
+            return current_backend(self.renderer_class).loads(body)
+        except Exception:
+            # Сообщение об ошибке должно совпасть с DRF: повторяем разбор им
+            return super().parse(BytesIO(body), media_type, parser_context)
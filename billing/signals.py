@@ -0,0 +1,23 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from billing.currencies import currency_registry
+from billing.models import Currency, ExchangeRate
+from billing.rates import rate_cache
+
+
+@receiver(post_save, sender=Currency)
+@receiver(post_delete, sender=Currency)
+def invalidate_currency_registry(sender, **kwargs):
+    # Сбрасываем сразу и повторно после коммита: между изменением и коммитом
+    # другой поток мог перечитать справочник со старыми данными.
+    currency_registry.invalidate()
+    transaction.on_commit(currency_registry.invalidate)
+
+
+@receiver(post_save, sender=ExchangeRate)
+@receiver(post_delete, sender=ExchangeRate)
+def invalidate_rate_cache(sender, **kwargs):
+    rate_cache.invalidate()
+    transaction.on_commit(rate_cache.invalidate)
@@ -1,7 +1,32 @@
 import pytest
 from decimal import Decimal
 from rest_framework.test import APIClient
-from billing.models import Currency, Balance
+from billing.currencies import currency_registry
+from billing.idempotency import idempotency_store
+from billing.rates import rate_cache
+from billing.models import Currency, Balance, LedgerEntry
+
+
+@pytest.fixture(autouse=True)
+def clear_currency_registry():
+    # Откат тестовой транзакции не вызывает сигналов, поэтому сбрасываем явно
+    currency_registry.invalidate()
+    yield
+    currency_registry.invalidate()
+
+
+@pytest.fixture(autouse=True)
+def clear_rate_cache():
+    rate_cache.invalidate()
+    yield
+    rate_cache.invalidate()
+
+
+@pytest.fixture(autouse=True)
+def clear_idempotency_store():
+    idempotency_store.clear()
+    yield
+    idempotency_store.clear()
 
 
 @pytest.fixture
@@ -27,3 +52,11 @@ def balances(currencies):
         amount=Decimal('1000.00')
     )
     return {'RUB': rub_balance, 'USD': usd_balance}
+
+
+@pytest.fixture
+def ledger(balances):
+    """Балансы фикстуры balances с входящими проводками журнала."""
+    for balance in balances.values():
+        LedgerEntry.objects.open_account(None, balance.currency, balance.amount)
+    return balances
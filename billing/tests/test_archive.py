@@ -0,0 +1,64 @@
+import pytest
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management import call_command
+from django.utils import timezone
+from billing.models import ArchivedTransaction, LedgerEntry, Transaction, TransactionDailyAggregate
+
+
+def topup(api_client, amount):
+    return api_client.post(
+        '/api/transactions/account-topup/', {'sum': amount, 'currency_id': 'RUB'}, format='json',
+    )
+
+
+@pytest.fixture
+def history(api_client, ledger):
+    """Три пополнения: два двухлетней давности и одно свежее."""
+    for amount in ('1', '2', '3'):
+        topup(api_client, amount)
+    Transaction.objects.filter(amount__lt=3).update(created_at=timezone.now() - timedelta(days=730))
+    return list(Transaction.objects.order_by('id').values_list('id', flat=True))
+
+
+@pytest.mark.django_db
+class TestArchiveTransactions:
+    """Тесты для архивации старых транзакций"""
+
+    def test_moves_old_rows(self, history):
+        """Тест что старые строки переносятся в архив с исходными ID"""
+        call_command('archive_transactions', keep_months=12, chunk_size=1)
+
+        assert list(Transaction.objects.values_list('id', flat=True)) == history[2:]
+        assert list(ArchivedTransaction.objects.order_by('id').values_list('id', 'amount')) == [
+            (history[0], Decimal('1.00000')), (history[1], Decimal('2.00000')),
+        ]
+        # Проводки остаются на месте и ссылаются на архивные ID
+        assert LedgerEntry.objects.filter(transaction_id__in=history[:2]).count() == 4
+
+    def test_history_reads_archive(self, api_client, history):
+        """Тест что история объединяет рабочую таблицу и архив"""
+        call_command('archive_transactions', keep_months=12)
+
+        response = api_client.get('/api/transactions/', {'limit': 2})
+        ids = [item['id'] for item in response.data['results']]
+        response = api_client.get('/api/transactions/', {'cursor': response.data['next_cursor']})
+        ids += [item['id'] for item in response.data['results']]
+
+        assert ids == history[::-1]
+
+    def test_history_page_is_one_query(self, api_client, history, django_assert_num_queries):
+        """Тест что страница истории с архивом читается одним запросом"""
+        call_command('archive_transactions', keep_months=12)
+
+        with django_assert_num_queries(1):
+            api_client.get('/api/transactions/', {'limit': 10})
+
+    def test_derived_data_includes_archive(self, history):
+        """Тест что сверка и пересчёт оборотов учитывают архив"""
+        call_command('archive_transactions', keep_months=12)
+
+        call_command('reconcile_balances', lag=0, rebuild=True)
+        call_command('update_daily_aggregates', rebuild=True)
+
+        assert sum(TransactionDailyAggregate.objects.values_list('count', flat=True)) == 3
@@ -0,0 +1,128 @@
+import base64
+import pytest
+from asgiref.sync import async_to_sync
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.test import AsyncClient
+from billing.models import Balance, Transaction
+
+
+@pytest.mark.django_db
+class TestAsyncTransactionAPI:
+    """Тесты для async-вариантов эндпоинтов транзакций"""
+
+    def test_async_conversion(self, api_client, balances):
+        """Тест конвертации через async-эндпоинт"""
+        response = api_client.post('/api/transactions/async/conversion/', {
+            'sum': '100', 'currency_id': 'USD', 'gross_currency_id': 'RUB', 'exchange_rate': '85.0',
+        }, format='json')
+
+        assert response.status_code == 201
+        body = response.json()
+        assert body['transaction_type'] == 'conversion'
+        assert body['balances'] == {'RUB': '91500.00', 'USD': '1100.00'}
+        assert Transaction.objects.count() == 1
+
+    def test_async_topup_under_asgi(self, balances):
+        """Тест пополнения через ASGI-обработчик"""
+        client = AsyncClient()
+
+        response = async_to_sync(client.post)(
+            '/api/transactions/async/account-topup/',
+            {'sum': '5000', 'currency_id': 'RUB'},
+            content_type='application/json',
+        )
+
+        assert response.status_code == 201
+        balances['RUB'].refresh_from_db()
+        assert balances['RUB'].amount == Decimal('105000.00')
+
+    def test_async_response_matches_sync(self, api_client, balances):
+        """Тест что async-эндпоинт отвечает так же, как синхронный"""
+        data = {'sum': '10', 'currency_id': 'RUB'}
+
+        sync_body = api_client.post('/api/transactions/service-spend/', data, format='json').json()
+        async_body = api_client.post('/api/transactions/async/service-spend/', data, format='json').json()
+
+        assert sync_body.keys() == async_body.keys()
+        assert async_body['balances']['RUB'] == '99980.00'
+
+    def test_async_validation_errors(self, api_client, balances):
+        """Тест ошибок валидации: неизвестная валюта и некорректный JSON"""
+        response = api_client.post(
+            '/api/transactions/async/service-spend/', {'sum': '10', 'currency_id': 'XXX'}, format='json',
+        )
+        assert response.status_code == 400
+        assert 'Валюта XXX не поддерживается' in str(response.json())
+
+        response = api_client.post(
+            '/api/transactions/async/service-spend/', '{', content_type='application/json',
+        )
+        assert response.status_code == 400
+
+    def test_async_insufficient_funds(self, api_client, balances):
+        """Тест что ошибка бизнес-логики возвращается как 400 без изменений"""
+        response = api_client.post(
+            '/api/transactions/async/service-spend/', {'sum': '200000', 'currency_id': 'RUB'}, format='json',
+        )
+
+        assert response.status_code == 400
+        assert 'Недостаточно средств' in response.json()['error']
+        assert Transaction.objects.count() == 0
+
+    def test_async_idempotency_key(self, api_client, balances):
+        """Тест что повтор с тем же Idempotency-Key не списывает повторно"""
+        data = {'sum': '100', 'currency_id': 'RUB'}
+        headers = {'Idempotency-Key': 'async-1'}
+
+        first = api_client.post('/api/transactions/async/service-spend/', data, format='json', headers=headers)
+        second = api_client.post('/api/transactions/async/service-spend/', data, format='json', headers=headers)
+
+        assert first.status_code == second.status_code == 201
+        assert second['Idempotent-Replayed'] == 'true'
+        assert first.content == second.content
+        assert Transaction.objects.count() == 1
+
+    def test_async_uses_session_user_balance(self, client, balances):
+        """Тест что пользователь сессии работает со своим счётом"""
+        user = User.objects.create_user(username='async-user')
+        Balance.objects.create(user=user, currency=balances['RUB'].currency, amount=Decimal('50.00'))
+        client.force_login(user)
+
+        response = client.post(
+            '/api/transactions/async/service-spend/', {'sum': '20', 'currency_id': 'RUB'},
+            content_type='application/json',
+        )
+
+        assert response.status_code == 201
+        assert response.json()['balances'] == {'RUB': '30.00'}
+        assert Transaction.objects.get().user == user
+
+    def test_async_basic_auth_user_balance(self, api_client, balances):
+        """Тест что пользователь HTTP Basic определяется классами аутентификации DRF, а не считается анонимным"""
+        user = User.objects.create_user(username='basic-user', password='secret')
+        Balance.objects.create(user=user, currency=balances['RUB'].currency, amount=Decimal('50.00'))
+        api_client.credentials(HTTP_AUTHORIZATION='Basic ' + base64.b64encode(b'basic-user:secret').decode())
+
+        response = api_client.post(
+            '/api/transactions/async/service-spend/', {'sum': '20', 'currency_id': 'RUB'}, format='json',
+        )
+
+        assert response.status_code == 201
+        assert response.json()['balances'] == {'RUB': '30.00'}
+        assert Transaction.objects.get().user == user
+        balances['RUB'].refresh_from_db()
+        assert balances['RUB'].amount == Decimal('100000.00')
+
+    def test_async_rejects_bad_credentials(self, api_client, balances):
+        """Тест что неверные учётные данные отклоняются так же, как синхронным эндпоинтом"""
+        User.objects.create_user(username='basic-user', password='secret')
+        api_client.credentials(HTTP_AUTHORIZATION='Basic ' + base64.b64encode(b'basic-user:wrong').decode())
+        data = {'sum': '20', 'currency_id': 'RUB'}
+
+        sync_response = api_client.post('/api/transactions/service-spend/', data, format='json')
+        async_response = api_client.post('/api/transactions/async/service-spend/', data, format='json')
+
+        assert async_response.status_code == sync_response.status_code == 403
+        assert async_response.json() == sync_response.json()
+        assert Transaction.objects.count() == 0
@@ -0,0 +1,90 @@
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from billing.models import Balance, Transaction
+
+
+RUB_TO_USD = {'sum': '1', 'currency_id': 'USD', 'gross_currency_id': 'RUB', 'exchange_rate': '85.0'}
+USD_TO_RUB = {'sum': '85', 'currency_id': 'RUB', 'gross_currency_id': 'USD', 'exchange_rate': '85.0'}
+
+
+def balance_queries(queries):
+    return [query['sql'] for query in queries if '"billing_balance"' in query['sql']]
+
+
+@pytest.mark.django_db
+class TestBalanceLocking:
+    """Тесты блокировки счетов операциями с несколькими валютами"""
+
+    @pytest.mark.parametrize('payload', [RUB_TO_USD, USD_TO_RUB])
+    def test_conversion_locks_accounts_in_one_query(self, api_client, balances, payload):
+        """Тест что конвертация в любую сторону блокирует оба счёта одним запросом в порядке ID"""
+        with CaptureQueriesContext(connection) as captured:
+            response = api_client.post('/api/transactions/conversion/', payload, format='json')
+        assert response.status_code == 201
+
+        queries = balance_queries(captured.captured_queries)
+        assert queries[0].startswith('SELECT')
+        assert 'ORDER BY "billing_balance"."id" ASC' in queries[0]
+        assert sum(1 for sql in queries if sql.startswith('SELECT')) == 1
+        if connection.features.has_select_for_update:
+            assert 'FOR UPDATE' in queries[0]
+
+    def test_single_account_operation_takes_no_lock(self, api_client, balances):
+        """Тест что покупка в рублях меняет счёт условным UPDATE без SELECT"""
+        with CaptureQueriesContext(connection) as captured:
+            response = api_client.post('/api/transactions/service-spend/', {'sum': '10', 'currency_id': 'RUB'}, format='json')
+        assert response.status_code == 201
+        assert [sql.split()[0] for sql in balance_queries(captured.captured_queries)] == ['UPDATE']
+
+    def test_conversion_across_shards(self, api_client, balances):
+        """Тест что списание конвертации забирается с нескольких шардов"""
+        Balance.objects.account(None, 'RUB').reshard(4)
+        payload = {**RUB_TO_USD, 'sum': '500'}
+
+        response = api_client.post('/api/transactions/conversion/', payload, format='json')
+
+        assert response.status_code == 201
+        assert response.data['balances'] == {'RUB': '57500.00', 'USD': '1500.00'}
+        assert Balance.objects.account(None, 'RUB').total() == Decimal('57500.00')
+
+    def test_insufficient_funds_changes_nothing(self, api_client, balances):
+        """Тест что при нехватке средств ни один счёт не меняется"""
+        payload = {**USD_TO_RUB, 'sum': '85001'}
+
+        response = api_client.post('/api/transactions/conversion/', payload, format='json')
+
+        assert response.status_code == 400
+        assert response.data == {'error': 'Недостаточно средств. Доступно: 1000.00 USD'}
+        assert Balance.objects.get(currency_id='RUB').amount == Decimal('100000.00')
+        assert Balance.objects.get(currency_id='USD').amount == Decimal('1000.00')
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.skipif(
+    not connection.features.has_select_for_update,
+    reason='Нужен бэкенд с блокировкой строк (BILLING_DB_PROFILE=postgresql): тестовая SQLite в памяти блокирует таблицы целиком',
+)
+class TestConcurrentConversions:
+    """Тесты встречных конвертаций из нескольких потоков"""
+
+    def test_mixed_directions_do_not_deadlock(self, balances):
+        """Тест что встречные конвертации проходят все и сохраняют сумму остатков"""
+        def convert(payload):
+            try:
+                return APIClient().post('/api/transactions/conversion/', payload, format='json').status_code
+            finally:
+                connections.close_all()
+
+        payloads = [RUB_TO_USD, USD_TO_RUB] * 20
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            statuses = list(pool.map(convert, payloads))
+
+        assert statuses == [201] * len(payloads)
+        assert Transaction.objects.count() == len(payloads)
+        # 20 раз купили 1 USD за 85 RUB и 20 раз продали 1 USD за 85 RUB
+        assert Balance.objects.get(currency_id='RUB').amount == Decimal('100000.00')
+        assert Balance.objects.get(currency_id='USD').amount == Decimal('1000.00')
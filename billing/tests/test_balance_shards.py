@@ -0,0 +1,108 @@
+import pytest
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from billing.models import Balance, Transaction
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(username='client')
+
+
+@pytest.mark.django_db
+class TestBalanceShards:
+    """Тесты для счетов из нескольких шардов"""
+
+    def test_reshard_splits_amount(self, balances):
+        """Тест что reshard делит остаток между шардами без потери копеек"""
+        Balance.objects.account(None, 'USD').reshard(3)
+
+        shards = list(Balance.objects.account(None, 'USD').order_by('shard'))
+        assert [shard.amount for shard in shards] == [Decimal('333.34'), Decimal('333.33'), Decimal('333.33')]
+        assert {shard.shard_count for shard in shards} == {3}
+        assert Balance.objects.account(None, 'USD').total() == Decimal('1000.00')
+
+    def test_reshard_back_to_single_row(self, balances):
+        """Тест что reshard(1) собирает счёт обратно в одну строку"""
+        account = Balance.objects.account(None, 'USD')
+        account.reshard(4)
+        account.reshard(1)
+
+        assert account.count() == 1
+        assert account.get().amount == Decimal('1000.00')
+        assert account.get().shard_count == 1
+
+    def test_withdraw_returns_account_total(self, balances):
+        """Тест что списание из шардированного счёта возвращает сумму всех шардов"""
+        account = Balance.objects.account(None, 'USD')
+        account.reshard(4)
+
+        assert account.withdraw(Decimal('100.00')) == Decimal('900.00')
+        assert account.deposit(Decimal('50.00')) == Decimal('950.00')
+
+    def test_withdraw_larger_than_any_shard(self, balances):
+        """Тест что списание больше одного шарда забирается из нескольких"""
+        account = Balance.objects.account(None, 'USD')
+        account.reshard(4)
+
+        assert account.withdraw(Decimal('600.00')) == Decimal('400.00')
+        assert account.total() == Decimal('400.00')
+        assert all(shard.amount >= 0 for shard in account)
+
+    def test_withdraw_more_than_total_fails(self, balances):
+        """Тест что сумма шардов проверяется целиком"""
+        account = Balance.objects.account(None, 'USD')
+        account.reshard(2)
+
+        with pytest.raises(ValueError, match="Доступно: 1000.00 USD"):
+            account.withdraw(Decimal('1000.01'))
+        assert account.total() == Decimal('1000.00')
+
+
+@pytest.mark.django_db
+class TestUserBalances:
+    """Тесты для балансов пользователей"""
+
+    def test_authenticated_user_spends_own_balance(self, api_client, balances, user):
+        """Тест что авторизованный пользователь списывает со своего счёта"""
+        Balance.objects.create(user=user, currency=balances['RUB'].currency, amount=Decimal('500.00'))
+        api_client.force_authenticate(user)
+
+        response = api_client.post(
+            '/api/transactions/service-spend/', {'sum': '200', 'currency_id': 'RUB'}, format='json',
+        )
+
+        assert response.status_code == 201
+        assert Decimal(response.data['balances']['RUB']) == Decimal('300.00')
+        assert Transaction.objects.get().user == user
+        balances['RUB'].refresh_from_db()
+        assert balances['RUB'].amount == Decimal('100000.00')
+
+    def test_user_without_balance_gets_error(self, api_client, balances, user):
+        """Тест что общий счёт не используется для пользователя без своего баланса"""
+        api_client.force_authenticate(user)
+
+        response = api_client.post(
+            '/api/transactions/service-spend/', {'sum': '200', 'currency_id': 'RUB'}, format='json',
+        )
+
+        assert response.status_code == 400
+        assert Transaction.objects.count() == 0
+
+    def test_init_balances_for_user(self, currencies, user):
+        """Тест команды init_balances --user"""
+        call_command('init_balances', user=user.pk)
+        call_command('init_balances', user=user.pk)
+
+        assert Balance.objects.filter(user=user).count() == 2
+        assert Balance.objects.filter(user__isnull=True).count() == 0
+
+    def test_shard_balance_command(self, currencies, user):
+        """Тест команды shard_balance"""
+        Balance.objects.create(user=user, currency=currencies['RUB'], amount=Decimal('100.00'))
+
+        call_command('shard_balance', 'rub', shards=2, user=user.pk)
+
+        assert Balance.objects.account(user, 'RUB').count() == 2
+        assert Balance.objects.account(user, 'RUB').total() == Decimal('100.00')
@@ -0,0 +1,162 @@
+import pytest
+from decimal import Decimal
+from billing.models import Currency, Transaction
+
+
+@pytest.mark.django_db
+class TestBatchAPI:
+    """Тесты для API пакетных операций"""
+
+    url = '/api/transactions/batch/'
+
+    def test_atomic_batch_applies_all_items(self, api_client, balances):
+        """Тест успешного пакета из операций всех типов"""
+        data = {
+            'items': [
+                {'type': 'account_topup', 'sum': '5000', 'currency_id': 'RUB'},
+                {'type': 'service_spend', 'sum': '1000', 'currency_id': 'RUB'},
+                {'type': 'conversion', 'sum': '100', 'currency_id': 'USD',
+                 'gross_currency_id': 'RUB', 'exchange_rate': '85.0'},
+            ]
+        }
+
+        response = api_client.post(self.url, data, format='json')
+
+        assert response.status_code == 201
+        assert response.data['mode'] == 'atomic'
+        assert [r['status'] for r in response.data['results']] == ['ok', 'ok', 'ok']
+        assert response.data['results'][0]['transaction']['balances'] == {'RUB': '105000.00'}
+        assert response.data['results'][1]['transaction']['balances'] == {'RUB': '104000.00'}
+        assert response.data['results'][2]['transaction']['balances'] == {'RUB': '95500.00', 'USD': '1100.00'}
+
+        balances['RUB'].refresh_from_db()
+        balances['USD'].refresh_from_db()
+        assert balances['RUB'].amount == Decimal('95500.00')
+        assert balances['USD'].amount == Decimal('1100.00')
+
+        assert Transaction.objects.count() == 3
+        ids = [r['transaction']['id'] for r in response.data['results']]
+        assert set(Transaction.objects.values_list('id', flat=True)) == set(ids)
+
+    def test_atomic_batch_rolls_back_on_insufficient_funds(self, api_client, balances):
+        """Тест что в режиме atomic нехватка средств отменяет весь пакет"""
+        data = {
+            'items': [
+                {'type': 'account_topup', 'sum': '5000', 'currency_id': 'RUB'},
+                {'type': 'service_spend', 'sum': '200000', 'currency_id': 'RUB'},
+            ]
+        }
+
+        response = api_client.post(self.url, data, format='json')
+
+        assert response.status_code == 400
+        assert response.data['results'][0]['index'] == 1
+        assert 'Недостаточно средств' in str(response.data)
+
+        balances['RUB'].refresh_from_db()
+        assert balances['RUB'].amount == Decimal('100000.00')
+        assert Transaction.objects.count() == 0
+
+    def test_atomic_batch_rejects_invalid_item(self, api_client, balances):
+        """Тест что ошибка валидации элемента отменяет пакет в режиме atomic"""
+        data = {
+            'items': [
+                {'type': 'account_topup', 'sum': '5000', 'currency_id': 'RUB'},
+                {'type': 'service_spend', 'sum': '-1', 'currency_id': 'RUB'},
+            ]
+        }
+
+        response = api_client.post(self.url, data, format='json')
+
+        assert response.status_code == 400
+        assert 'sum' in response.data['results'][0]['errors']
+        assert Transaction.objects.count() == 0
+
+    def test_best_effort_batch_skips_failed_items(self, api_client, balances):
+        """Тест что в режиме best_effort ошибочные элементы пропускаются"""
+        data = {
+            'mode': 'best_effort',
+            'items': [
+                {'type': 'service_spend', 'sum': '200000', 'currency_id': 'RUB'},
+                {'type': 'service_spend', 'sum': '1000', 'currency_id': 'RUB'},
+                {'type': 'account_topup', 'sum': '100', 'currency_id': 'USD'},
+            ]
+        }
+
+        response = api_client.post(self.url, data, format='json')
+
+        assert response.status_code == 200
+        assert [r['status'] for r in response.data['results']] == ['error', 'ok', 'error']
+        assert 'необходимы поля gross_currency_id и exchange_rate' in str(response.data['results'][2]).lower()
+
+        balances['RUB'].refresh_from_db()
+        assert balances['RUB'].amount == Decimal('99000.00')
+        assert Transaction.objects.count() == 1
+
+    def test_missing_balance_fails_only_its_item(self, api_client, balances):
+        """Тест что элемент со счётом без баланса отклоняется, а остальные в режиме best_effort проходят"""
+        Currency.objects.create(code='EUR', name='Euro')
+        items = [
+            {'type': 'service_spend', 'sum': '100', 'currency_id': 'RUB'},
+            {
+                'type': 'conversion', 'sum': '10', 'currency_id': 'EUR',
+                'gross_currency_id': 'RUB', 'exchange_rate': '100',
+            },
+        ]
+
+        best_effort = api_client.post(self.url, {'mode': 'best_effort', 'items': items}, format='json')
+
+        assert best_effort.status_code == 200
+        assert [r['status'] for r in best_effort.data['results']] == ['ok', 'error']
+        assert best_effort.data['results'][1]['errors'] == {'error': 'Баланс для валюты EUR не найден'}
+        balances['RUB'].refresh_from_db()
+        assert balances['RUB'].amount == Decimal('99900.00')
+
+        atomic = api_client.post(self.url, {'mode': 'atomic', 'items': items}, format='json')
+
+        assert atomic.status_code == 400
+        assert atomic.data['results'][0]['errors'] == {'error': 'Баланс для валюты EUR не найден'}
+        assert Transaction.objects.count() == 1
+
+    def test_later_item_sees_earlier_changes(self, api_client, balances):
+        """Тест что проверка остатка учитывает предыдущие элементы пакета"""
+        data = {
+            'items': [
+                {'type': 'service_spend', 'sum': '60000', 'currency_id': 'RUB'},
+                {'type': 'service_spend', 'sum': '60000', 'currency_id': 'RUB'},
+            ]
+        }
+
+        response = api_client.post(self.url, data, format='json')
+
+        assert response.status_code == 400
+        assert response.data['results'][0]['index'] == 1
+
+    def test_batch_uses_constant_number_of_queries(self, api_client, balances, django_assert_max_num_queries):
+        """Тест что число запросов не растёт с размером пакета"""
+        data = {
+            'items': [{'type': 'account_topup', 'sum': '10', 'currency_id': 'RUB'}] * 50
+        }
+
+        # SAVEPOINT, чтение валют, блокировка, UPDATE баланса, INSERT транзакций, INSERT проводок, RELEASE
+        # и дневной оборот: UPDATE, затем SAVEPOINT, INSERT, RELEASE для новой строки
+        with django_assert_max_num_queries(11):
+            response = api_client.post(self.url, data, format='json')
+
+        assert response.status_code == 201
+        assert Transaction.objects.count() == 50
+
+    def test_unknown_item_type(self, api_client, balances):
+        """Тест неизвестного типа операции"""
+        data = {'items': [{'type': 'refund', 'sum': '10', 'currency_id': 'RUB'}]}
+
+        response = api_client.post(self.url, data, format='json')
+
+        assert response.status_code == 400
+        assert 'items' in response.data
+
+    def test_empty_batch(self, api_client, balances):
+        """Тест пустого пакета"""
+        response = api_client.post(self.url, {'items': []}, format='json')
+
+        assert response.status_code == 400
@@ -1,6 +1,6 @@
 import pytest
 from decimal import Decimal
-from billing.models import Transaction
+from billing.models import Balance, Currency, Transaction
 
 
 @pytest.mark.django_db
@@ -177,3 +177,41 @@ class TestConversionAPI:
 
         assert balances['RUB'].amount == initial_rub - Decimal('850.00')
         assert balances['USD'].amount == initial_usd + Decimal('10.00')
+
+    def test_conversion_between_non_rub_currencies(self, api_client, balances):
+        """Тест конвертации USD → EUR: списание и зачисление проводятся вместе"""
+        eur = Currency.objects.create(code='EUR', name='Euro')
+        eur_balance = Balance.objects.create(currency=eur, amount=Decimal('0'))
+
+        data = {
+            'sum': '100',
+            'currency_id': 'EUR',
+            'gross_currency_id': 'USD',
+            'exchange_rate': '1.08'  # долларов за евро
+        }
+
+        response = api_client.post('/api/transactions/conversion/', data, format='json')
+
+        assert response.status_code == 201
+        assert response.data['balances'] == {'USD': '892.00', 'EUR': '100.00'}
+        eur_balance.refresh_from_db()
+        assert eur_balance.amount == Decimal('100.00')
+        txn = Transaction.objects.get()
+        assert sorted(txn.ledger_entries.values_list('currency_id', 'account', 'amount')) == [
+            ('EUR', 'client', Decimal('100.00')),
+            ('EUR', 'external', Decimal('-100.00')),
+            ('USD', 'client', Decimal('-108.00')),
+            ('USD', 'external', Decimal('108.00')),
+        ]
+
+    def test_non_rub_conversion_insufficient_funds(self, api_client, balances):
+        """Тест что при нехватке исходной валюты целевая не зачисляется"""
+        eur = Currency.objects.create(code='EUR', name='Euro')
+        Balance.objects.create(currency=eur, amount=Decimal('0'))
+
+        data = {'sum': '1000', 'currency_id': 'EUR', 'gross_currency_id': 'USD', 'exchange_rate': '1.08'}
+        response = api_client.post('/api/transactions/conversion/', data, format='json')
+
+        assert response.status_code == 400
+        assert Balance.objects.get(currency=eur).amount == Decimal('0')
+        assert Transaction.objects.count() == 0
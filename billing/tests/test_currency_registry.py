@@ -0,0 +1,68 @@
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from billing.currencies import currency_registry
+from billing.models import Currency
+
+
+@pytest.mark.django_db
+class TestCurrencyRegistry:
+    """Тесты для процессного реестра валют"""
+
+    def test_get_loads_all_currencies_in_one_query(self, currencies, django_assert_num_queries):
+        """Тест что первое обращение загружает весь справочник одним запросом"""
+        with django_assert_num_queries(1):
+            assert currency_registry.get('RUB') == currencies['RUB']
+            assert currency_registry.get('USD') == currencies['USD']
+
+    def test_warm_registry_serves_without_queries(self, currencies, django_assert_num_queries):
+        """Тест что прогретый реестр не ходит в БД"""
+        currency_registry.warm()
+
+        with django_assert_num_queries(0):
+            assert currency_registry.get('RUB').code == 'RUB'
+
+    def test_unknown_currency_raises(self, currencies):
+        """Тест несуществующей валюты"""
+        with pytest.raises(Currency.DoesNotExist):
+            currency_registry.get('EUR')
+
+    def test_post_save_invalidates_registry(self, currencies):
+        """Тест что новая валюта видна после сохранения"""
+        currency_registry.warm()
+        Currency.objects.create(code='EUR', name='Euro')
+
+        assert {c.code for c in currency_registry.all()} == {'RUB', 'USD', 'EUR'}
+
+    def test_post_delete_invalidates_registry(self, currencies):
+        """Тест что удалённая валюта пропадает из реестра"""
+        eur = Currency.objects.create(code='EUR', name='Euro')
+        currency_registry.warm()
+        eur.delete()
+
+        with pytest.raises(Currency.DoesNotExist):
+            currency_registry.get('EUR')
+
+    def test_init_currencies_invalidates_registry(self):
+        """Тест что init_currencies сбрасывает реестр"""
+        currency_registry.warm()
+        assert currency_registry.all() == []
+
+        call_command('init_currencies')
+
+        assert {c.code for c in currency_registry.all()} == {'RUB', 'USD'}
+
+    def test_transaction_post_uses_registry(self, api_client, balances):
+        """Тест что запрос на покупку не читает валюты из БД при прогретом реестре"""
+        currency_registry.warm()
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = api_client.post(
+                '/api/transactions/service-spend/',
+                {'sum': '50', 'currency_id': 'USD', 'gross_currency_id': 'RUB', 'exchange_rate': '85.0'},
+                format='json',
+            )
+
+        assert response.status_code == 201
+        assert not [q for q in ctx.captured_queries if 'FROM "billing_currency"' in q['sql']]
@@ -0,0 +1,135 @@
+import pytest
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+from billing.models import AggregateWatermark, Transaction, TransactionDailyAggregate
+
+
+def topup(api_client, amount):
+    return api_client.post(
+        '/api/transactions/account-topup/', {'sum': amount, 'currency_id': 'RUB'}, format='json',
+    )
+
+
+@pytest.mark.django_db
+class TestDailyAggregates:
+    """Тесты для дневных оборотов"""
+
+    def test_inline_aggregates(self, api_client, balances):
+        """Тест что оборот обновляется в транзакции операции"""
+        topup(api_client, '100')
+        topup(api_client, '50.5')
+        api_client.post('/api/transactions/service-spend/', {'sum': '1000000', 'currency_id': 'RUB'}, format='json')
+
+        aggregate = TransactionDailyAggregate.objects.get()
+        assert aggregate.day == timezone.localdate()
+        assert aggregate.transaction_type == 'account_topup'
+        assert aggregate.amount == Decimal('150.5')
+        assert aggregate.count == 2
+
+    def test_batch_aggregates(self, api_client, balances):
+        """Тест что пакет учитывается в обороте одним обновлением на ключ"""
+        api_client.post('/api/transactions/batch/', {'items': [
+            {'type': 'account_topup', 'sum': '10', 'currency_id': 'RUB'},
+            {'type': 'service_spend', 'sum': '3', 'currency_id': 'RUB'},
+            {'type': 'account_topup', 'sum': '5', 'currency_id': 'RUB'},
+        ]}, format='json')
+
+        totals = dict(TransactionDailyAggregate.objects.values_list('transaction_type', 'count'))
+        assert totals == {'account_topup': 2, 'service_spend': 1}
+
+    @override_settings(BILLING_DAILY_AGGREGATES_INLINE=False)
+    def test_catch_up_command(self, api_client, balances):
+        """Тест что команда учитывает только транзакции после отметки"""
+        topup(api_client, '100')
+        topup(api_client, '200')
+        assert not TransactionDailyAggregate.objects.exists()
+
+        call_command('update_daily_aggregates', lag=0)
+        topup(api_client, '300')
+        call_command('update_daily_aggregates', lag=0)
+        call_command('update_daily_aggregates', lag=0)
+
+        aggregate = TransactionDailyAggregate.objects.get()
+        assert aggregate.amount == Decimal('600')
+        assert aggregate.count == 3
+        assert AggregateWatermark.objects.get().last_transaction_id == Transaction.objects.latest('id').id
+
+    @override_settings(BILLING_DAILY_AGGREGATES_INLINE=False)
+    def test_catch_up_skips_fresh_transactions(self, api_client, balances):
+        """Тест что транзакции моложе --lag откладываются до следующего запуска"""
+        topup(api_client, '100')
+        Transaction.objects.update(created_at=timezone.now() - timedelta(minutes=5))
+        topup(api_client, '200')
+
+        call_command('update_daily_aggregates', lag=60)
+
+        assert TransactionDailyAggregate.objects.get().amount == Decimal('100')
+
+    def test_inline_mode_command_moves_watermark(self, api_client, balances):
+        """Тест что в синхронном режиме команда не считает транзакции второй раз"""
+        topup(api_client, '100')
+
+        call_command('update_daily_aggregates', lag=0)
+
+        assert TransactionDailyAggregate.objects.get().amount == Decimal('100')
+        assert AggregateWatermark.objects.get().last_transaction_id == Transaction.objects.get().id
+
+    def test_rebuild(self, api_client, balances):
+        """Тест полного пересчёта по таблице транзакций"""
+        topup(api_client, '100')
+        topup(api_client, '200')
+        TransactionDailyAggregate.objects.update(amount=0, count=0)
+
+        call_command('update_daily_aggregates', rebuild=True)
+
+        aggregate = TransactionDailyAggregate.objects.get()
+        assert aggregate.amount == Decimal('300')
+        assert aggregate.count == 2
+
+
+@pytest.mark.django_db
+class TestTurnoverAPI:
+    """Тесты для API оборота за период"""
+
+    url = '/api/transactions/turnover/'
+
+    @pytest.fixture
+    def aggregates(self, currencies):
+        today = timezone.localdate()
+        rows = [
+            (today - timedelta(days=2), 'RUB', 'account_topup', '100', 1),
+            (today - timedelta(days=1), 'RUB', 'account_topup', '250', 2),
+            (today - timedelta(days=1), 'USD', 'conversion', '10', 1),
+            (today, 'RUB', 'service_spend', '40', 4),
+        ]
+        TransactionDailyAggregate.objects.bulk_create(
+            TransactionDailyAggregate(day=day, currency_id=code, transaction_type=kind, amount=Decimal(amount), count=count)
+            for day, code, kind, amount, count in rows
+        )
+        return today
+
+    def test_period_totals(self, api_client, aggregates):
+        """Тест итогов по валютам и типам за период"""
+        response = api_client.get(self.url, {'date_from': aggregates - timedelta(days=2), 'date_to': aggregates - timedelta(days=1)})
+
+        assert response.status_code == 200
+        assert response.data['results'] == [
+            {'currency': 'RUB', 'transaction_type': 'account_topup', 'amount': '350.00000', 'count': 3},
+            {'currency': 'USD', 'transaction_type': 'conversion', 'amount': '10.00000', 'count': 1},
+        ]
+
+    def test_group_by_day_and_filters(self, api_client, aggregates):
+        """Тест разбивки по дням с фильтром по валюте и типу"""
+        response = api_client.get(self.url, {'group_by': 'day', 'currency': 'rub', 'transaction_type': 'account_topup'})
+
+        assert [row['count'] for row in response.data['results']] == [1, 2]
+        assert all('day' in row for row in response.data['results'])
+
+    def test_invalid_period(self, api_client, aggregates):
+        """Тест что date_from позже date_to отклоняется"""
+        response = api_client.get(self.url, {'date_from': aggregates, 'date_to': aggregates - timedelta(days=1)})
+
+        assert response.status_code == 400
@@ -0,0 +1,67 @@
+import pytest
+from pathlib import Path
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from config.database import get_databases
+
+
+class TestDatabaseProfiles:
+    """Тесты для профилей подключения к БД"""
+
+    base_dir = Path('/srv/billing')
+
+    def test_sqlite_is_default(self):
+        """Тест профиля по умолчанию"""
+        database = get_databases(self.base_dir, {})['default']
+
+        assert database['ENGINE'] == 'django.db.backends.sqlite3'
+        assert database['NAME'] == self.base_dir / 'db.sqlite3'
+        assert 'PRAGMA journal_mode=WAL' in database['OPTIONS']['init_command']
+        assert 'PRAGMA synchronous=NORMAL' in database['OPTIONS']['init_command']
+        assert 'PRAGMA busy_timeout=5000' in database['OPTIONS']['init_command']
+        assert database['OPTIONS']['transaction_mode'] == 'IMMEDIATE'
+
+    def test_postgresql_with_pool(self):
+        """Тест PostgreSQL с пулом соединений"""
+        database = get_databases(self.base_dir, {
+            'BILLING_DB_PROFILE': 'postgresql',
+            'POSTGRES_HOST': 'db',
+            'BILLING_DB_POOL_MAX_SIZE': '20',
+        })['default']
+
+        assert database['ENGINE'] == 'django.db.backends.postgresql'
+        assert database['HOST'] == 'db'
+        assert database['CONN_MAX_AGE'] == 0
+        assert database['CONN_HEALTH_CHECKS'] is True
+        assert database['OPTIONS']['pool'] == {'min_size': 2, 'max_size': 20, 'timeout': 10}
+
+    def test_postgresql_with_persistent_connections(self):
+        """Тест PostgreSQL без пула: постоянные соединения"""
+        database = get_databases(self.base_dir, {
+            'BILLING_DB_PROFILE': 'postgresql',
+            'BILLING_DB_POOL': '0',
+            'BILLING_DB_CONN_MAX_AGE': '300',
+        })['default']
+
+        assert database['CONN_MAX_AGE'] == 300
+        assert 'pool' not in database['OPTIONS']
+
+    def test_unknown_profile(self):
+        """Тест неизвестного профиля"""
+        with pytest.raises(ImproperlyConfigured):
+            get_databases(self.base_dir, {'BILLING_DB_PROFILE': 'oracle'})
+
+    def test_invalid_number(self):
+        """Тест некорректного числового параметра"""
+        with pytest.raises(ImproperlyConfigured):
+            get_databases(self.base_dir, {'BILLING_SQLITE_BUSY_TIMEOUT': 'soon'})
+
+    @pytest.mark.django_db
+    @pytest.mark.skipif(connection.vendor != 'sqlite', reason='PRAGMA есть только в SQLite')
+    def test_sqlite_pragmas_applied_on_connect(self):
+        """Тест что PRAGMA применяются к реальному соединению"""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            assert cursor.fetchone()[0] == 1  # NORMAL
+            cursor.execute('PRAGMA busy_timeout')
+            assert cursor.fetchone()[0] == 5000
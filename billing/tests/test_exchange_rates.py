@@ -0,0 +1,266 @@
+import json
+import pytest
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from django.core.management import CommandError, call_command
+from django.test import override_settings
+from django.utils import timezone
+from billing.models import Balance, Currency, ExchangeRate, Transaction
+from billing.rates import RateCache, RateTable, rate_cache
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=dt_timezone.utc)
+
+
+class TestRateTable:
+    """Тесты для поиска курса по времени"""
+
+    table = RateTable([
+        ('USD', 'RUB', utc(2026, 1, 3), Decimal('90')),
+        ('USD', 'RUB', utc(2026, 1, 1), Decimal('80')),
+        ('USD', 'RUB', utc(2026, 1, 2), Decimal('85')),
+    ])
+
+    def test_rate_by_validity_time(self):
+        """Тест что берётся последний снимок, начавший действовать к моменту"""
+        assert self.table.get('USD', 'RUB', utc(2026, 1, 1)) == Decimal('80')
+        assert self.table.get('USD', 'RUB', utc(2026, 1, 2, 12)) == Decimal('85')
+        assert self.table.get('USD', 'RUB', utc(2027, 1, 1)) == Decimal('90')
+
+    def test_rate_before_first_snapshot(self):
+        """Тест что до первого снимка курса нет"""
+        assert self.table.get('USD', 'RUB', utc(2025, 12, 31)) is None
+        assert self.table.get('EUR', 'RUB', utc(2026, 1, 2)) is None
+
+    def test_inverse_pair(self):
+        """Тест что обратная пара вычисляется из прямой"""
+        assert self.table.get('RUB', 'USD', utc(2026, 1, 1)) == Decimal(1) / Decimal('80')
+
+
+class TestCrossRates:
+    """Тесты для курсов пар без прямого снимка"""
+
+    table = RateTable([
+        ('USD', 'RUB', utc(2026, 1, 1), Decimal('80')),
+        ('EUR', 'RUB', utc(2026, 1, 1), Decimal('100')),
+        ('KZT', 'USD', utc(2026, 1, 1), Decimal('0.002')),
+        ('EUR', 'RUB', utc(2026, 1, 2), Decimal('96')),
+        ('XAU', 'CHF', utc(2026, 1, 1), Decimal('2000')),
+    ])
+
+    def test_cross_rate_through_common_currency(self):
+        """Тест что EUR/USD считается через RUB"""
+        assert self.table.get('EUR', 'USD', utc(2026, 1, 1, 12)) == Decimal('1.25')
+        assert self.table.get('USD', 'EUR', utc(2026, 1, 1, 12)) == Decimal('0.8')
+        assert self.table.get('EUR', 'USD', utc(2026, 1, 3)) == Decimal('1.2')
+
+    def test_multi_hop_rate(self):
+        """Тест пути через две промежуточные валюты с округлением до точности поля"""
+        # 1 EUR = 100 RUB = 1.25 USD = 625 KZT
+        assert self.table.get('EUR', 'KZT', utc(2026, 1, 1, 12)) == Decimal('625')
+        assert self.table.get('KZT', 'EUR', utc(2026, 1, 1, 12)) == Decimal('0.0016')
+
+    def test_unconnected_pair(self):
+        """Тест что у валют из несвязанных групп курса нет"""
+        assert self.table.get('XAU', 'RUB', utc(2026, 1, 2)) is None
+        assert self.table.get('XAU', 'CHF', utc(2025, 1, 1)) is None
+
+    def test_current_rates_rebuilt_with_next_snapshot(self, monkeypatch):
+        """Тест что таблица текущих курсов пересчитывается, только когда начинает действовать новый снимок"""
+        table = RateTable([
+            ('USD', 'RUB', utc(2026, 1, 1), Decimal('80')),
+            ('EUR', 'RUB', utc(2026, 1, 1), Decimal('100')),
+            ('EUR', 'RUB', utc(2026, 1, 2), Decimal('96')),
+        ])
+        monkeypatch.setattr('billing.rates.timezone.now', lambda: utc(2026, 1, 1, 12))
+        current = table.current_rates()
+        assert table.get('EUR', 'USD') == Decimal('1.25')
+        assert table.current_rates() is current
+
+        monkeypatch.setattr('billing.rates.timezone.now', lambda: utc(2026, 1, 2, 12))
+        assert table.get('EUR', 'USD') == Decimal('1.2')
+        assert table.current_rates() is not current
+
+
+@pytest.mark.django_db
+class TestRateCache:
+    """Тесты для процессного кэша курсов"""
+
+    def add_rate(self, rate, valid_from):
+        # bulk_create не отправляет сигналы: так изменения видит другой процесс
+        ExchangeRate.objects.bulk_create([
+            ExchangeRate(base_id='USD', quote_id='RUB', rate=Decimal(rate), valid_from=valid_from),
+        ])
+
+    def test_cache_serves_from_memory(self, currencies, django_assert_num_queries):
+        """Тест что повторный поиск в пределах TTL не обращается к БД"""
+        self.add_rate('85', timezone.now() - timedelta(days=1))
+        assert rate_cache.get('USD', 'RUB') == Decimal('85')
+
+        with django_assert_num_queries(0):
+            assert rate_cache.get('USD', 'RUB') == Decimal('85')
+
+    @override_settings(BILLING_RATE_CACHE_TTL=0)
+    def test_cache_picks_up_new_snapshot(self, currencies):
+        """Тест что после TTL кэш видит новый снимок, загруженный в обход сигналов"""
+        self.add_rate('85', timezone.now() - timedelta(days=1))
+        assert rate_cache.get('USD', 'RUB') == Decimal('85')
+
+        self.add_rate('87', timezone.now() - timedelta(hours=1))
+
+        assert rate_cache.get('USD', 'RUB') == Decimal('87')
+
+    def test_save_invalidates_cache(self, currencies):
+        """Тест что сохранение курса через ORM сразу сбрасывает кэш"""
+        assert rate_cache.get('USD', 'RUB') is None
+
+        ExchangeRate.objects.create(
+            base_id='USD', quote_id='RUB', rate=Decimal('85'), valid_from=timezone.now() - timedelta(days=1),
+        )
+
+        assert rate_cache.get('USD', 'RUB') == Decimal('85')
+
+
+@pytest.mark.django_db
+class TestLoadExchangeRates:
+    """Тесты для команды load_exchange_rates"""
+
+    def test_load_csv_and_json(self, currencies, tmp_path):
+        """Тест загрузки CSV и JSON-снимка из каталога"""
+        (tmp_path / 'a.csv').write_text(
+            'base,quote,rate,valid_from\n'
+            'USD,RUB,80.5,2026-01-01T00:00:00+00:00\n'
+            'usd,rub,81,2026-01-02\n'
+        )
+        (tmp_path / 'b.json').write_text(json.dumps(
+            {'valid_from': '2026-01-03T00:00:00Z', 'quote': 'RUB', 'rates': {'USD': '82.25'}}
+        ))
+
+        call_command('load_exchange_rates', str(tmp_path))
+
+        assert list(ExchangeRate.objects.order_by('valid_from').values_list('rate', flat=True)) == [
+            Decimal('80.5'), Decimal('81'), Decimal('82.25'),
+        ]
+        assert rate_cache.get('USD', 'RUB', utc(2026, 1, 2, 12)) == Decimal('81')
+
+    def test_reload_updates_rate(self, currencies, tmp_path):
+        """Тест что повторная загрузка того же снимка обновляет курс, а не дублирует"""
+        path = tmp_path / 'rates.csv'
+        path.write_text('base,quote,rate,valid_from\nUSD,RUB,80,2026-01-01T00:00:00Z\n')
+        call_command('load_exchange_rates', str(path))
+        path.write_text('base,quote,rate,valid_from\nUSD,RUB,79,2026-01-01T00:00:00Z\n')
+        call_command('load_exchange_rates', str(path))
+
+        assert ExchangeRate.objects.get().rate == Decimal('79')
+
+    @override_settings(BILLING_RATE_CACHE_TTL=0)
+    def test_correction_reaches_other_processes(self, currencies, tmp_path):
+        """Тест что исправленный загрузчиком курс видит кэш другого процесса"""
+        path = tmp_path / 'rates.csv'
+        path.write_text('base,quote,rate,valid_from\nUSD,RUB,80,2026-01-01T00:00:00Z\n')
+        call_command('load_exchange_rates', str(path))
+        other = RateCache()
+        assert other.get('USD', 'RUB') == Decimal('80')
+
+        path.write_text('base,quote,rate,valid_from\nUSD,RUB,79,2026-01-01T00:00:00Z\n')
+        call_command('load_exchange_rates', str(path))
+
+        # Сброс загрузчика доходит только до кэша своего процесса
+        assert other.get('USD', 'RUB') == Decimal('79')
+
+    def test_unknown_currency(self, currencies, tmp_path):
+        """Тест что неизвестная валюта останавливает загрузку"""
+        path = tmp_path / 'rates.csv'
+        path.write_text('base,quote,rate,valid_from\nXXX,RUB,80,2026-01-01T00:00:00Z\n')
+
+        with pytest.raises(CommandError, match='неизвестная валюта'):
+            call_command('load_exchange_rates', str(path))
+        assert not ExchangeRate.objects.exists()
+
+
+@pytest.mark.django_db
+class TestServerRateFallback:
+    """Тесты для курса из таблицы, когда клиент его не передал"""
+
+    @pytest.fixture
+    def usd_rate(self, currencies):
+        return ExchangeRate.objects.create(
+            base=currencies['USD'], quote=currencies['RUB'], rate=Decimal('85.0'),
+            valid_from=timezone.now() - timedelta(days=1),
+        )
+
+    def test_conversion_uses_server_rate(self, api_client, balances, usd_rate):
+        """Тест конвертации RUB -> USD по курсу из таблицы"""
+        response = api_client.post('/api/transactions/conversion/', {
+            'sum': '100', 'currency_id': 'USD', 'gross_currency_id': 'RUB',
+        }, format='json')
+
+        assert response.status_code == 201
+        assert response.data['balances']['RUB'] == '91500.00'
+        assert Transaction.objects.get().exchange_rate == Decimal('85.0')
+
+    def test_reverse_conversion_uses_same_pair(self, api_client, balances, usd_rate):
+        """Тест конвертации USD -> RUB: курс тоже рубли за доллар"""
+        response = api_client.post('/api/transactions/conversion/', {
+            'sum': '8500', 'currency_id': 'RUB', 'gross_currency_id': 'USD',
+        }, format='json')
+
+        assert response.status_code == 201
+        assert response.data['balances']['USD'] == '900.00'
+
+    def test_client_rate_takes_precedence(self, api_client, balances, usd_rate):
+        """Тест что переданный клиентом курс не подменяется"""
+        response = api_client.post('/api/transactions/account-topup/', {
+            'sum': '10', 'currency_id': 'USD', 'gross_currency_id': 'RUB', 'exchange_rate': '90',
+        }, format='json')
+
+        assert response.status_code == 201
+        assert response.data['balances']['RUB'] == '100900.00'
+
+    def test_missing_rate(self, api_client, balances):
+        """Тест ошибки, когда курса нет ни в запросе, ни в таблице"""
+        response = api_client.post('/api/transactions/service-spend/', {
+            'sum': '10', 'currency_id': 'USD', 'gross_currency_id': 'RUB',
+        }, format='json')
+
+        assert response.status_code == 400
+        assert 'Курс USD/RUB не найден' in str(response.data)
+
+    @pytest.mark.parametrize('url, rub', [
+        ('/api/transactions/service-spend/', '99990.00'),
+        ('/api/transactions/account-topup/', '100010.00'),
+    ])
+    def test_rub_operation_does_not_need_rate(self, api_client, balances, url, rub):
+        """Тест что рублёвой операции с gross_currency_id курс не нужен, даже если его нет в таблице"""
+        response = api_client.post(url, {'sum': '10', 'currency_id': 'RUB', 'gross_currency_id': 'USD'}, format='json')
+
+        assert response.status_code == 201
+        assert response.data['balances'] == {'RUB': rub}
+        assert Transaction.objects.get().exchange_rate is None
+
+    def test_cross_conversion_uses_triangulated_rate(self, api_client, balances, usd_rate):
+        """Тест конвертации USD -> EUR по курсу, вычисленному через RUB"""
+        eur = Currency.objects.create(code='EUR', name='Euro')
+        Balance.objects.create(currency=eur, amount=Decimal('0'))
+        ExchangeRate.objects.create(
+            base=eur, quote=balances['RUB'].currency, rate=Decimal('102'), valid_from=timezone.now() - timedelta(days=1),
+        )
+
+        response = api_client.post('/api/transactions/conversion/', {
+            'sum': '10', 'currency_id': 'EUR', 'gross_currency_id': 'USD',
+        }, format='json')
+
+        assert response.status_code == 201
+        # 102 / 85 = 1.2 доллара за евро
+        assert Transaction.objects.get().exchange_rate == Decimal('1.2')
+        assert response.data['balances'] == {'USD': '988.00', 'EUR': '10.00'}
+
+    def test_async_view_uses_server_rate(self, api_client, balances, usd_rate):
+        """Тест что async-эндпоинт тоже берёт курс из таблицы"""
+        response = api_client.post('/api/transactions/async/service-spend/', {
+            'sum': '10', 'currency_id': 'USD', 'gross_currency_id': 'RUB',
+        }, format='json')
+
+        assert response.status_code == 201
+        assert response.json()['balances']['RUB'] == '99150.00'
@@ -0,0 +1,110 @@
+import pytest
+from datetime import timedelta
+from decimal import Decimal
+from django.utils import timezone
+from billing.models import ExchangeRate
+from billing.views.transactions.serializers import (
+    AccountTopUpSerializer,
+    ConversionSerializer,
+    ServiceSpendSerializer,
+)
+from billing.views.transactions.validators import TransactionSchema
+
+
+PAYLOADS = [
+    {'sum': '100', 'currency_id': 'RUB'},
+    {'sum': ' 100.50 ', 'currency_id': 'rub'},
+    {'sum': 100, 'currency_id': 'RUB'},
+    {'sum': 1.5, 'currency_id': 'USD', 'gross_currency_id': 'RUB', 'exchange_rate': 85},
+    {'sum': '10', 'currency_id': 'USD', 'gross_currency_id': 'RUB', 'exchange_rate': '85.0'},
+    {'sum': '10', 'currency_id': 'USD', 'gross_currency_id': 'RUB'},
+    {'sum': '10', 'currency_id': 'USD', 'gross_currency_id': 'RUB', 'exchange_rate': None},
+    {'sum': '10', 'currency_id': 'RUB', 'gross_currency_id': 'USD', 'exchange_rate': '0.5'},
+    {'sum': '10', 'currency_id': 'USD', 'gross_currency_id': 'USD', 'exchange_rate': '1'},
+    {'sum': '10', 'currency_id': 'USD'},
+    {'sum': '10', 'currency_id': 'EUR', 'gross_currency_id': 'RUB', 'exchange_rate': '90'},
+    {'sum': '10', 'currency_id': 'RUB', 'gross_currency_id': None},
+    {'sum': '10', 'currency_id': 'RUB', 'gross_currency_id': ''},
+    {'sum': '10', 'currency_id': 'RUB', 'exchange_rate': ''},
+    {'sum': '10', 'currency_id': 'RUB', 'exchange_rate': '-1'},
+    {'sum': '10', 'currency_id': 'RUB', 'exchange_rate': 'abc'},
+    {'sum': 'abc', 'currency_id': 'RUB'},
+    {'sum': '-5', 'currency_id': 'RUB'},
+    {'sum': '0', 'currency_id': ''},
+    {'sum': '   ', 'currency_id': None},
+    {'sum': None},
+    {'currency_id': 'RUB'},
+    {},
+    {'sum': True, 'currency_id': 'RUB'},
+    {'sum': ['1'], 'currency_id': {'code': 'RUB'}},
+    {'sum': '1\x00', 'currency_id': 'RUB'},
+    {'sum': '10', 'currency_id': 'RUВ'},
+    ['not', 'a', 'dict'],
+    'text',
+]
+
+
+@pytest.mark.django_db
+class TestFastValidation:
+    """Тесты что быстрая проверка совпадает с сериализаторами DRF"""
+
+    @pytest.fixture
+    def rates(self, currencies):
+        ExchangeRate.objects.create(
+            base=currencies['USD'], quote=currencies['RUB'], rate=Decimal('90'),
+            valid_from=timezone.now() - timedelta(days=1),
+        )
+
+    @pytest.mark.parametrize('serializer_class', [ConversionSerializer, ServiceSpendSerializer, AccountTopUpSerializer])
+    def test_same_result_as_drf(self, serializer_class, rates):
+        """Тест что ошибки и validated_data совпадают с сериализатором"""
+        schema = TransactionSchema(serializer_class)
+        for payload in PAYLOADS:
+            serializer = serializer_class(data=payload)
+            fast = schema(data=payload)
+
+            assert fast.is_valid() == serializer.is_valid(), payload
+            assert fast.errors == serializer.errors, payload
+            assert list(fast.errors) == list(serializer.errors), payload
+            assert fast.validated_data == serializer.validated_data, payload
+
+    def test_validated_data_mapping(self, currencies):
+        """Тест что результат ведёт себя как словарь без незаданных полей"""
+        fast = TransactionSchema(AccountTopUpSerializer)(data={'sum': '5', 'currency_id': 'RUB'})
+
+        assert fast.is_valid()
+        data = fast.validated_data
+        assert dict(data) == {'sum': Decimal('5'), 'currency_id': currencies['RUB']}
+        assert data.get('exchange_rate') is None
+        assert 'gross_currency_id' not in data
+        with pytest.raises(KeyError):
+            data['exchange_rate']
+
+    def test_rejects_unsupported_fields(self):
+        """Тест что схема не собирается для полей, которые не умеет разбирать"""
+        from rest_framework import serializers
+
+        class Custom(ConversionSerializer):
+            sum = serializers.CharField(max_length=5)
+
+        with pytest.raises(TypeError):
+            TransactionSchema(Custom)
+
+    def test_api_with_fast_validation(self, api_client, balances, settings):
+        """Тест эндпоинтов и пакета с включённой быстрой проверкой"""
+        settings.BILLING_FAST_VALIDATION = True
+
+        response = api_client.post('/api/transactions/conversion/', {
+            'sum': '10', 'currency_id': 'USD', 'gross_currency_id': 'RUB', 'exchange_rate': '85.0',
+        }, format='json')
+        assert response.status_code == 201
+        assert response.data['balances'] == {'RUB': '99150.00', 'USD': '1010.00'}
+
+        response = api_client.post('/api/transactions/service-spend/', {'sum': '-1', 'currency_id': 'RUB'}, format='json')
+        assert response.status_code == 400
+        assert response.data == {'sum': ['Сумма должна быть больше 0']}
+
+        response = api_client.post('/api/transactions/batch/', {'items': [
+            {'type': 'account_topup', 'sum': '5', 'currency_id': 'RUB'},
+        ]}, format='json')
+        assert response.status_code == 201
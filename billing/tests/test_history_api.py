@@ -0,0 +1,144 @@
+import json
+import pytest
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from django.contrib.auth.models import User
+from billing.models import ArchivedTransaction, Transaction
+
+
+@pytest.fixture
+def history(currencies):
+    """25 транзакций с шагом в час, несколько пар с одинаковым created_at"""
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    txns = []
+    for i in range(25):
+        txn = Transaction.objects.create(
+            transaction_type=(
+                Transaction.TransactionType.SERVICE_SPEND if i % 2 else Transaction.TransactionType.ACCOUNT_TOPUP
+            ),
+            amount=Decimal(i + 1),
+            currency=currencies['USD'] if i % 5 == 0 else currencies['RUB'],
+        )
+        txns.append(txn)
+    for i, txn in enumerate(txns):
+        txn.created_at = start + timedelta(hours=i // 2)
+    Transaction.objects.bulk_update(txns, ['created_at'])
+    return txns
+
+
+@pytest.mark.django_db
+class TestTransactionHistoryAPI:
+    """Тесты для API истории транзакций"""
+
+    url = '/api/transactions/'
+
+    def test_first_page_newest_first(self, api_client, history):
+        """Тест первой страницы: от новых к старым"""
+        response = api_client.get(self.url, {'limit': 5})
+
+        assert response.status_code == 200
+        ids = [row['id'] for row in response.data['results']]
+        expected = [txn.id for txn in sorted(history, key=lambda t: (t.created_at, t.id), reverse=True)][:5]
+        assert ids == expected
+        assert response.data['next_cursor']
+
+        row = response.data['results'][0]
+        assert set(row) == {'id', 'transaction_type', 'amount', 'currency', 'gross_currency',
+                            'exchange_rate', 'user', 'created_at'}
+
+    def test_cursor_walks_all_rows_without_duplicates(self, api_client, history):
+        """Тест обхода всех страниц по курсору, включая строки с одинаковым created_at"""
+        seen = []
+        params = {'limit': 4}
+        while True:
+            response = api_client.get(self.url, params)
+            assert response.status_code == 200
+            seen.extend(row['id'] for row in response.data['results'])
+            if not response.data['next_cursor']:
+                break
+            params = {'limit': 4, 'cursor': response.data['next_cursor']}
+
+        expected = [txn.id for txn in sorted(history, key=lambda t: (t.created_at, t.id), reverse=True)]
+        assert seen == expected
+
+    def test_page_is_one_query(self, api_client, history, django_assert_num_queries):
+        """Тест что страница читается одним запросом"""
+        with django_assert_num_queries(1):
+            response = api_client.get(self.url, {'limit': 10})
+
+        assert response.status_code == 200
+
+    def test_filters(self, api_client, history):
+        """Тест фильтров по типу, валюте и периоду"""
+        response = api_client.get(self.url, {
+            'transaction_type': 'account_topup',
+            'currency': 'usd',
+            'date_from': '2026-01-01T00:00:00Z',
+            'date_to': '2026-01-01T10:00:00Z',
+        })
+
+        assert response.status_code == 200
+        expected = {
+            txn.id for txn in history
+            if txn.transaction_type == 'account_topup' and txn.currency_id == 'USD'
+            and txn.created_at < datetime(2026, 1, 1, 10, tzinfo=timezone.utc)
+        }
+        assert {row['id'] for row in response.data['results']} == expected
+        assert response.data['next_cursor'] is None
+
+    def test_history_is_scoped_to_account(self, api_client, history):
+        """Тест что пользователь видит только свои транзакции, а анонимный запрос — общего счёта"""
+        alice, bob = User.objects.create_user(username='alice'), User.objects.create_user(username='bob')
+        own = Transaction.objects.create(
+            transaction_type=Transaction.TransactionType.ACCOUNT_TOPUP, amount=Decimal('1'),
+            currency_id='RUB', user=alice,
+        )
+        archived = ArchivedTransaction.objects.create(
+            id=own.id + 1, transaction_type=Transaction.TransactionType.ACCOUNT_TOPUP, amount=Decimal('2'),
+            currency_id='RUB', user=alice, created_at=datetime(2025, 1, 1, tzinfo=timezone.utc),
+        )
+
+        anonymous = api_client.get(self.url, {'limit': 100})
+        api_client.force_authenticate(alice)
+        mine = api_client.get(self.url, {'limit': 100})
+        api_client.force_authenticate(bob)
+        foreign = api_client.get(self.url, {'limit': 100})
+
+        assert {row['id'] for row in anonymous.data['results']} == {txn.id for txn in history}
+        assert [row['id'] for row in mine.data['results']] == [own.id, archived.id]
+        assert foreign.data['results'] == []
+
+    def test_invalid_cursor(self, api_client, history):
+        """Тест некорректного курсора"""
+        response = api_client.get(self.url, {'cursor': 'garbage'})
+
+        assert response.status_code == 400
+        assert 'cursor' in response.data
+
+    def test_invalid_limit(self, api_client, history):
+        """Тест лимита больше допустимого"""
+        response = api_client.get(self.url, {'limit': 100000})
+
+        assert response.status_code == 400
+        assert 'limit' in response.data
+
+    def test_ndjson_export(self, api_client, history):
+        """Тест потоковой выгрузки в NDJSON"""
+        response = api_client.get(self.url, {'export': 'ndjson', 'currency': 'RUB'})
+
+        assert response.status_code == 200
+        assert response['Content-Type'] == 'application/x-ndjson'
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+        assert len(rows) == len([txn for txn in history if txn.currency_id == 'RUB'])
+        assert all(row['currency'] == 'RUB' for row in rows)
+
+    def test_csv_export(self, api_client, history):
+        """Тест потоковой выгрузки в CSV"""
+        response = api_client.get(self.url, {'export': 'csv'})
+
+        assert response.status_code == 200
+        assert response['Content-Type'] == 'text/csv'
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        assert lines[0].startswith('id,transaction_type,amount')
+        assert len(lines) == len(history) + 1
@@ -0,0 +1,192 @@
+import io
+import pytest
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from billing.models import Balance, Hold, LedgerEntry, Transaction
+
+
+AUTHORIZE_URL = '/api/transactions/service-spend/authorize/'
+
+
+def authorize(api_client, amount='100', **extra):
+    return api_client.post(AUTHORIZE_URL, {'sum': amount, 'currency_id': 'RUB', **extra}, format='json')
+
+
+def capture(api_client, hold_id):
+    return api_client.post(f'/api/transactions/holds/{hold_id}/capture/', format='json')
+
+
+def void(api_client, hold_id):
+    return api_client.post(f'/api/transactions/holds/{hold_id}/void/', format='json')
+
+
+@pytest.mark.django_db
+class TestAuthorize:
+    """Тесты резервирования средств холдом"""
+
+    def test_authorize_reserves_funds(self, api_client, balances):
+        """Тест что авторизация увеличивает held, не меняя остаток и не создавая транзакцию"""
+        response = authorize(api_client, '100')
+
+        assert response.status_code == 201
+        assert response.data['status'] == 'active'
+        assert response.data['held'] == '100.00'
+        assert response.data['held_currency'] == 'RUB'
+        rub = Balance.objects.get(currency='RUB')
+        assert (rub.amount, rub.held) == (Decimal('100000.00'), Decimal('100.00'))
+        assert Transaction.objects.count() == 0
+
+    def test_foreign_currency_hold(self, api_client, balances):
+        """Тест что покупка в валюте резервирует рубли по курсу"""
+        response = authorize(api_client, '10', currency_id='USD', gross_currency_id='RUB', exchange_rate='85.5')
+
+        assert response.status_code == 201
+        assert response.data['held'] == '855.00'
+        assert response.data['currency'] == 'USD'
+
+    def test_held_funds_are_unavailable(self, api_client, balances):
+        """Тест что зарезервированное нельзя потратить ни одной операцией"""
+        authorize(api_client, '99950')
+
+        spend = api_client.post('/api/transactions/service-spend/', {'sum': '100', 'currency_id': 'RUB'}, format='json')
+        conversion = api_client.post('/api/transactions/conversion/', {
+            'sum': '1', 'currency_id': 'USD', 'gross_currency_id': 'RUB', 'exchange_rate': '85.0',
+        }, format='json')
+        second_hold = authorize(api_client, '51')
+
+        for response in (spend, conversion, second_hold):
+            assert response.status_code == 400
+            assert response.data == {'error': 'Недостаточно средств. Доступно: 50.00 RUB'}
+
+    @pytest.mark.parametrize('data', [
+        {'sum': '0.001'},
+        {'sum': '0.0001', 'currency_id': 'USD', 'gross_currency_id': 'RUB', 'exchange_rate': '10'},
+    ])
+    def test_zero_hold_rejected(self, api_client, balances, data):
+        """Тест что резерв, округляющийся до нуля, отклоняется ошибкой 400"""
+        response = authorize(api_client, **data)
+
+        assert response.status_code == 400
+        assert response.data == {'error': 'Сумма резерва меньше минимальной единицы валюты RUB'}
+        assert not Hold.objects.exists()
+
+    def test_hold_lives_in_one_shard(self, api_client, balances):
+        """Тест что холд занимает один шард, а перешардирование счёта с холдами запрещено"""
+        Balance.objects.account(None, 'RUB').reshard(4)
+
+        assert authorize(api_client, '20000').status_code == 201
+        response = authorize(api_client, '30000')
+
+        assert response.status_code == 400
+        assert 'в одном шарде счёта' in response.data['error']
+        with pytest.raises(ValueError, match='активные холды'):
+            Balance.objects.account(None, 'RUB').reshard(1)
+
+
+@pytest.mark.django_db
+class TestCaptureAndVoid:
+    """Тесты списания и отмены холда"""
+
+    def test_capture(self, api_client, ledger):
+        """Тест что списание проводит покупку одним UPDATE шарда холда"""
+        hold_id = authorize(api_client, '10', currency_id='USD', gross_currency_id='RUB', exchange_rate='85.5').data['id']
+
+        with CaptureQueriesContext(connection) as captured:
+            response = capture(api_client, hold_id)
+
+        assert response.status_code == 201
+        assert response.data['transaction_type'] == 'service_spend'
+        assert response.data['amount'] == '10.00000'
+        assert response.data['currency'] == 'USD'
+        assert response.data['balances'] == {'RUB': '99145.00'}
+        sql = [query['sql'] for query in captured.captured_queries]
+        assert not any('FOR UPDATE' in query for query in sql)
+        # Из балансов пишется только шард холда
+        assert len([query for query in sql if query.startswith('UPDATE "billing_balance"')]) == 1
+
+        hold = Hold.objects.get(pk=hold_id)
+        assert hold.status == Hold.Status.CAPTURED
+        assert hold.transaction_id == response.data['id']
+        assert Balance.objects.get(currency='RUB').held == 0
+        assert LedgerEntry.objects.filter(transaction_id=response.data['id']).count() == 2
+        call_command('verify_ledger')
+
+    def test_void(self, api_client, balances):
+        """Тест что отмена возвращает резерв"""
+        hold_id = authorize(api_client, '100').data['id']
+
+        response = void(api_client, hold_id)
+
+        assert response.status_code == 200
+        assert response.data['status'] == 'voided'
+        rub = Balance.objects.get(currency='RUB')
+        assert (rub.amount, rub.held) == (Decimal('100000.00'), Decimal('0.00'))
+
+    @pytest.mark.parametrize('first, second', [(capture, capture), (capture, void), (void, capture)])
+    def test_hold_finishes_once(self, api_client, balances, first, second):
+        """Тест что завершённый холд нельзя списать или отменить повторно"""
+        hold_id = authorize(api_client, '100').data['id']
+        first(api_client, hold_id)
+
+        response = second(api_client, hold_id)
+
+        assert response.status_code == 409
+        assert 'уже завершён' in response.data['error']
+        assert Transaction.objects.count() == (1 if first is capture else 0)
+        assert Balance.objects.get(currency='RUB').held == 0
+
+    def test_expired_hold_is_not_captured(self, api_client, balances):
+        """Тест что истёкший холд не списывается"""
+        hold_id = authorize(api_client, '100').data['id']
+        Hold.objects.filter(pk=hold_id).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        response = capture(api_client, hold_id)
+
+        assert response.status_code == 409
+        assert response.data == {'error': f'Срок холда {hold_id} истёк'}
+
+    @pytest.mark.parametrize('finish', [capture, void])
+    def test_reshard_after_finished_hold(self, api_client, balances, finish):
+        """Тест что завершённые холды не мешают собрать шарды обратно"""
+        Balance.objects.account(None, 'RUB').reshard(4)
+        # По 20000 в каждый из четырёх шардов
+        hold_ids = [authorize(api_client, '20000').data['id'] for _ in range(4)]
+        for hold_id in hold_ids:
+            finish(api_client, hold_id)
+
+        call_command('shard_balance', 'RUB', shards=1, stdout=io.StringIO())
+
+        rub = Balance.objects.get(currency='RUB')
+        assert set(Hold.objects.values_list('balance', flat=True)) == {rub.pk}
+        assert rub.amount == (Decimal('20000.00') if finish is capture else Decimal('100000.00'))
+
+    def test_foreign_hold_is_not_found(self, api_client, balances):
+        """Тест что холд другого пользователя не виден"""
+        hold_id = authorize(api_client, '100').data['id']
+        api_client.force_authenticate(User.objects.create_user(username='other'))
+
+        assert capture(api_client, hold_id).status_code == 404
+        assert void(api_client, hold_id).status_code == 404
+
+
+@pytest.mark.django_db
+class TestReleaseExpiredHolds:
+    """Тесты для команды release_expired_holds"""
+
+    def test_releases_only_expired(self, api_client, balances, capsys):
+        """Тест что сборщик снимает истёкшие холды пачками и не трогает действующие"""
+        expired = [authorize(api_client, '100').data['id'] for _ in range(3)]
+        active = authorize(api_client, '7').data['id']
+        Hold.objects.filter(pk__in=expired).update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        call_command('release_expired_holds', batch_size=2)
+
+        assert 'Released 3 expired holds' in capsys.readouterr().out
+        assert set(Hold.objects.filter(pk__in=expired).values_list('status', flat=True)) == {Hold.Status.EXPIRED}
+        assert Hold.objects.get(pk=active).status == Hold.Status.ACTIVE
+        assert Balance.objects.get(currency='RUB').held == Decimal('7.00')
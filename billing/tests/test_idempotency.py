@@ -0,0 +1,127 @@
+import pytest
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management import call_command
+from django.utils import timezone
+from billing.idempotency import idempotency_store
+from billing.models import IdempotencyKey, Transaction
+
+
+@pytest.mark.django_db
+class TestIdempotencyKeys:
+    """Тесты для заголовка Idempotency-Key"""
+
+    url = '/api/transactions/service-spend/'
+    data = {'sum': '1000', 'currency_id': 'RUB'}
+
+    def post(self, api_client, data=None, key='key-1', url=None):
+        return api_client.post(url or self.url, data or self.data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_returns_stored_response(self, api_client, balances):
+        """Тест что повтор возвращает тот же ответ и не списывает повторно"""
+        first = self.post(api_client)
+        second = self.post(api_client)
+
+        assert first.status_code == 201
+        assert second.status_code == 201
+        assert second['Idempotent-Replayed'] == 'true'
+        assert second.data['id'] == first.data['id']
+        assert second.data['balances'] == first.data['balances']
+
+        balances['RUB'].refresh_from_db()
+        assert balances['RUB'].amount == Decimal('99000.00')
+        assert Transaction.objects.count() == 1
+
+    def test_replay_from_database_without_cache(self, api_client, balances, django_assert_num_queries):
+        """Тест повтора из таблицы ключей одним запросом, без блокировок и изменений"""
+        first = self.post(api_client)
+        idempotency_store.clear()
+
+        with django_assert_num_queries(1):
+            second = self.post(api_client)
+
+        assert second.status_code == 201
+        assert second.content == first.content
+
+    def test_replay_from_cache_without_queries(self, api_client, balances, django_assert_num_queries):
+        """Тест повтора из LRU-кэша без обращения к БД"""
+        self.post(api_client)
+        idempotency_store.clear()
+        self.post(api_client)
+
+        with django_assert_num_queries(0):
+            response = self.post(api_client)
+
+        assert response.status_code == 201
+
+    def test_key_reuse_with_other_payload(self, api_client, balances):
+        """Тест что ключ нельзя переиспользовать с другим телом"""
+        self.post(api_client)
+        response = self.post(api_client, {'sum': '5', 'currency_id': 'RUB'})
+
+        assert response.status_code == 422
+        assert Transaction.objects.count() == 1
+
+    def test_keys_are_scoped_per_endpoint(self, api_client, balances):
+        """Тест что один и тот же ключ на разных эндпоинтах независим"""
+        self.post(api_client)
+        response = self.post(api_client, url='/api/transactions/account-topup/')
+
+        assert response.status_code == 201
+        assert Transaction.objects.count() == 2
+
+    def test_failed_request_is_not_stored(self, api_client, balances):
+        """Тест что ответ с ошибкой не сохраняется и повтор выполняется заново"""
+        response = self.post(api_client, {'sum': '200000', 'currency_id': 'RUB'})
+        assert response.status_code == 400
+        assert IdempotencyKey.objects.count() == 0
+
+        balances['RUB'].amount = Decimal('300000.00')
+        balances['RUB'].save()
+        response = self.post(api_client, {'sum': '200000', 'currency_id': 'RUB'})
+        assert response.status_code == 201
+
+    def test_batch_endpoint_is_idempotent(self, api_client, balances):
+        """Тест идемпотентности пакетного эндпоинта"""
+        data = {'items': [{'type': 'account_topup', 'sum': '10', 'currency_id': 'RUB'}]}
+        self.post(api_client, data, url='/api/transactions/batch/')
+        response = self.post(api_client, data, url='/api/transactions/batch/')
+
+        assert response.status_code == 201
+        assert Transaction.objects.count() == 1
+
+    def test_expired_key_is_ignored_and_purged(self, api_client, balances, settings):
+        """Тест что просроченный ключ не используется и удаляется командой"""
+        self.post(api_client)
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(days=2))
+        idempotency_store.clear()
+
+        call_command('purge_idempotency_keys')
+
+        assert IdempotencyKey.objects.count() == 0
+        response = self.post(api_client)
+        assert response.status_code == 201
+        assert Transaction.objects.count() == 2
+
+    def test_expired_key_is_reused_before_purge(self, api_client, balances):
+        """Тест что ключ с истёкшим TTL, ещё не удалённый командой, обрабатывается как новый"""
+        self.post(api_client)
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(days=2))
+        idempotency_store.clear()
+
+        response = self.post(api_client)
+
+        assert response.status_code == 201
+        assert 'Idempotent-Replayed' not in response
+        assert Transaction.objects.count() == 2
+        assert IdempotencyKey.objects.get().created_at > timezone.now() - timedelta(minutes=1)
+
+        replay = self.post(api_client)
+        assert replay['Idempotent-Replayed'] == 'true'
+        assert replay.data['id'] == response.data['id']
+
+    def test_too_long_key(self, api_client, balances):
+        """Тест слишком длинного ключа"""
+        response = self.post(api_client, key='x' * 256)
+
+        assert response.status_code == 400
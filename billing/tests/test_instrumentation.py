@@ -0,0 +1,131 @@
+import re
+
+import pytest
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.http import HttpResponse
+from django.template import Template
+from django.template.response import SimpleTemplateResponse
+from django.test import AsyncClient, override_settings
+from billing.instrumentation import InstrumentationMiddleware, _current_profile, metrics_registry, phase
+
+
+@pytest.fixture(autouse=True)
+def clear_metrics():
+    metrics_registry.clear()
+    yield
+    metrics_registry.clear()
+
+
+def parse_server_timing(header):
+    timings = {}
+    for entry in header.split(', '):
+        name, *params = entry.split(';')
+        timings[name] = dict(param.split('=', 1) for param in params)
+    return timings
+
+
+@pytest.mark.django_db
+class TestInstrumentation:
+    """Тесты для замеров фаз запросов"""
+
+    @override_settings(BILLING_INSTRUMENTATION=True)
+    def test_server_timing_contains_phases(self, api_client, balances):
+        """Тест что ответ содержит фазы обработки, число запросов и ожидание блокировок"""
+        response = api_client.post(
+            '/api/transactions/service-spend/', {'sum': '100', 'currency_id': 'RUB'}, format='json',
+        )
+
+        assert response.status_code == 201
+        timings = parse_server_timing(response['Server-Timing'])
+        for name in ('validate', 'lock', 'mutate', 'insert', 'serialize', 'render', 'db', 'lock-wait', 'total'):
+            assert name in timings
+        assert re.fullmatch(r'"\d+ queries"', timings['db']['desc'])
+
+    @override_settings(BILLING_INSTRUMENTATION=True)
+    def test_batch_is_instrumented(self, api_client, balances):
+        """Тест что пакетный эндпоинт тоже размечен фазами"""
+        response = api_client.post('/api/transactions/batch/', {
+            'items': [{'type': 'account_topup', 'sum': '10', 'currency_id': 'RUB'}],
+        }, format='json')
+
+        assert response.status_code == 201
+        assert {'validate', 'lock', 'mutate', 'insert', 'serialize'} <= set(
+            parse_server_timing(response['Server-Timing'])
+        )
+
+    @override_settings(BILLING_INSTRUMENTATION=True)
+    def test_metrics_endpoint(self, api_client, balances):
+        """Тест что /metrics отдаёт накопленные метрики в формате Prometheus"""
+        api_client.post('/api/transactions/account-topup/', {'sum': '1', 'currency_id': 'RUB'}, format='json')
+        api_client.post('/api/transactions/account-topup/', {'sum': '-1', 'currency_id': 'RUB'}, format='json')
+
+        response = api_client.get('/metrics')
+
+        assert response.status_code == 200
+        assert response['Content-Type'].startswith('text/plain; version=0.0.4')
+        body = response.content.decode()
+        assert 'billing_requests_total{view="account-topup",status="201"} 1' in body
+        assert 'billing_requests_total{view="account-topup",status="400"} 1' in body
+        assert 'billing_request_duration_seconds_count{view="account-topup"} 2' in body
+        # INSERT транзакции и INSERT проводок журнала
+        assert 'billing_phase_queries_total{view="account-topup",phase="insert"} 2' in body
+
+    @override_settings(BILLING_INSTRUMENTATION=True, BILLING_METRICS_ALLOWED_IPS=('10.0.0.1',))
+    def test_metrics_only_from_allowed_addresses(self, api_client, db):
+        """Тест что /metrics недоступен с посторонних адресов"""
+        assert api_client.get('/metrics').status_code == 404
+
+    def test_disabled_by_default(self, api_client, balances):
+        """Тест что без настройки заголовок не добавляется, а /metrics закрыт"""
+        response = api_client.post(
+            '/api/transactions/account-topup/', {'sum': '1', 'currency_id': 'RUB'}, format='json',
+        )
+
+        assert 'Server-Timing' not in response
+        assert api_client.get('/metrics').status_code == 404
+
+    def test_phase_outside_request_is_noop(self):
+        """Тест что phase() без активного профиля возвращает общий пустой контекст"""
+        assert phase('validate') is phase('mutate')
+        with phase('validate'):
+            pass
+
+    @override_settings(BILLING_INSTRUMENTATION=True)
+    def test_async_view_is_instrumented(self, balances):
+        """Тест что async-эндпоинт проходит через middleware без перехода в поток и получает замеры"""
+        response = async_to_sync(AsyncClient().post)(
+            '/api/transactions/async/service-spend/', {'sum': '100', 'currency_id': 'RUB'},
+            content_type='application/json',
+        )
+
+        assert response.status_code == 201
+        timings = parse_server_timing(response['Server-Timing'])
+        assert {'validate', 'lock', 'mutate', 'insert'} <= set(timings)
+        assert timings['db']['desc'] != '"0 queries"'
+
+    @override_settings(BILLING_INSTRUMENTATION=True)
+    def test_middleware_is_async_capable(self):
+        """Тест что в асинхронной цепочке middleware сам является корутиной"""
+        async def get_response(request):
+            return HttpResponse()
+
+        assert iscoroutinefunction(InstrumentationMiddleware(get_response))
+        assert not iscoroutinefunction(InstrumentationMiddleware(lambda request: HttpResponse()))
+
+    @override_settings(BILLING_INSTRUMENTATION=True)
+    def test_render_error_does_not_leak_profile(self, rf):
+        """Тест что исключение при рендеринге закрывает фазы и сбрасывает профиль запроса"""
+        profiles = []
+
+        def get_response(request):
+            response = middleware.process_template_response(request, SimpleTemplateResponse(Template('')))
+            profiles.append(_current_profile.get())
+            raise RuntimeError('render failed')
+
+        middleware = InstrumentationMiddleware(get_response)
+        with pytest.raises(RuntimeError):
+            middleware(rf.get('/'))
+
+        assert _current_profile.get() is None
+        assert 'render' in profiles[0].phases
+        assert phase('validate') is phase('mutate')
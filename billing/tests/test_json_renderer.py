@@ -0,0 +1,122 @@
+import pytest
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from billing import renderers
+from billing.renderers import BillingJSONParser, BillingJSONRenderer
+
+
+INSTALLED = ['stdlib'] + [
+    name for name, module in (('orjson', renderers.orjson), ('msgspec', renderers.msgspec)) if module is not None
+]
+
+CREATED_AT = datetime(2026, 3, 1, 12, 30, 15, 123456, tzinfo=dt_timezone.utc)
+
+DOCUMENTS = [
+    # Ответы ConversionView, ServiceSpendView и TopUpView (в том числе 202 журнала пополнений)
+    {
+        'id': 1, 'transaction_type': 'conversion', 'amount': '10.00', 'currency': 'USD', 'gross_currency': 'RUB',
+        'exchange_rate': '85.000000', 'created_at': CREATED_AT, 'balances': {'RUB': '99150.00', 'USD': '1010.00'},
+    },
+    {
+        'id': 2, 'transaction_type': 'service_spend', 'amount': '100.00', 'currency': 'RUB', 'gross_currency': None,
+        'exchange_rate': None, 'created_at': CREATED_AT.replace(microsecond=0), 'balances': {'RUB': '99900.00'},
+    },
+    {
+        'id': 3, 'status': 'pending', 'transaction_type': 'account_topup', 'amount': '5.00', 'currency': 'RUB',
+        'gross_currency': None, 'exchange_rate': None, 'created_at': CREATED_AT,
+    },
+    {'sum': ['Убедитесь, что это значение больше либо равно 0.01.'], 'currency_id': ['Обязательное поле.']},
+    {'error': 'Недостаточно средств на балансе RUB'},
+    # Типы, которые DRF кодирует через JSONEncoder.default()
+    {
+        'amount': Decimal('12.30'), 'tiny': Decimal('0.0000001'), 'day': date(2026, 3, 1),
+        'naive': datetime(2026, 3, 1, 12, 0), 'moscow': CREATED_AT.astimezone(dt_timezone(timedelta(hours=3))),
+        'took': timedelta(seconds=1.5), 'items': (1, 2.5, True, None), 'big': 2 ** 70,
+    },
+    {'line': 'разделители\u2028строк\u2029', 'nested': [{'a': [{'b': 'ё'}]}], 1: 'int key'},
+    [],
+    'строка',
+]
+
+
+@pytest.fixture(params=INSTALLED)
+def backend(request, settings):
+    settings.BILLING_JSON_BACKEND = request.param
+    return request.param
+
+
+class TestBillingJSONRenderer:
+    """Тесты что рендерер биллинга выдаёт те же байты, что и JSONRenderer DRF"""
+
+    @pytest.mark.parametrize('data', DOCUMENTS)
+    def test_same_bytes_as_drf(self, backend, data):
+        """Тест совпадения вывода для ответов и типов биллинга"""
+        assert BillingJSONRenderer().render(data) == JSONRenderer().render(data)
+
+    def test_indent_and_nan_follow_drf(self, backend):
+        """Тест что отступы и NaN обрабатываются как в DRF"""
+        data = DOCUMENTS[0]
+        media_type = 'application/json; indent=4'
+        assert BillingJSONRenderer().render(data, media_type) == JSONRenderer().render(data, media_type)
+        context = {'indent': 2}
+        assert BillingJSONRenderer().render(data, None, context) == JSONRenderer().render(data, None, context)
+        assert BillingJSONRenderer().render(None) == b''
+        with pytest.raises(ValueError):
+            BillingJSONRenderer().render({'rate': float('nan')})
+
+    def test_unknown_backend(self, settings):
+        """Тест что неизвестный бэкенд — ошибка настройки"""
+        settings.BILLING_JSON_BACKEND = 'simdjson'
+        with pytest.raises(ImproperlyConfigured):
+            BillingJSONRenderer().render({})
+
+
+class TestBillingJSONParser:
+    """Тесты что парсер биллинга разбирает тела как JSONParser DRF"""
+
+    @pytest.mark.parametrize('body', [
+        b'{"sum":"100","currency_id":"RUB"}',
+        b'{"sum": 1.5, "exchange_rate": 85, "big": 123456789012345678901234567890}',
+        '{"currency_id": "рубль", "sum": "1\\u2028"}'.encode(),
+        b'[1, 2, {"a": null}]',
+    ])
+    def test_same_data_as_drf(self, backend, body):
+        """Тест совпадения разобранных данных"""
+        assert BillingJSONParser().parse(BytesIO(body)) == JSONParser().parse(BytesIO(body))
+
+    @pytest.mark.parametrize('body', [b'{"sum": ', b'{"sum": NaN}', b'\xff\xfe{}', b''])
+    def test_same_error_as_drf(self, backend, body):
+        """Тест что ошибки разбора совпадают с DRF"""
+        with pytest.raises(ParseError) as expected:
+            JSONParser().parse(BytesIO(body))
+        with pytest.raises(ParseError) as actual:
+            BillingJSONParser().parse(BytesIO(body))
+        assert str(actual.value.detail) == str(expected.value.detail)
+
+
+@pytest.mark.django_db
+class TestJSONInViews:
+    """Тесты рендерера и парсера в эндпоинтах транзакций"""
+
+    def test_sync_and_async_bodies(self, backend, api_client, balances):
+        """Тест что синхронный и async-эндпоинты отдают JSON рендерера DRF"""
+        payload = {'sum': '100', 'currency_id': 'RUB'}
+        response = api_client.post('/api/transactions/service-spend/', payload, format='json')
+        assert response.status_code == 201
+        assert response.content == JSONRenderer().render(response.data)
+
+        response = api_client.post('/api/transactions/async/service-spend/', payload, format='json')
+        assert response.status_code == 201
+        assert response['Content-Type'] == 'application/json'
+        assert response.json()['balances'] == {'RUB': '99800.00'}
+
+        response = api_client.post(
+            '/api/transactions/async/service-spend/', b'{"sum": ', content_type='application/json',
+        )
+        assert response.status_code == 400
+        assert response.json() == {'error': 'Некорректный JSON'}
@@ -0,0 +1,115 @@
+import pytest
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management import CommandError, call_command
+from django.utils import timezone
+from billing.models import Balance, BalanceSnapshot, LedgerEntry
+
+
+def snapshot():
+    call_command('snapshot_balances', lag=0)
+
+
+@pytest.mark.django_db
+class TestLedgerEntries:
+    """Тесты для проводок журнала"""
+
+    def test_conversion_writes_balanced_entries(self, api_client, ledger):
+        """Тест что конвертация даёт пары проводок с нулевой суммой по каждой валюте"""
+        response = api_client.post('/api/transactions/conversion/', {
+            'sum': '100', 'currency_id': 'USD', 'gross_currency_id': 'RUB', 'exchange_rate': '85.0',
+        }, format='json')
+
+        entries = LedgerEntry.objects.filter(transaction_id=response.data['id'])
+        assert sorted(entries.values_list('account', 'currency_id', 'amount')) == [
+            ('client', 'RUB', Decimal('-8500.00')),
+            ('client', 'USD', Decimal('100.00')),
+            ('external', 'RUB', Decimal('8500.00')),
+            ('external', 'USD', Decimal('-100.00')),
+        ]
+
+    def test_failed_transaction_writes_nothing(self, api_client, ledger):
+        """Тест что отклонённая операция не оставляет проводок"""
+        count = LedgerEntry.objects.count()
+
+        api_client.post('/api/transactions/service-spend/', {'sum': '1000000', 'currency_id': 'RUB'}, format='json')
+
+        assert LedgerEntry.objects.count() == count
+
+    def test_batch_writes_entries(self, api_client, ledger):
+        """Тест что пакет пишет проводки для каждого элемента"""
+        api_client.post('/api/transactions/batch/', {'items': [
+            {'type': 'account_topup', 'sum': '10', 'currency_id': 'RUB'},
+            {'type': 'service_spend', 'sum': '3', 'currency_id': 'RUB'},
+        ]}, format='json')
+
+        assert LedgerEntry.objects.exclude(transaction=None).count() == 4
+        assert LedgerEntry.objects.balance_at(None, 'RUB') == Decimal('100007.00')
+
+
+@pytest.mark.django_db
+class TestBalanceSnapshots:
+    """Тесты для снимков балансов и остатка на момент времени"""
+
+    def test_snapshot_and_balance_at(self, api_client, ledger):
+        """Тест остатка на момент: снимок плюс проводки после него"""
+        api_client.post('/api/transactions/account-topup/', {'sum': '100', 'currency_id': 'RUB'}, format='json')
+        snapshot()
+        moment = timezone.now()
+        api_client.post('/api/transactions/service-spend/', {'sum': '30', 'currency_id': 'RUB'}, format='json')
+
+        assert BalanceSnapshot.objects.get(currency='RUB').amount == Decimal('100100.00')
+        assert LedgerEntry.objects.balance_at(None, 'RUB', moment) == Decimal('100100.00')
+        assert LedgerEntry.objects.balance_at(None, 'RUB') == Decimal('100070.00')
+        assert LedgerEntry.objects.balance_at(None, 'RUB', moment - timedelta(days=1)) == Decimal('0.00')
+
+    def test_balance_at_reads_only_entries_after_snapshot(self, api_client, ledger, django_assert_num_queries):
+        """Тест что расчёт остатка — одно чтение снимка и одна агрегация"""
+        snapshot()
+
+        with django_assert_num_queries(2):
+            assert LedgerEntry.objects.balance_at(None, 'USD') == Decimal('1000.00')
+
+    def test_incremental_snapshots(self, api_client, ledger):
+        """Тест что следующий снимок строится от предыдущего и затрагивает только изменённые счета"""
+        snapshot()
+        api_client.post('/api/transactions/account-topup/', {'sum': '1', 'currency_id': 'RUB'}, format='json')
+        snapshot()
+        snapshot()
+
+        assert list(
+            BalanceSnapshot.objects.filter(currency='RUB').order_by('last_entry_id').values_list('amount', flat=True)
+        ) == [Decimal('100000.00'), Decimal('100001.00')]
+        assert BalanceSnapshot.objects.filter(currency='USD').count() == 1
+
+
+@pytest.mark.django_db
+class TestVerifyLedger:
+    """Тесты для команды verify_ledger"""
+
+    def test_consistent_ledger(self, api_client, ledger, capsys):
+        """Тест проверки согласованного журнала"""
+        api_client.post('/api/transactions/conversion/', {
+            'sum': '10', 'currency_id': 'USD', 'gross_currency_id': 'RUB', 'exchange_rate': '85.0',
+        }, format='json')
+        snapshot()
+        api_client.post('/api/transactions/account-topup/', {'sum': '5', 'currency_id': 'RUB'}, format='json')
+
+        call_command('verify_ledger', chunk_size=2)
+
+        assert '2 accounts checked' in capsys.readouterr().out
+
+    def test_balance_mismatch(self, ledger):
+        """Тест что изменение баланса в обход журнала обнаруживается"""
+        Balance.objects.filter(currency='USD').update(amount=Decimal('999.00'))
+
+        with pytest.raises(CommandError, match='Найдено расхождений: 1'):
+            call_command('verify_ledger')
+
+    def test_snapshot_mismatch(self, ledger):
+        """Тест что испорченный снимок обнаруживается"""
+        snapshot()
+        BalanceSnapshot.objects.filter(currency='RUB').update(amount=Decimal('1.00'))
+
+        with pytest.raises(CommandError, match='Найдено расхождений: 1'):
+            call_command('verify_ledger')
@@ -0,0 +1,129 @@
+import pytest
+from decimal import ROUND_HALF_EVEN, Decimal
+from django.core.management import CommandError, call_command
+from billing.models import Balance, Currency, LedgerEntry
+from billing.money import from_minor, to_minor
+
+
+CONVERSION = {'sum': '10.01', 'currency_id': 'USD', 'gross_currency_id': 'RUB', 'exchange_rate': '85.3'}
+
+
+def assert_minor_in_sync():
+    for model in (Balance, LedgerEntry):
+        for amount, amount_minor in model.objects.values_list('amount', 'amount_minor'):
+            assert amount_minor == to_minor(amount, 2), (model.__name__, amount, amount_minor)
+
+
+class TestMoney:
+    """Тесты перевода сумм в минимальные единицы"""
+
+    def test_to_minor(self):
+        """Тест точного перевода"""
+        assert to_minor(Decimal('123.45'), 2) == 12345
+        assert to_minor(Decimal('-0.29'), 2) == -29
+        assert to_minor(Decimal('500'), 0) == 500
+
+    def test_inexact_amount_requires_rounding(self):
+        """Тест что доля минимальной единицы без явного округления — ошибка"""
+        with pytest.raises(ValueError, match='не кратна минимальной единице'):
+            to_minor(Decimal('1.005'), 2)
+        assert to_minor(Decimal('1.005'), 2, rounding=ROUND_HALF_EVEN) == 100
+
+    def test_from_minor(self):
+        """Тест обратного перевода"""
+        assert from_minor(12345, 2) == Decimal('123.45')
+        assert str(from_minor(0, 2)) == '0.00'
+        assert from_minor(7, 0) == Decimal('7')
+
+
+@pytest.mark.django_db
+class TestMinorUnitColumns:
+    """Тесты записи amount_minor вместе с amount"""
+
+    def test_api_operations_keep_columns_in_sync(self, api_client, ledger, settings):
+        """Тест что все пути записи балансов и проводок пишут обе колонки"""
+        assert Balance.objects.get(currency='RUB').amount_minor == 10_000_000
+
+        api_client.post('/api/transactions/conversion/', CONVERSION, format='json')
+        api_client.post('/api/transactions/account-topup/', {'sum': '0.29', 'currency_id': 'RUB'}, format='json')
+        Balance.objects.account(None, 'RUB').reshard(3)
+        # Списание больше любого шарда проходит через блокировку всех шардов
+        api_client.post('/api/transactions/service-spend/', {'sum': '40000.07', 'currency_id': 'RUB'}, format='json')
+        settings.BILLING_BALANCE_CONCURRENCY = {'service_spend': 'optimistic'}
+        api_client.post('/api/transactions/service-spend/', {'sum': '0.01', 'currency_id': 'RUB'}, format='json')
+
+        assert LedgerEntry.objects.count() == 14
+        assert_minor_in_sync()
+
+    def test_exponent_is_per_currency(self, currencies):
+        """Тест что суммы счёта округляются до числа знаков его валюты"""
+        jpy = Currency.objects.create(code='JPY', name='Japanese Yen', exponent=0)
+        balance = Balance.objects.create(currency=jpy, amount=Decimal('1000'))
+        assert balance.amount_minor == 1000
+
+        balance.deposit(Decimal('250.4'))
+        balance.refresh_from_db()
+
+        assert (balance.amount, balance.amount_minor) == (Decimal('1250'), 1250)
+
+    def test_zero_exponent_ledger_matches_balance(self, api_client, ledger, settings):
+        """Тест что при exponent = 0 баланс и сумма проводок совпадают и в Decimal, и в целых"""
+        jpy = Currency.objects.create(code='JPY', name='Japanese Yen', exponent=0)
+        Balance.objects.create(currency=jpy, amount=Decimal('0'))
+        conversion = {'sum': '0.6', 'currency_id': 'JPY', 'gross_currency_id': 'RUB', 'exchange_rate': '0.5'}
+
+        for _ in range(2):
+            api_client.post('/api/transactions/conversion/', conversion, format='json')
+
+        balance = Balance.objects.get(currency='JPY')
+        entries = LedgerEntry.objects.account(None, 'JPY')
+        assert (balance.amount, balance.amount_minor) == (Decimal('2'), 2)
+        assert sorted(entries.values_list('amount', 'amount_minor')) == [(Decimal('1'), 1)] * 2
+        call_command('verify_ledger')
+        settings.BILLING_MINOR_UNITS = True
+        call_command('verify_ledger')
+        call_command('reconcile_balances', lag=0)
+
+
+@pytest.mark.django_db
+class TestMinorUnitReads:
+    """Тесты сверки по целым колонкам (BILLING_MINOR_UNITS)"""
+
+    @pytest.fixture(autouse=True)
+    def minor_units(self, settings):
+        settings.BILLING_MINOR_UNITS = True
+
+    def test_verify_ledger(self, api_client, ledger, capsys):
+        """Тест что согласованный журнал проходит проверку в минимальных единицах"""
+        api_client.post('/api/transactions/conversion/', CONVERSION, format='json')
+        call_command('snapshot_balances', lag=0)
+        api_client.post('/api/transactions/account-topup/', {'sum': '5', 'currency_id': 'RUB'}, format='json')
+
+        call_command('verify_ledger', chunk_size=2)
+
+        assert '2 accounts checked' in capsys.readouterr().out
+
+    def test_verify_ledger_reads_minor_column(self, ledger, capsys):
+        """Тест что расхождение ищется по amount_minor и выводится в валюте"""
+        Balance.objects.filter(currency='USD').update(amount_minor=99_900)
+
+        with pytest.raises(CommandError, match='Найдено расхождений: 1'):
+            call_command('verify_ledger')
+
+        assert 'Счёт USD/-: баланс 999.00, по журналу 1000.00' in capsys.readouterr().err
+
+    def test_unconverted_rows_are_refused(self, ledger):
+        """Тест что строки без amount_minor не дают сверить целые суммы"""
+        LedgerEntry.objects.filter(currency='RUB').update(amount_minor=None)
+
+        with pytest.raises(CommandError, match='без amount_minor'):
+            call_command('verify_ledger')
+
+    def test_reconcile_balances(self, api_client, ledger, capsys):
+        """Тест сверки балансов с историей по целым колонкам"""
+        api_client.post('/api/transactions/conversion/', CONVERSION, format='json')
+        api_client.post('/api/transactions/service-spend/', {'sum': '12.34', 'currency_id': 'RUB'}, format='json')
+
+        call_command('reconcile_balances', lag=0)
+
+        assert 'Balances are consistent: 2 accounts checked' in capsys.readouterr().out
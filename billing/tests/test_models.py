@@ -114,6 +114,70 @@ class TestBalanceModel:
         assert balance.amount == Decimal('1300.00')
 
 
+    def test_withdraw_insufficient_funds_keeps_balance(self, currencies):
+        """Тест что withdraw() при нехватке средств не меняет баланс"""
+        balance = Balance.objects.create(
+            currency=currencies['RUB'],
+            amount=Decimal('100.00')
+        )
+
+        with pytest.raises(ValueError, match="Недостаточно средств"):
+            balance.withdraw(Decimal('100.01'))
+
+        balance.refresh_from_db()
+        assert balance.amount == Decimal('100.00')
+
+
+@pytest.mark.django_db
+class TestBalanceQuerySet:
+    """Тесты для атомарных изменений баланса на уровне SQL"""
+
+    def test_withdraw_returns_new_amount_in_one_query(self, balances, django_assert_num_queries):
+        """Тест что списание выполняется одним UPDATE ... RETURNING"""
+        with django_assert_num_queries(1):
+            new_amount = Balance.objects.filter(currency='RUB').withdraw(Decimal('250.50'))
+
+        assert new_amount == Decimal('99749.50')
+        balances['RUB'].refresh_from_db()
+        assert balances['RUB'].amount == Decimal('99749.50')
+
+    def test_deposit_returns_new_amount_in_one_query(self, balances, django_assert_num_queries):
+        """Тест что пополнение выполняется одним UPDATE ... RETURNING"""
+        with django_assert_num_queries(1):
+            new_amount = Balance.objects.filter(currency='USD').deposit(Decimal('0.01'))
+
+        assert new_amount == Decimal('1000.01')
+        assert isinstance(new_amount, Decimal)
+
+    def test_withdraw_guard_rejects_overdraft(self, balances):
+        """Тест что условие amount >= X не даёт уйти в минус"""
+        with pytest.raises(ValueError, match="Недостаточно средств. Доступно: 1000.00 USD"):
+            Balance.objects.filter(currency='USD').withdraw(Decimal('1000.01'))
+
+        balances['USD'].refresh_from_db()
+        assert balances['USD'].amount == Decimal('1000.00')
+
+    def test_withdraw_whole_balance(self, balances):
+        """Тест списания всего остатка"""
+        new_amount = Balance.objects.filter(currency='USD').withdraw(Decimal('1000.00'))
+
+        assert new_amount == Decimal('0.00')
+
+    def test_missing_balance_raises_does_not_exist(self, currencies):
+        """Тест что для отсутствующего баланса выбрасывается DoesNotExist"""
+        with pytest.raises(Balance.DoesNotExist):
+            Balance.objects.filter(currency='USD').withdraw(Decimal('1.00'))
+
+        with pytest.raises(Balance.DoesNotExist):
+            Balance.objects.filter(currency='USD').deposit(Decimal('1.00'))
+
+    def test_amount_is_quantized_to_balance_precision(self, balances):
+        """Тест что сумма округляется до точности поля баланса"""
+        new_amount = Balance.objects.filter(currency='RUB').withdraw(Decimal('0.005'))
+
+        assert new_amount == Decimal('100000.00')
+
+
 @pytest.mark.django_db
 class TestTransactionModel:
     """Тесты для модели Transaction"""
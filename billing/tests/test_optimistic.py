@@ -0,0 +1,110 @@
+import pytest
+from decimal import Decimal
+from django.db import connection
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+from billing.models import Balance, LedgerEntry, Transaction
+from billing.views.transactions.views import BaseTransactionView
+
+
+CONVERSION = {'sum': '10', 'currency_id': 'USD', 'gross_currency_id': 'RUB', 'exchange_rate': '85.0'}
+
+
+@pytest.mark.django_db
+class TestOptimisticConcurrency:
+    """Тесты оптимистичного режима изменения балансов"""
+
+    @pytest.fixture(autouse=True)
+    def optimistic(self, settings, monkeypatch):
+        settings.BILLING_BALANCE_CONCURRENCY = {
+            'conversion': 'optimistic', 'service_spend': 'optimistic', 'account_topup': 'optimistic',
+        }
+        settings.BILLING_OPTIMISTIC_RETRIES = 2
+        self.sleeps = []
+        monkeypatch.setattr('billing.views.transactions.views.time.sleep', self.sleeps.append)
+
+    def bump_before_write(self, monkeypatch, times):
+        """
+        Имитирует параллельную операцию: между чтением и записью версия рублёвого
+        счёта меняется times раз. Изменение идёт в той же транзакции и откатывается
+        вместе с неудачной попыткой, поэтому на итоговый остаток не влияет.
+        """
+        create = BaseTransactionView.create_transaction
+        calls = {'left': times}
+
+        def create_and_bump(view, *args, **kwargs):
+            if calls['left']:
+                calls['left'] -= 1
+                Balance.objects.filter(currency_id='RUB').update(
+                    amount=F('amount') + 1, version=F('version') + 1,
+                )
+            return create(view, *args, **kwargs)
+
+        monkeypatch.setattr(BaseTransactionView, 'create_transaction', create_and_bump)
+
+    def test_conversion_without_locks(self, api_client, balances):
+        """Тест что конвертация читает без блокировки и пишет со сравнением версии"""
+        with CaptureQueriesContext(connection) as captured:
+            response = api_client.post('/api/transactions/conversion/', CONVERSION, format='json')
+
+        assert response.status_code == 201
+        assert response.data['balances'] == {'RUB': '99150.00', 'USD': '1010.00'}
+        sql = [query['sql'] for query in captured.captured_queries if '"billing_balance"' in query['sql']]
+        assert not any('FOR UPDATE' in query for query in sql)
+        updates = [query for query in sql if query.startswith('UPDATE')]
+        assert len(updates) == 2
+        assert all('"version" =' in query.split('WHERE')[1] for query in updates)
+        assert set(Balance.objects.values_list('version', flat=True)) == {1}
+
+    def test_conflict_is_retried(self, api_client, balances, monkeypatch):
+        """Тест что при конфликте операция повторяется с паузой и проводится один раз"""
+        self.bump_before_write(monkeypatch, times=1)
+
+        response = api_client.post('/api/transactions/service-spend/', {'sum': '100', 'currency_id': 'RUB'}, format='json')
+
+        assert response.status_code == 201
+        assert response.data['balances'] == {'RUB': '99900.00'}
+        assert len(self.sleeps) == 1
+        assert Transaction.objects.count() == 1
+        assert LedgerEntry.objects.count() == 2
+
+    def test_retries_are_bounded(self, api_client, balances, monkeypatch):
+        """Тест что после исчерпания повторов возвращается 409 и ничего не проводится"""
+        self.bump_before_write(monkeypatch, times=3)
+
+        response = api_client.post('/api/transactions/conversion/', CONVERSION, format='json')
+
+        assert response.status_code == 409
+        assert 'повторите запрос' in response.data['error']
+        assert len(self.sleeps) == 2
+        assert self.sleeps[1] <= 0.005 * 2
+        assert Transaction.objects.count() == 0
+        assert Balance.objects.get(currency_id='USD').amount == Decimal('1000.00')
+
+    def test_insufficient_funds(self, api_client, balances):
+        """Тест что нехватка средств проверяется по прочитанному остатку"""
+        response = api_client.post('/api/transactions/service-spend/', {'sum': '100001', 'currency_id': 'RUB'}, format='json')
+
+        assert response.status_code == 400
+        assert response.data == {'error': 'Недостаточно средств. Доступно: 100000.00 RUB'}
+        assert Transaction.objects.count() == 0
+
+    def test_sharded_withdraw(self, api_client, balances):
+        """Тест списания с нескольких шардов со сравнением версий"""
+        Balance.objects.account(None, 'RUB').reshard(4)
+
+        response = api_client.post('/api/transactions/service-spend/', {'sum': '60000', 'currency_id': 'RUB'}, format='json')
+
+        assert response.status_code == 201
+        assert response.data['balances'] == {'RUB': '40000.00'}
+        assert Balance.objects.account(None, 'RUB').total() == Decimal('40000.00')
+
+    def test_mode_is_per_endpoint(self, api_client, balances, settings):
+        """Тест что режим выбирается для каждого типа операции отдельно"""
+        settings.BILLING_BALANCE_CONCURRENCY = {'conversion': 'optimistic'}
+        with CaptureQueriesContext(connection) as captured:
+            api_client.post('/api/transactions/service-spend/', {'sum': '1', 'currency_id': 'RUB'}, format='json')
+        # Покупка в режиме блокировок: один условный UPDATE без проверки версии
+        updates = [query['sql'] for query in captured.captured_queries if query['sql'].startswith('UPDATE "billing_balance"')]
+        assert len(updates) == 1
+        assert '"version" =' not in updates[0].split('WHERE')[1]
@@ -0,0 +1,70 @@
+import pytest
+from datetime import datetime, timezone
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from billing.models import ArchivedTransaction, Balance, Currency, LedgerEntry, Transaction, TransactionDailyAggregate
+
+
+def seed(**options):
+    call_command('seed_billing', **{'currencies': 3, 'users': 5, 'transactions': 500, 'batch_size': 200, **options})
+
+
+@pytest.mark.django_db
+class TestSeedBilling:
+    """Тесты для генератора тестовых данных"""
+
+    def test_seeds_consistent_data(self):
+        """Тест что сгенерированные балансы сходятся с историей и журналом"""
+        seed(seed=1)
+
+        assert Currency.objects.count() == 3
+        assert User.objects.count() == 5
+        assert Balance.objects.count() == 15
+        assert Transaction.objects.count() == 500
+        assert set(Transaction.objects.values_list('transaction_type', flat=True)) == {
+            'conversion', 'service_spend', 'account_topup',
+        }
+        assert not Balance.objects.filter(amount__lt=0).exists()
+        assert sum(TransactionDailyAggregate.objects.values_list('count', flat=True)) == 500
+        call_command('reconcile_balances', lag=0)
+        call_command('verify_ledger')
+
+    def test_rerun_appends_transactions(self):
+        """Тест что повторный запуск не дублирует валюты, пользователей и балансы"""
+        seed(seed=1)
+        seed(seed=2)
+
+        assert User.objects.count() == 5
+        assert Balance.objects.count() == 15
+        assert Transaction.objects.count() == 1000
+        call_command('reconcile_balances', lag=0)
+        call_command('verify_ledger')
+
+    def test_rerun_keeps_existing_balances_non_negative(self):
+        """Тест что повторный запуск пополняет существующий баланс, который иначе ушёл бы в минус"""
+        seed(transactions=0)
+        seed(seed=1, transactions=3000, batch_size=1000)
+
+        assert not Balance.objects.filter(amount__lt=0).exists()
+        call_command('reconcile_balances', lag=0)
+        call_command('verify_ledger')
+
+    def test_rerun_after_archive_keeps_ids_unique(self):
+        """Тест что новые транзакции не получают ID, уже занятые архивом"""
+        seed(seed=1)
+        Transaction.objects.update(created_at=datetime(2020, 1, 1, tzinfo=timezone.utc))
+        call_command('archive_transactions', keep_months=1)
+        assert not Transaction.objects.exists()
+
+        seed(seed=2)
+
+        archived = set(ArchivedTransaction.objects.values_list('id', flat=True))
+        assert not archived & set(Transaction.objects.values_list('id', flat=True))
+
+    def test_skip_ledger(self):
+        """Тест режима без проводок журнала"""
+        seed(skip_ledger=True)
+
+        assert Transaction.objects.count() == 500
+        assert not LedgerEntry.objects.exclude(transaction=None).exists()
+        call_command('reconcile_balances', lag=0)
@@ -0,0 +1,106 @@
+import pytest
+from decimal import Decimal
+from unittest import mock
+from django.core.management import call_command
+from billing.models import Balance, LedgerEntry, PendingTopUp, Transaction, TransactionDailyAggregate
+
+
+def topup(api_client, amount, **data):
+    return api_client.post(
+        '/api/transactions/account-topup/', {'sum': amount, 'currency_id': 'RUB', **data}, format='json',
+    )
+
+
+def apply_pending(**options):
+    call_command('apply_pending_topups', **options)
+
+
+@pytest.mark.django_db
+class TestWriteBehindTopUp:
+    """Тесты для отложенного проведения пополнений"""
+
+    @pytest.fixture(autouse=True)
+    def write_behind(self, settings):
+        settings.BILLING_TOPUP_WRITE_BEHIND = True
+
+    def test_accepted_without_touching_balance(self, api_client, balances):
+        """Тест что пополнение принимается в журнал с ответом 202"""
+        response = topup(api_client, '100')
+
+        assert response.status_code == 202
+        assert response.data['status'] == 'pending'
+        assert PendingTopUp.objects.get().delta == Decimal('100.00')
+        assert not Transaction.objects.exists()
+        assert Balance.objects.get(currency='RUB').amount == Decimal('100000.00')
+
+    def test_batch_applied_once(self, api_client, ledger):
+        """Тест что пачка проводится одним зачислением и только один раз"""
+        topup(api_client, '100')
+        topup(api_client, '50.555')
+        topup(api_client, '10', currency_id='USD', gross_currency_id='RUB', exchange_rate='85.0')
+
+        apply_pending(batch_size=2)
+        apply_pending()
+
+        assert Balance.objects.get(currency='RUB').amount == Decimal('101000.56')
+        assert Transaction.objects.count() == 3
+        assert set(PendingTopUp.objects.values_list('status', flat=True)) == {'applied'}
+        assert not PendingTopUp.objects.filter(transaction=None).exists()
+        assert LedgerEntry.objects.balance_at(None, 'RUB') == Decimal('101000.56')
+        assert sum(TransactionDailyAggregate.objects.values_list('count', flat=True)) == 3
+        call_command('reconcile_balances', lag=0)
+
+    def test_crash_leaves_journal_pending(self, api_client, balances):
+        """Тест что сбой до коммита откатывает зачисление и запись проводится повторно"""
+        topup(api_client, '100')
+
+        with mock.patch.object(LedgerEntry.objects, 'bulk_create', side_effect=RuntimeError('crash')):
+            with pytest.raises(RuntimeError):
+                apply_pending()
+
+        assert Balance.objects.get(currency='RUB').amount == Decimal('100000.00')
+        assert PendingTopUp.objects.get().status == 'pending'
+
+        apply_pending()
+
+        assert Balance.objects.get(currency='RUB').amount == Decimal('100100.00')
+        assert Transaction.objects.count() == 1
+
+    def test_zero_topup(self, api_client, ledger):
+        """Тест что пополнение меньше копейки отклоняется, а старая нулевая запись не стопорит журнал"""
+        response = topup(api_client, '0.001')
+
+        assert response.status_code == 400
+        assert 'меньше минимальной единицы' in response.data['error']
+        assert not PendingTopUp.objects.exists()
+
+        # Запись, принятая до проверки, — единственная в своей пачке
+        PendingTopUp.objects.create(
+            balance_currency_id='RUB', delta=Decimal('0.00'), amount=Decimal('0.001'), currency_id='RUB',
+        )
+        apply_pending()
+        topup(api_client, '100')
+        apply_pending()
+
+        assert set(PendingTopUp.objects.values_list('status', flat=True)) == {'applied'}
+        assert Balance.objects.get(currency='RUB').amount == Decimal('100100.00')
+        call_command('verify_ledger')
+
+    def test_missing_balance_rejected(self, api_client, currencies):
+        """Тест что пополнение без баланса отклоняется сразу"""
+        response = topup(api_client, '100')
+
+        assert response.status_code == 400
+        assert not PendingTopUp.objects.exists()
+
+    def test_balance_removed_before_apply(self, api_client, balances):
+        """Тест что запись по исчезнувшему балансу отклоняется, не блокируя очередь"""
+        topup(api_client, '100')
+        Balance.objects.all().delete()
+
+        apply_pending()
+
+        pending = PendingTopUp.objects.get()
+        assert pending.status == 'failed'
+        assert pending.error == 'Баланс для валюты RUB не найден'
+        assert not Transaction.objects.exists()
@@ -1,5 +1,7 @@
 from django.urls import include, path
 
+from billing.views.metrics import metrics
+
 
 api_patterns = [
     path("transactions/", include("billing.views.transactions.urls")),
@@ -8,4 +10,5 @@ api_patterns = [
 
 urlpatterns = [
     path("api/", include(api_patterns)),
+    path("metrics", metrics, name="metrics"),
 ]
@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+from billing.instrumentation import is_enabled, metrics_registry
+
+
+def metrics(request):
+    """Метрики процесса в формате Prometheus. Доступны только с локальных адресов."""
+    allowed = getattr(settings, 'BILLING_METRICS_ALLOWED_IPS', ('127.0.0.1', '::1'))
+    if not is_enabled() or request.META.get('REMOTE_ADDR') not in allowed:
+        raise Http404
+    return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
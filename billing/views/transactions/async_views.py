@@ -0,0 +1,127 @@
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+
+from billing import instrumentation
+from billing.currencies import currency_registry
+from billing.idempotency import IDEMPOTENCY_HEADER
+from billing.models import Currency
+from billing.rates import rate_cache
+from billing.renderers import BillingJSONRenderer, current_backend
+from billing.views.transactions.views import ConversionView, ServiceSpendView, TopUpView
+
+
+class AsyncTransactionView(View):
+    """
+    Async-вариант эндпоинта транзакции для запуска под ASGI.
+    Разбор запроса и валюты получаются без потока-моста
+    (currency_registry.aget()). Пользователя определяют классы
+    аутентификации view_class, как и у синхронного эндпоинта, — они
+    обращаются к БД и выполняются в потоке. Второй синхронный блок —
+    транзакция БД с изменением балансов, записью Transaction и ключом
+    идемпотентности. Бизнес-логика берётся из синхронного представления
+    view_class.
+    """
+    view_class = None
+    currency_fields = ('currency_id', 'gross_currency_id')
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        # Как и у APIView: CSRF проверяется только для пользователей с сессией
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def post(self, request):
+        try:
+            data = current_backend(BillingJSONRenderer).loads(request.body or b'{}')
+        except Exception:
+            return self.respond({"error": "Некорректный JSON"}, status.HTTP_400_BAD_REQUEST)
+        if not isinstance(data, dict):
+            return self.respond({"error": "Ожидается JSON-объект"}, status.HTTP_400_BAD_REQUEST)
+
+        view = self.view_class()
+        try:
+            user = await sync_to_async(self.authenticate)(view, request)
+        except exceptions.APIException as e:
+            return self.respond({"detail": str(e.detail)}, e.status_code, headers=getattr(e, 'auth_header', None))
+        if not user.is_authenticated:
+            # Анонимные запросы работают с общим счётом без пользователя
+            user = None
+
+        serializer = view.get_serializer(data, context={
+            'currencies': await self.get_currencies(data),
+            'rates': await rate_cache.asnapshot(),
+        })
+        with instrumentation.phase('validate'):
+            valid = serializer.is_valid()
+        if not valid:
+            return self.respond(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        response = await sync_to_async(self.execute)(view, serializer.validated_data, user, key, data)
+        headers = {name: value for name, value in response.items() if name != 'Content-Type'}
+        return self.respond(response.data, response.status_code, headers=headers)
+
+    @staticmethod
+    def authenticate(view, request):
+        """
+        Пользователь по authentication_classes представления (сессия с проверкой
+        CSRF, HTTP Basic и т. д.). Неверные учётные данные — исключение DRF
+        с тем же кодом ответа, что у синхронного эндпоинта.
+        """
+        drf_request = Request(request, authenticators=view.get_authenticators())
+        try:
+            return drf_request.user
+        except (exceptions.NotAuthenticated, exceptions.AuthenticationFailed) as e:
+            # Как APIView.handle_exception: 401 с WWW-Authenticate, если его задаёт первый класс, иначе 403
+            header = view.get_authenticate_header(drf_request)
+            if header:
+                e.auth_header = {'WWW-Authenticate': header}
+            else:
+                e.status_code = status.HTTP_403_FORBIDDEN
+            raise
+
+    async def get_currencies(self, data):
+        """Находит валюты из запроса. Неизвестные коды пропускаются, их отклонит сериализатор."""
+        currencies = {}
+        for field in self.currency_fields:
+            value = data.get(field)
+            if not isinstance(value, str) or not value:
+                continue
+            code = value.upper()
+            try:
+                currencies[code] = await currency_registry.aget(code)
+            except Currency.DoesNotExist:
+                pass
+        return currencies
+
+    @staticmethod
+    def execute(view, validated_data, user, key, data):
+        """Синхронный блок: транзакция БД и, при наличии ключа, идемпотентность."""
+        if not key:
+            return view.execute(validated_data, user=user)
+        return view.idempotent_process(key, user, data, lambda: view.execute(validated_data, user=user))
+
+    def respond(self, data, status_code, headers=None):
+        # Тот же рендерер, что и у синхронных представлений
+        return HttpResponse(
+            BillingJSONRenderer().render(data),
+            status=status_code,
+            headers=headers,
+            content_type=BillingJSONRenderer.media_type,
+        )
+
+
+class AsyncConversionView(AsyncTransactionView):
+    view_class = ConversionView
+
+
+class AsyncServiceSpendView(AsyncTransactionView):
+    view_class = ServiceSpendView
+
+
+class AsyncTopUpView(AsyncTransactionView):
+    view_class = TopUpView
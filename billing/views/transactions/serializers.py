@@ -1,5 +1,10 @@
+import base64
+import json
+from datetime import datetime
 from decimal import Decimal, InvalidOperation
 from rest_framework import serializers
+from billing.currencies import currency_registry
+from billing.rates import rate_cache
 from billing.models import Transaction, Currency, Balance
 
 
@@ -36,9 +41,14 @@ class TransactionSerializer(serializers.Serializer):
 
     def _get_currency(self, value):
         currency_code = value.upper()
+        # Async-представления заранее находят валюты и передают их в context,
+        # чтобы валидация не обращалась к БД
+        currencies = self.context.get('currencies')
         try:
-            return Currency.objects.get(code=currency_code)
-        except Currency.DoesNotExist:
+            if currencies is not None:
+                return currencies[currency_code]
+            return currency_registry.get(currency_code)
+        except (KeyError, Currency.DoesNotExist):
             raise serializers.ValidationError(f"Валюта {currency_code} не поддерживается")
 
     def validate_currency_id(self, value):
@@ -68,15 +78,47 @@ class TransactionSerializer(serializers.Serializer):
                     "Валюты конвертации должны быть разными"
                 )
 
+            # Курс с сервера нужен только операции, которая действительно конвертирует
+            if not attrs.get('exchange_rate') and self.converts(attrs):
+                attrs['exchange_rate'] = self._get_server_rate(attrs['currency_id'], attrs['gross_currency_id'])
+
         return attrs
 
+    def converts(self, attrs):
+        """Пересчитывает ли операция сумму по курсу: рублёвые покупки и пополнения курс не используют."""
+        return attrs['currency_id'].code != 'RUB'
+
+    @staticmethod
+    def rate_pair(currency, gross_currency):
+        """
+        Пара (base, quote) курса, который ожидает поле exchange_rate:
+        для пар с RUB — рубли за единицу другой валюты,
+        для остальных — единицы gross_currency за единицу currency.
+        """
+        if currency.code == 'RUB':
+            return gross_currency.code, currency.code
+        return currency.code, gross_currency.code
+
+    def _get_server_rate(self, currency, gross_currency):
+        # Async-представления передают снимок курсов в context, чтобы не обращаться к БД
+        rates = self.context.get('rates') or rate_cache.snapshot()
+        base, quote = self.rate_pair(currency, gross_currency)
+        rate = rates.get(base, quote)
+        if rate is None:
+            raise serializers.ValidationError(f"Курс {base}/{quote} не найден, передайте exchange_rate")
+        return rate
+
     def create(self, validated_data):
         raise NotImplementedError("Метод create должен быть переопределён")
 
 
 class ConversionSerializer(TransactionSerializer):
     gross_currency_id = serializers.CharField(required=True)
-    exchange_rate = serializers.CharField(required=True)
+    # Без exchange_rate берётся текущий курс из таблицы ExchangeRate
+    exchange_rate = serializers.CharField(required=False, allow_null=True)
+
+    def converts(self, attrs):
+        return True
 
     def validate(self, attrs):
         attrs = super().validate(attrs)
@@ -103,3 +145,77 @@ class AccountTopUpSerializer(TransactionSerializer):
         attrs = super().validate(attrs)
         self._validate_non_rub_conversion(attrs)
         return attrs
+
+
+class BatchItemSerializer(serializers.Serializer):
+    type = serializers.ChoiceField(choices=Transaction.TransactionType.choices)
+
+    def to_internal_value(self, data):
+        # Поля операции проверяет сериализатор её типа, здесь оставляем их как есть
+        validated = super().to_internal_value(data)
+        return {**data, **validated}
+
+
+class BatchTransactionSerializer(serializers.Serializer):
+    MODE_ATOMIC = "atomic"
+    MODE_BEST_EFFORT = "best_effort"
+    MAX_ITEMS = 1000
+
+    mode = serializers.ChoiceField(choices=[MODE_ATOMIC, MODE_BEST_EFFORT], default=MODE_ATOMIC)
+    items = serializers.ListField(
+        child=BatchItemSerializer(),
+        allow_empty=False,
+        max_length=MAX_ITEMS,
+    )
+
+
+class TransactionHistoryQuerySerializer(serializers.Serializer):
+    EXPORT_NDJSON = "ndjson"
+    EXPORT_CSV = "csv"
+    DEFAULT_LIMIT = 100
+    MAX_LIMIT = 1000
+
+    transaction_type = serializers.ChoiceField(choices=Transaction.TransactionType.choices, required=False)
+    currency = serializers.CharField(required=False)
+    date_from = serializers.DateTimeField(required=False)
+    date_to = serializers.DateTimeField(required=False)
+    cursor = serializers.CharField(required=False)
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=MAX_LIMIT, default=DEFAULT_LIMIT)
+    export = serializers.ChoiceField(choices=[EXPORT_NDJSON, EXPORT_CSV], required=False)
+
+    def validate_currency(self, value):
+        return value.upper()
+
+    def validate_cursor(self, value):
+        try:
+            created_at, pk = json.loads(base64.urlsafe_b64decode(value.encode()))
+            return datetime.fromisoformat(created_at), int(pk)
+        except (ValueError, TypeError):
+            raise serializers.ValidationError("Некорректный курсор")
+
+    def validate(self, attrs):
+        if attrs.get('date_from') and attrs.get('date_to') and attrs['date_from'] >= attrs['date_to']:
+            raise serializers.ValidationError("date_from должна быть раньше date_to")
+        return attrs
+
+    @staticmethod
+    def encode_cursor(created_at, pk):
+        return base64.urlsafe_b64encode(json.dumps([created_at.isoformat(), pk]).encode()).decode()
+
+
+class TurnoverQuerySerializer(serializers.Serializer):
+    GROUP_BY_DAY = "day"
+
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    transaction_type = serializers.ChoiceField(choices=Transaction.TransactionType.choices, required=False)
+    currency = serializers.CharField(required=False)
+    group_by = serializers.ChoiceField(choices=[GROUP_BY_DAY], required=False)
+
+    def validate_currency(self, value):
+        return value.upper()
+
+    def validate(self, attrs):
+        if attrs.get('date_from') and attrs.get('date_to') and attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError("date_from не может быть позже date_to")
+        return attrs
@@ -1,9 +1,33 @@
 from django.urls import path
-from billing.views.transactions.views import ConversionView, ServiceSpendView, TopUpView
+from billing.views.transactions.async_views import (
+    AsyncConversionView,
+    AsyncServiceSpendView,
+    AsyncTopUpView,
+)
+from billing.views.transactions.views import (
+    BatchTransactionView,
+    ConversionView,
+    HoldCaptureView,
+    HoldVoidView,
+    ServiceSpendAuthorizeView,
+    ServiceSpendView,
+    TopUpView,
+    TransactionHistoryView,
+    TurnoverView,
+)
 
 
 urlpatterns = [
+    path('', TransactionHistoryView.as_view(), name='history'),
     path('conversion/', ConversionView.as_view(), name='conversion'),
     path('service-spend/', ServiceSpendView.as_view(), name='service-spend'),
+    path('service-spend/authorize/', ServiceSpendAuthorizeView.as_view(), name='service-spend-authorize'),
+    path('holds/<int:pk>/capture/', HoldCaptureView.as_view(), name='hold-capture'),
+    path('holds/<int:pk>/void/', HoldVoidView.as_view(), name='hold-void'),
     path('account-topup/', TopUpView.as_view(), name='account-topup'),
+    path('batch/', BatchTransactionView.as_view(), name='batch'),
+    path('turnover/', TurnoverView.as_view(), name='turnover'),
+    path('async/conversion/', AsyncConversionView.as_view(), name='async-conversion'),
+    path('async/service-spend/', AsyncServiceSpendView.as_view(), name='async-service-spend'),
+    path('async/account-topup/', AsyncTopUpView.as_view(), name='async-account-topup'),
 ]
@@ -0,0 +1,200 @@
+"""
+Быстрая проверка тел запросов транзакций (BILLING_FAST_VALIDATION).
+
+Схема собирается один раз из объявленных полей сериализатора DRF, и запрос
+разбирается за один проход без копирования полей, ReturnDict и цепочки
+run_validation. Проверки значений и связей полей — это методы validate_*
+и validate() того же сериализатора, поэтому сообщения об ошибках и
+validated_data совпадают с путём через DRF. Нестандартный ввод (не dict,
+форма, не строковые значения, не-ASCII символы) целиком уходит в сериализатор.
+"""
+from collections.abc import Mapping
+
+from django.core.validators import ProhibitNullCharactersValidator
+from rest_framework import serializers
+from rest_framework.exceptions import ErrorDetail
+from rest_framework.fields import empty
+from rest_framework.validators import ProhibitSurrogateCharactersValidator
+
+
+_MISSING = object()
+
+BUILTIN_VALIDATORS = (ProhibitNullCharactersValidator, ProhibitSurrogateCharactersValidator)
+
+
+class ValidatedTransaction(Mapping):
+    """validated_data быстрой проверки: словарь с фиксированным набором ключей."""
+    __slots__ = ('sum', 'currency_id', 'gross_currency_id', 'exchange_rate')
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, _MISSING)
+
+    def __getitem__(self, key):
+        value = getattr(self, key, _MISSING) if key in self.__slots__ else _MISSING
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __iter__(self):
+        return (name for name in self.__slots__ if getattr(self, name) is not _MISSING)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class _FieldSpec:
+    __slots__ = ('name', 'required', 'allow_null', 'allow_blank', 'validate')
+
+    def __init__(self, name, field, validate):
+        self.name = name
+        self.required = field.required
+        self.allow_null = field.allow_null
+        self.allow_blank = field.allow_blank
+        self.validate = validate
+
+
+class TransactionSchema:
+    """
+    Скомпилированная схема сериализатора транзакции.
+    Экземпляр вызывается как класс сериализатора: schema(data=..., context=...).
+    """
+    __slots__ = ('serializer_class', 'fields', 'messages', '_shared')
+
+    def __init__(self, serializer_class):
+        fields = []
+        for name, field in serializer_class._declared_fields.items():
+            if name not in ValidatedTransaction.__slots__:
+                raise TypeError(f'{serializer_class.__name__}: неизвестное поле {name}')
+            # Встроенные валидаторы CharField (NUL и суррогаты) заменяет проверка ASCII в _fast_path_applies
+            if (
+                type(field) is not serializers.CharField
+                or not field.trim_whitespace
+                or any(not isinstance(validator, BUILTIN_VALIDATORS) for validator in field.validators)
+            ):
+                raise TypeError(f'{serializer_class.__name__}.{name}: поддерживаются только простые CharField')
+            fields.append(_FieldSpec(name, field, getattr(serializer_class, f'validate_{name}', None)))
+        self.serializer_class = serializer_class
+        self.fields = tuple(fields)
+        self.messages = serializers.CharField().error_messages
+        self._shared = None
+
+    def __call__(self, data=empty, context=None):
+        return FastValidation(self, data, context)
+
+    def serializer(self, context):
+        """Экземпляр сериализатора для вызова его методов validate_* и validate()."""
+        if context is not None:
+            return self.serializer_class(context=context)
+        # Без контекста методы ничего не пишут в экземпляр, один объект на процесс
+        shared = self._shared
+        if shared is None:
+            shared = self._shared = self.serializer_class()
+        return shared
+
+
+class FastValidation:
+    """Результат разбора с интерфейсом сериализатора: is_valid(), errors, validated_data."""
+    __slots__ = ('schema', 'initial_data', 'context', '_validated_data', '_errors', '_fallback')
+
+    def __init__(self, schema, data, context):
+        self.schema = schema
+        self.initial_data = data
+        self.context = context
+        self._validated_data = None
+        self._errors = None
+        self._fallback = None
+
+    def is_valid(self, raise_exception=False):
+        if self._errors is None:
+            if self._fast_path_applies():
+                self._parse()
+            else:
+                kwargs = {} if self.context is None else {'context': self.context}
+                self._fallback = self.schema.serializer_class(data=self.initial_data, **kwargs)
+                self._fallback.is_valid()
+                self._errors = self._fallback.errors
+                self._validated_data = self._fallback.validated_data
+        if self._errors and raise_exception:
+            raise serializers.ValidationError(self._errors)
+        return not self._errors
+
+    @property
+    def errors(self):
+        if self._errors is None:
+            raise AssertionError('You must call `.is_valid()` before accessing `.errors`.')
+        return self._errors
+
+    @property
+    def validated_data(self):
+        if self._errors is None:
+            raise AssertionError('You must call `.is_valid()` before accessing `.validated_data`.')
+        return self._validated_data
+
+    def _fast_path_applies(self):
+        data = self.initial_data
+        if type(data) is not dict:
+            return False
+        for spec in self.schema.fields:
+            value = data.get(spec.name)
+            if value is None or type(value) in (int, float):
+                continue
+            if type(value) is not str or not value.isascii() or '\x00' in value:
+                return False
+        return True
+
+    def _parse(self):
+        data = self.initial_data
+        messages = self.schema.messages
+        serializer = None
+        result = ValidatedTransaction()
+        errors = {}
+
+        for spec in self.schema.fields:
+            value = data.get(spec.name, _MISSING)
+            if value is _MISSING:
+                if spec.required:
+                    errors[spec.name] = [ErrorDetail(messages['required'], code='required')]
+                continue
+            if value is None:
+                if not spec.allow_null:
+                    errors[spec.name] = [ErrorDetail(messages['null'], code='null')]
+                    continue
+            else:
+                # Как CharField: числа JSON приводятся к строке, пробелы по краям срезаются
+                value = str(value).strip()
+                if not value and not spec.allow_blank:
+                    errors[spec.name] = [ErrorDetail(messages['blank'], code='blank')]
+                    continue
+            if spec.validate is not None:
+                if serializer is None:
+                    serializer = self.schema.serializer(self.context)
+                try:
+                    value = spec.validate(serializer, value)
+                except serializers.ValidationError as exc:
+                    errors[spec.name] = exc.detail
+                    continue
+            result[spec.name] = value
+
+        if not errors:
+            if serializer is None:
+                serializer = self.schema.serializer(self.context)
+            try:
+                result = serializer.validate(result)
+            except serializers.ValidationError as exc:
+                errors = serializers.as_serializer_error(exc)
+
+        if errors:
+            self._errors = errors
+            self._validated_data = {}
+        else:
+            self._errors = {}
+            self._validated_data = result
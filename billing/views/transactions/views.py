@@ -1,32 +1,200 @@
+import csv
+import random
+import time
+from datetime import timedelta
 from decimal import Decimal
 
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from django.db import transaction
+from django.db.models import Q, Sum
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from rest_framework import status
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework.views import APIView
 from rest_framework.response import Response
 
-from billing.models import Transaction, Balance, Currency
-from billing.views.transactions.serializers import ConversionSerializer, ServiceSpendSerializer, AccountTopUpSerializer
+from billing import instrumentation
+from billing.currencies import currency_registry
+from billing.idempotency import (
+    IDEMPOTENCY_HEADER,
+    DuplicateIdempotencyKey,
+    IdempotencyKeyReused,
+    get_request_hash,
+    idempotency_store,
+)
+from billing.models import (
+    ArchivedTransaction,
+    Balance,
+    BalanceVersionConflict,
+    Hold,
+    LedgerEntry,
+    PendingTopUp,
+    Transaction,
+    TransactionDailyAggregate,
+)
+from billing.views.transactions.serializers import (
+    AccountTopUpSerializer,
+    BatchTransactionSerializer,
+    ConversionSerializer,
+    ServiceSpendSerializer,
+    TransactionHistoryQuerySerializer,
+    TurnoverQuerySerializer,
+)
+from billing.views.transactions.validators import TransactionSchema
+
+
+# Режимы изменения балансов (BILLING_BALANCE_CONCURRENCY): блокировки или сравнение версий
+LOCKING = 'locking'
+OPTIMISTIC = 'optimistic'
+CONCURRENCY_MODES = (LOCKING, OPTIMISTIC)
+
+def record_daily_aggregates(transactions):
+    """Учитывает транзакции в дневных оборотах, если они ведутся синхронно."""
+    if transactions and getattr(settings, 'BILLING_DAILY_AGGREGATES_INLINE', True):
+        with instrumentation.phase('aggregate'):
+            TransactionDailyAggregate.objects.record(transactions)
+
+
+def lock_balances(currencies, user=None, missing_ok=False):
+    """
+    Блокирует все шарды счетов пользователя в валютах currencies ({код: Currency})
+    одним запросом в порядке первичного ключа и возвращает списки шардов по кодам.
+    Операции с разным направлением (USD→RUB и RUB→USD) берут блокировки
+    в одном порядке и не взаимоблокируются.
+    """
+    return read_balances(currencies, user=user, lock=True, missing_ok=missing_ok)
+
+
+def read_balances(currencies, user=None, lock=False, missing_ok=False):
+    """
+    Шарды счетов пользователя в валютах currencies по кодам; lock=True — см. lock_balances.
+    Отсутствующий счёт — ValueError, с missing_ok=True его кода просто нет в результате.
+    """
+    rows = Balance.objects.filter(user=user, currency__in=currencies)
+    shards = {}
+    for balance in (rows.lock() if lock else rows.order_by('pk')):
+        balance.currency = currencies[balance.currency_id]
+        shards.setdefault(balance.currency_id, []).append(balance)
+    if not missing_ok:
+        for code in currencies:
+            if code not in shards:
+                raise ValueError(f"Баланс для валюты {code} не найден")
+    return shards
+
+
+class IdempotencyMixin:
+    """
+    Поддержка заголовка Idempotency-Key для POST-эндпоинтов.
+    Успешный ответ сохраняется в той же транзакции БД, что и сама операция.
+    Повтор с тем же ключом отдаёт сохранённый ответ, не трогая балансы
+    и не беря блокировок.
+    """
+    idempotency_scope = None
+    max_idempotency_key_length = 255
+
+    def get_idempotency_scope(self, user):
+        # Ключи разных пользователей не пересекаются
+        if user is not None and user.is_authenticated:
+            return f"{self.idempotency_scope}:{user.pk}"
+        return self.idempotency_scope
+
+    def idempotent_post(self, request, process):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return process()
+        return self.idempotent_process(key, request.user, request.data, process)
+
+    def idempotent_process(self, key, user, data, process):
+        """Выполняет process() под ключом key или отдаёт сохранённый ответ."""
+        if len(key) > self.max_idempotency_key_length:
+            return Response(
+                {"error": f"{IDEMPOTENCY_HEADER} длиннее {self.max_idempotency_key_length} символов"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        scope = self.get_idempotency_scope(user)
+        request_hash = get_request_hash(data)
+        try:
+            stored = idempotency_store.get(scope, key, request_hash)
+            if stored is None:
+                with instrumentation.atomic():
+                    response = process()
+                    if status.is_success(response.status_code):
+                        idempotency_store.save(scope, key, request_hash, response.status_code, response.data)
+                    return response
+        except IdempotencyKeyReused as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        except DuplicateIdempotencyKey:
+            # Параллельный запрос с тем же ключом закоммитился первым, наша операция откатана
+            stored = idempotency_store.get(scope, key, request_hash)
 
+        return Response(stored.body, status=stored.status, headers={"Idempotent-Replayed": "true"})
 
-class BaseTransactionView(APIView):
+
+class BaseTransactionView(IdempotencyMixin, APIView):
     serializer_class = None
+    # Схема быстрой проверки того же сериализатора (BILLING_FAST_VALIDATION)
+    fast_serializer_class = None
     transaction_type = None
 
+    @property
+    def idempotency_scope(self):
+        return self.transaction_type
+
     def post(self, request):
-        # user = request.user # TODO: в будущем можно добавить юзера, для экономии времени не стал
-        serializer = self.serializer_class(data=request.data)
+        return self.idempotent_post(request, lambda: self.perform_post(request))
 
-        if not serializer.is_valid():
+    def perform_post(self, request):
+        # Анонимные запросы работают с общим счётом без пользователя
+        user = request.user if request.user.is_authenticated else None
+        serializer = self.get_serializer(request.data)
+
+        with instrumentation.phase('validate'):
+            valid = serializer.is_valid()
+        if not valid:
             return Response(
                 serializer.errors,
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        return self.execute(serializer.validated_data, user=user)
+
+    def get_serializer(self, data, context=None):
+        """Сериализатор DRF или его скомпилированная схема, если включена быстрая проверка."""
+        if self.fast_serializer_class is not None and getattr(settings, 'BILLING_FAST_VALIDATION', False):
+            return self.fast_serializer_class(data=data, context=context)
+        if context is None:
+            return self.serializer_class(data=data)
+        return self.serializer_class(data=data, context=context)
+
+    def get_concurrency(self):
+        """Режим изменения балансов эндпоинта из BILLING_BALANCE_CONCURRENCY: locking или optimistic."""
+        mode = getattr(settings, 'BILLING_BALANCE_CONCURRENCY', {}).get(self.transaction_type, LOCKING)
+        if mode not in CONCURRENCY_MODES:
+            raise ImproperlyConfigured(
+                f"BILLING_BALANCE_CONCURRENCY[{self.transaction_type!r}]: {mode!r}, ожидается одно из {', '.join(CONCURRENCY_MODES)}"
+            )
+        return mode
+
+    def execute(self, validated_data, user=None):
+        """Проводит проверенную операцию в транзакции БД и возвращает ответ."""
         try:
-            with transaction.atomic():
-                result = self.process_transaction(serializer.validated_data)
-                return Response(result, status=status.HTTP_201_CREATED)
+            if self.get_concurrency() == OPTIMISTIC:
+                result = self.execute_optimistic(validated_data, user=user)
+            else:
+                with instrumentation.atomic():
+                    result = self.process_transaction(validated_data, user=user)
+            return Response(result, status=status.HTTP_201_CREATED)
+        except BalanceVersionConflict as e:
+            return Response(
+                {"error": f"{e}, повторите запрос"},
+                status=status.HTTP_409_CONFLICT
+            )
         except ValueError as e:
             return Response(
                 {"error": str(e)},
@@ -39,11 +207,155 @@ class BaseTransactionView(APIView):
             )
 
     def process_transaction(self, validated_data, user=None):
-        raise NotImplementedError("Метод process_transaction должен быть переопределён")
+        with instrumentation.phase('mutate'):
+            changes = self.get_balance_changes(validated_data)
+            balances = self.apply_balance_changes(changes, user=user)
+        with instrumentation.phase('insert'):
+            txn = self.create_transaction(
+                transaction_type=self.transaction_type,
+                user=user,
+                **self.get_transaction_data(validated_data),
+            )
+            LedgerEntry.objects.record(txn, changes, user=user)
+        record_daily_aggregates([txn])
+        with instrumentation.phase('serialize'):
+            return self.build_response(txn, balances)
+
+    def execute_optimistic(self, validated_data, user=None):
+        """
+        Повторяет операцию при конфликте версий, не более BILLING_OPTIMISTIC_RETRIES раз.
+        Перед повтором — пауза со случайной задержкой до BILLING_OPTIMISTIC_BACKOFF × 2^попытка
+        секунд, чтобы столкнувшиеся запросы разошлись.
+        """
+        retries = getattr(settings, 'BILLING_OPTIMISTIC_RETRIES', 5)
+        backoff = getattr(settings, 'BILLING_OPTIMISTIC_BACKOFF', 0.005)
+        for attempt in range(retries + 1):
+            try:
+                with instrumentation.atomic():
+                    return self.process_optimistic_transaction(validated_data, user=user)
+            except BalanceVersionConflict:
+                if attempt == retries:
+                    raise
+                with instrumentation.phase('backoff'):
+                    time.sleep(random.uniform(0, backoff * 2 ** attempt))
+
+    def process_optimistic_transaction(self, validated_data, user=None):
+        """
+        Вариант process_transaction без блокировок до записи: остатки читаются
+        с версиями, транзакция и проводки пишутся первыми, а балансы меняются
+        последними сравнением версий. Строки балансов заблокированы только
+        от этой записи до коммита.
+        """
+        with instrumentation.phase('mutate'):
+            changes = self.get_balance_changes(validated_data)
+            shards, balances, deltas = self.plan_balance_changes(changes, user=user)
+        with instrumentation.phase('insert'):
+            txn = self.create_transaction(
+                transaction_type=self.transaction_type,
+                user=user,
+                **self.get_transaction_data(validated_data),
+            )
+            LedgerEntry.objects.record(txn, changes, user=user)
+        with instrumentation.phase('mutate'):
+            for code, delta in deltas.items():
+                if delta:
+                    Balance.objects.apply_versioned_delta(shards[code], delta)
+                    balances[code] += delta
+        record_daily_aggregates([txn])
+        with instrumentation.phase('serialize'):
+            return self.build_response(txn, balances)
+
+    def get_balance_changes(self, validated_data):
+        """
+        Возвращает изменения балансов операции списком пар (валюта, сумма):
+        отрицательная сумма списывается, положительная зачисляется.
+        """
+        raise NotImplementedError("Метод get_balance_changes должен быть переопределён")
+
+    def get_transaction_data(self, validated_data):
+        return {
+            "amount": validated_data['sum'],
+            "currency": validated_data['currency_id'],
+            "gross_currency": validated_data.get('gross_currency_id'),
+            "exchange_rate": validated_data.get('exchange_rate'),
+        }
+
+    def apply_balance_changes(self, changes, user=None):
+        """Применяет изменения к счетам пользователя и возвращает новые остатки по кодам валют."""
+        if sum(1 for _, delta in changes if delta) > 1:
+            return self.apply_locked_balance_changes(changes, user=user)
+
+        # Один изменяемый счёт меняется условным UPDATE без блокировки заранее
+        balances = {}
+        for currency, delta in changes:
+            if delta < 0:
+                balances[currency.code] = self.withdraw(currency, -delta, user=user)
+            elif delta > 0:
+                balances[currency.code] = self.deposit(currency, delta, user=user)
+            else:
+                balances[currency.code] = self.get_balance_amount(currency, user=user)
+        return balances
+
+    def apply_locked_balance_changes(self, changes, user=None):
+        """
+        Изменения нескольких счетов: все шарды блокируются одним запросом
+        (lock_balances), остаток проверяется по сумме шардов до первой записи.
+        """
+        shards, balances, deltas = self.plan_balance_changes(changes, user=user, lock=True)
+        for code, delta in deltas.items():
+            if delta:
+                Balance.objects.apply_locked_delta(shards[code], delta)
+                balances[code] += delta
+        return balances
+
+    def plan_balance_changes(self, changes, user=None, lock=False):
+        """
+        Читает шарды затронутых счетов и проверяет, хватает ли средств.
+        Возвращает шарды и остатки по кодам валют и итоговое изменение каждого счёта.
+        """
+        shards = read_balances({currency.code: currency for currency, _ in changes}, user=user, lock=lock)
+        balances = {code: sum(shard.amount for shard in account) for code, account in shards.items()}
+        deltas = {}
+        for currency, delta in changes:
+            deltas[currency.code] = deltas.get(currency.code, Decimal(0)) + Balance.quantize(delta, exponent=currency.exponent)
+        for code, delta in deltas.items():
+            if delta < 0:
+                Balance(
+                    currency=shards[code][0].currency,
+                    amount=balances[code],
+                    held=sum(shard.held for shard in shards[code]),
+                ).check_sufficient_balance(-delta)
+        return shards, balances, deltas
+
+    def build_response(self, txn, balances):
+        return {
+            "id": txn.id,
+            "transaction_type": txn.transaction_type,
+            "amount": str(txn.amount),
+            "currency": txn.currency.code,
+            "gross_currency": txn.gross_currency.code if txn.gross_currency else None,
+            "exchange_rate": str(txn.exchange_rate) if txn.exchange_rate else None,
+            "created_at": txn.created_at,
+            "balances": {code: str(amount) for code, amount in balances.items()},
+        }
+
+    def get_balance_amount(self, currency, user=None):
+        amount = Balance.objects.account(user, currency).total()
+        if amount is None:
+            raise ValueError(f"Баланс для валюты {currency.code} не найден")
+        return amount
+
+    def withdraw(self, currency, amount, user=None):
+        """Атомарно списывает amount со счёта и возвращает новый остаток."""
+        try:
+            return Balance.objects.account(user, currency).withdraw(amount, currency.exponent)
+        except Balance.DoesNotExist:
+            raise ValueError(f"Баланс для валюты {currency.code} не найден")
 
-    def get_balance(self, currency):
+    def deposit(self, currency, amount, user=None):
+        """Атомарно зачисляет amount на счёт и возвращает новый остаток."""
         try:
-            return Balance.objects.select_for_update().get(currency=currency)
+            return Balance.objects.account(user, currency).deposit(amount, currency.exponent)
         except Balance.DoesNotExist:
             raise ValueError(f"Баланс для валюты {currency.code} не найден")
 
@@ -68,135 +380,565 @@ class BaseTransactionView(APIView):
 
 class ConversionView(BaseTransactionView):
     serializer_class = ConversionSerializer
+    fast_serializer_class = TransactionSchema(ConversionSerializer)
     transaction_type = Transaction.TransactionType.CONVERSION
 
-    def process_transaction(self, validated_data, user=None):
+    def get_balance_changes(self, validated_data):
         amount = validated_data['sum']
         target_currency = validated_data['currency_id']
         source_currency = validated_data['gross_currency_id']
         exchange_rate = validated_data['exchange_rate']
 
-        source_balance = self.get_balance(source_currency)
-        target_balance = self.get_balance(target_currency)
-
         if source_currency.code == 'RUB' and target_currency.code != 'RUB':
             rub_to_deduct = amount * exchange_rate
-            source_balance.check_sufficient_balance(rub_to_deduct)
-            source_balance.withdraw(rub_to_deduct)
-            target_balance.deposit(amount)
+            return [(source_currency, -rub_to_deduct), (target_currency, amount)]
         elif source_currency.code != 'RUB' and target_currency.code == 'RUB':
             amount_to_deduct = amount / exchange_rate
-            source_balance.check_sufficient_balance(amount_to_deduct)
-
-            source_balance.withdraw(amount_to_deduct)
-            target_balance.deposit(amount)
-        txn = self.create_transaction(
-            transaction_type=self.transaction_type,
-            amount=amount,
-            currency=target_currency,
-            gross_currency=source_currency,
-            exchange_rate=exchange_rate,
-            user=user,
-        )
+            return [(source_currency, -amount_to_deduct), (target_currency, amount)]
 
-        return {
-            "id": txn.id,
-            "transaction_type": txn.transaction_type,
-            "amount": str(txn.amount),
-            "currency": txn.currency.code,
-            "gross_currency": txn.gross_currency.code,
-            "exchange_rate": str(txn.exchange_rate),
-            "created_at": txn.created_at,
-            "balances": {
-                source_currency.code: str(source_balance.amount),
-                target_currency.code: str(target_balance.amount)
-            }
-        }
+        # Прочие пары: exchange_rate — единицы исходной валюты за единицу целевой (rate_pair)
+        return [(source_currency, -amount * exchange_rate), (target_currency, amount)]
 
 
 class ServiceSpendView(BaseTransactionView):
     serializer_class = ServiceSpendSerializer
+    fast_serializer_class = TransactionSchema(ServiceSpendSerializer)
     transaction_type = Transaction.TransactionType.SERVICE_SPEND
 
-    def process_transaction(self, validated_data, user=None):
+    def get_balance_changes(self, validated_data):
         amount = validated_data['sum']
         currency = validated_data['currency_id']
         gross_currency = validated_data.get('gross_currency_id')
         exchange_rate = validated_data.get('exchange_rate')
 
-        rub_balance = self.get_balance(Currency.objects.get(code='RUB'))
+        rub_currency = currency_registry.get('RUB')
 
         if currency.code == 'RUB':
-            rub_balance.check_sufficient_balance(amount)
-            rub_balance.withdraw(amount)
-        else:
-            if not gross_currency or not exchange_rate:
-                raise ValueError("Для покупки в валюте, отличной от RUB, необходимы gross_currency_id и exchange_rate")
+            return [(rub_currency, -amount)]
 
-            rub_to_deduct = amount * exchange_rate
-            rub_balance.check_sufficient_balance(rub_to_deduct)
-            rub_balance.withdraw(rub_to_deduct)
-
-        txn = self.create_transaction(
-            transaction_type=self.transaction_type,
-            amount=amount,
-            currency=currency,
-            gross_currency=gross_currency,
-            exchange_rate=exchange_rate,
-            user=user,
-        )
+        if not gross_currency or not exchange_rate:
+            raise ValueError("Для покупки в валюте, отличной от RUB, необходимы gross_currency_id и exchange_rate")
 
-        return {
-            "id": txn.id,
-            "transaction_type": txn.transaction_type,
-            "amount": str(txn.amount),
-            "currency": txn.currency.code,
-            "gross_currency": txn.gross_currency.code if txn.gross_currency else None,
-            "exchange_rate": str(txn.exchange_rate) if txn.exchange_rate else None,
-            "created_at": txn.created_at,
-            "balances": {
-                "RUB": str(rub_balance.amount)
-            }
-        }
+        rub_to_deduct = amount * exchange_rate
+        return [(rub_currency, -rub_to_deduct)]
 
 
 class TopUpView(BaseTransactionView):
     serializer_class = AccountTopUpSerializer
+    fast_serializer_class = TransactionSchema(AccountTopUpSerializer)
     transaction_type = Transaction.TransactionType.ACCOUNT_TOPUP
 
-    def process_transaction(self, validated_data, user=None):
+    def get_balance_changes(self, validated_data):
         amount = validated_data['sum']
         currency = validated_data['currency_id']
         gross_currency = validated_data.get('gross_currency_id')
         exchange_rate = validated_data.get('exchange_rate')
 
-        rub_balance = self.get_balance(Currency.objects.get(code='RUB'))
+        rub_currency = currency_registry.get('RUB')
 
         if currency.code == 'RUB':
-            rub_balance.deposit(amount)
-        else:
-            if not gross_currency or not exchange_rate:
-                raise ValueError("Для пополнения в валюте, отличной от RUB, необходимы gross_currency_id и exchange_rate")
-            rub_balance.deposit(amount * exchange_rate)
-
-        txn = self.create_transaction(
-            transaction_type=self.transaction_type,
-            amount=amount,
-            currency=currency,
-            gross_currency=gross_currency,
-            exchange_rate=exchange_rate,
-            user=user,
+            return [(rub_currency, amount)]
+
+        if not gross_currency or not exchange_rate:
+            raise ValueError("Для пополнения в валюте, отличной от RUB, необходимы gross_currency_id и exchange_rate")
+        return [(rub_currency, amount * exchange_rate)]
+
+    def execute(self, validated_data, user=None):
+        if not getattr(settings, 'BILLING_TOPUP_WRITE_BEHIND', False):
+            return super().execute(validated_data, user=user)
+
+        # Пополнение не может не пройти по остатку: принимаем его в журнал без блокировки
+        # баланса, проводит журнал команда apply_pending_topups
+        try:
+            with instrumentation.atomic():
+                pending = self.enqueue(validated_data, user=user)
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        with instrumentation.phase('serialize'):
+            return Response(self.build_pending_response(pending), status=status.HTTP_202_ACCEPTED)
+
+    def enqueue(self, validated_data, user=None):
+        with instrumentation.phase('mutate'):
+            [(currency, delta)] = self.get_balance_changes(validated_data)
+            delta = Balance.quantize(delta, exponent=currency.exponent)
+            # Нулевое зачисление apply_pending_topups провести не сможет
+            if not delta:
+                raise ValueError(f"Сумма зачисления меньше минимальной единицы валюты {currency.code}")
+            if not Balance.objects.account(user, currency).exists():
+                raise ValueError(f"Баланс для валюты {currency.code} не найден")
+        with instrumentation.phase('insert'):
+            return PendingTopUp.objects.create(
+                user=user,
+                balance_currency=currency,
+                delta=delta,
+                **self.get_transaction_data(validated_data),
+            )
+
+    def build_pending_response(self, pending):
+        return {
+            "id": pending.id,
+            "status": pending.status,
+            "transaction_type": self.transaction_type,
+            "amount": str(pending.amount),
+            "currency": pending.currency.code,
+            "gross_currency": pending.gross_currency.code if pending.gross_currency else None,
+            "exchange_rate": str(pending.exchange_rate) if pending.exchange_rate else None,
+            "created_at": pending.created_at,
+        }
+
+
+class ServiceSpendAuthorizeView(ServiceSpendView):
+    """
+    Первая фаза покупки: резервирует сумму списания холдом на BILLING_HOLD_TTL
+    секунд. Баланс не меняется, растёт только его счётчик held, поэтому резерв
+    сразу уменьшает доступный остаток для всех операций.
+    """
+
+    @property
+    def idempotency_scope(self):
+        return "service_spend_authorize"
+
+    def execute(self, validated_data, user=None):
+        try:
+            with instrumentation.atomic():
+                hold = self.authorize(validated_data, user=user)
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        with instrumentation.phase('serialize'):
+            return Response(build_hold_response(hold), status=status.HTTP_201_CREATED)
+
+    def authorize(self, validated_data, user=None):
+        with instrumentation.phase('mutate'):
+            [(currency, delta)] = self.get_balance_changes(validated_data)
+            held = Balance.quantize(-delta, exponent=currency.exponent)
+            if not held:
+                raise ValueError(f"Сумма резерва меньше минимальной единицы валюты {currency.code}")
+            try:
+                shard_id = Balance.objects.account(user, currency).reserve(held)
+            except Balance.DoesNotExist:
+                raise ValueError(f"Баланс для валюты {currency.code} не найден")
+        with instrumentation.phase('insert'):
+            return Hold.objects.create(
+                user=user,
+                balance_id=shard_id,
+                held=held,
+                expires_at=timezone.now() + timedelta(seconds=getattr(settings, 'BILLING_HOLD_TTL', 15 * 60)),
+                **self.get_transaction_data(validated_data),
+            )
+
+
+def build_hold_response(hold):
+    return {
+        "id": hold.id,
+        "status": hold.status,
+        "amount": str(hold.amount),
+        "currency": hold.currency.code,
+        "gross_currency": hold.gross_currency.code if hold.gross_currency else None,
+        "exchange_rate": str(hold.exchange_rate) if hold.exchange_rate else None,
+        "held": str(hold.held),
+        "held_currency": hold.balance.currency_id,
+        "transaction_id": hold.transaction_id,
+        "created_at": hold.created_at,
+        "expires_at": hold.expires_at,
+    }
+
+
+class HoldActionView(APIView):
+    """
+    Вторая фаза покупки над холдом пользователя. Переход из active выполняется
+    условным UPDATE статуса, поэтому параллельные списание, отмена и сборщик
+    истёкших холдов не завершат один холд дважды.
+    """
+
+    def post(self, request, pk):
+        user = request.user if request.user.is_authenticated else None
+        try:
+            with instrumentation.atomic():
+                return self.perform(pk, user)
+        except Hold.DoesNotExist:
+            return Response(
+                {"error": f"Холд {pk} не найден"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_409_CONFLICT
+            )
+
+    def perform(self, pk, user):
+        raise NotImplementedError("Метод perform должен быть переопределён")
+
+    def finish(self, pk, user, new_status, **filters):
+        """Переводит активный холд в new_status и возвращает его; ValueError, если холд уже завершён."""
+        now = timezone.now()
+        hold = Hold.objects.select_related('balance').get(pk=pk, user=user)
+        finished = Hold.objects.filter(pk=pk, status=Hold.Status.ACTIVE, **filters).update(
+            status=new_status, processed_at=now,
+        )
+        if not finished:
+            hold.refresh_from_db(fields=['status'])
+            if hold.status == Hold.Status.ACTIVE:
+                raise ValueError(f"Срок холда {pk} истёк")
+            raise ValueError(f"Холд {pk} уже завершён: {hold.get_status_display().lower()}")
+        hold.status = new_status
+        hold.processed_at = now
+        return hold
+
+
+class HoldCaptureView(HoldActionView):
+    """
+    Списание зарезервированной суммы: одна транзакция service_spend с данными
+    авторизации. Из балансов меняется одна строка — шард холда, без блокировки
+    счёта и проверки остатка: средства гарантирует резерв.
+    """
+
+    def perform(self, pk, user):
+        with instrumentation.phase('mutate'):
+            hold = self.finish(pk, user, Hold.Status.CAPTURED, expires_at__gt=timezone.now())
+            currency = currency_registry.get(hold.balance.currency_id)
+            amount = Balance.objects.account(user, currency).capture(hold.balance_id, hold.held, currency.exponent)
+        with instrumentation.phase('insert'):
+            view = ServiceSpendView()
+            txn = view.create_transaction(
+                transaction_type=view.transaction_type,
+                user=user,
+                amount=hold.amount,
+                currency=currency_registry.get(hold.currency_id),
+                gross_currency=currency_registry.get(hold.gross_currency_id) if hold.gross_currency_id else None,
+                exchange_rate=hold.exchange_rate,
+            )
+            LedgerEntry.objects.record(txn, [(currency, -hold.held)], user=user)
+            Hold.objects.filter(pk=pk).update(transaction=txn)
+        record_daily_aggregates([txn])
+        with instrumentation.phase('serialize'):
+            return Response(view.build_response(txn, {currency.code: amount}), status=status.HTTP_201_CREATED)
+
+
+class HoldVoidView(HoldActionView):
+    """Отмена авторизации: резерв возвращается в доступный остаток."""
+
+    def perform(self, pk, user):
+        with instrumentation.phase('mutate'):
+            hold = self.finish(pk, user, Hold.Status.VOIDED)
+            Balance.objects.release(hold.balance_id, hold.held)
+        with instrumentation.phase('serialize'):
+            return Response(build_hold_response(hold), status=status.HTTP_200_OK)
+
+
+class BatchTransactionView(IdempotencyMixin, APIView):
+    """
+    Пакетное применение операций в одной транзакции БД.
+    Каждый затронутый баланс блокируется один раз, изменения копятся в памяти
+    и записываются одним UPDATE на шард счёта, транзакции — одним bulk_create.
+    В режиме atomic любая ошибка отменяет весь пакет, в режиме best_effort
+    ошибочные элементы пропускаются.
+    """
+    serializer_class = BatchTransactionSerializer
+    idempotency_scope = "batch"
+    transaction_views = {
+        view.transaction_type: view
+        for view in (ConversionView, ServiceSpendView, TopUpView)
+    }
+
+    def post(self, request):
+        return self.idempotent_post(request, lambda: self.perform_post(request))
+
+    def perform_post(self, request):
+        user = request.user if request.user.is_authenticated else None
+        serializer = self.serializer_class(data=request.data)
+
+        with instrumentation.phase('validate'):
+            valid = serializer.is_valid()
+        if not valid:
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        mode = serializer.validated_data['mode']
+        try:
+            with instrumentation.atomic():
+                results, failed = self.process_batch(serializer.validated_data['items'], mode, user=user)
+                if failed and mode == BatchTransactionSerializer.MODE_ATOMIC:
+                    transaction.set_rollback(True)
+                    return Response(
+                        {"mode": mode, "results": results},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except Exception as e:
+            return Response(
+                {"error": f"Ошибка при обработке транзакции: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        return Response(
+            {"mode": mode, "results": results},
+            status=status.HTTP_200_OK if failed else status.HTTP_201_CREATED
         )
 
+    def process_batch(self, items, mode, user=None):
+        """Возвращает результаты по элементам и признак наличия ошибок."""
+        results = [None] * len(items)
+        prepared = []
+
+        for index, item in enumerate(items):
+            view = self.transaction_views[item['type']]()
+            item_serializer = view.get_serializer(item)
+            if not item_serializer.is_valid():
+                results[index] = {"index": index, "status": "error", "errors": item_serializer.errors}
+                continue
+            try:
+                changes = [
+                    (currency, Balance.quantize(delta, exponent=currency.exponent))
+                    for currency, delta in view.get_balance_changes(item_serializer.validated_data)
+                ]
+            except ValueError as e:
+                results[index] = {"index": index, "status": "error", "errors": {"error": str(e)}}
+                continue
+            prepared.append((index, view, item_serializer.validated_data, changes))
+
+        failed = any(results)
+        if failed and mode == BatchTransactionSerializer.MODE_ATOMIC:
+            return [result for result in results if result], failed
+
+        with instrumentation.phase('lock'):
+            # Элементы со счётом, которого нет, отклоняются по отдельности в apply_in_memory
+            shards = lock_balances(
+                {currency.code: currency for _, _, _, changes in prepared for currency, _ in changes},
+                user=user,
+                missing_ok=True,
+            )
+        # Остатки счетов целиком: проверки идут по сумме шардов за вычетом холдов
+        balances = {
+            code: Balance(
+                user=user,
+                currency=account[0].currency,
+                amount=sum(shard.amount for shard in account),
+                held=sum(shard.held for shard in account),
+            )
+            for code, account in shards.items()
+        }
+        initial_amounts = {code: balance.amount for code, balance in balances.items()}
+
+        applied = []
+        for index, view, validated_data, changes in prepared:
+            try:
+                self.apply_in_memory(balances, changes)
+            except ValueError as e:
+                results[index] = {"index": index, "status": "error", "errors": {"error": str(e)}}
+                if mode == BatchTransactionSerializer.MODE_ATOMIC:
+                    return [result for result in results if result], True
+                continue
+            txn = Transaction(
+                transaction_type=view.transaction_type,
+                user=user,
+                **view.get_transaction_data(validated_data),
+            )
+            snapshot = {currency.code: balances[currency.code].amount for currency, _ in changes}
+            applied.append((index, view, txn, changes, snapshot))
+
+        with instrumentation.phase('mutate'):
+            for code, balance in balances.items():
+                delta = balance.amount - initial_amounts[code]
+                if delta:
+                    Balance.objects.apply_locked_delta(shards[code], delta)
+
+        with instrumentation.phase('insert'):
+            transactions = Transaction.objects.bulk_create([txn for _, _, txn, _, _ in applied])
+            LedgerEntry.objects.bulk_create([
+                entry
+                for _, _, txn, changes, _ in applied
+                for entry in LedgerEntry.objects.build(txn, changes, user=user)
+            ])
+        record_daily_aggregates(transactions)
+
+        with instrumentation.phase('serialize'):
+            for index, view, txn, _, snapshot in applied:
+                results[index] = {"index": index, "status": "ok", "transaction": view.build_response(txn, snapshot)}
+        return results, any(result["status"] == "error" for result in results)
+
+    def apply_in_memory(self, balances, changes):
+        """Применяет изменения одного элемента к заблокированным балансам: всё или ничего."""
+        required = {}
+        for currency, delta in changes:
+            if currency.code not in balances:
+                raise ValueError(f"Баланс для валюты {currency.code} не найден")
+            if delta < 0:
+                required[currency.code] = required.get(currency.code, Decimal(0)) - delta
+        for code, amount in required.items():
+            balances[code].check_sufficient_balance(amount)
+
+        for currency, delta in changes:
+            balances[currency.code].amount += delta
+
+
+class _Echo:
+    """Псевдо-буфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+class TransactionHistoryView(APIView):
+    """
+    История транзакций счёта, от новых к старым: пользователь видит только
+    свои транзакции, анонимный запрос — транзакции общего счёта.
+    Пагинация по ключу (created_at, id) вместо OFFSET: стоимость страницы
+    не зависит от глубины. Строки читаются через values() без создания моделей.
+    Рабочая таблица и архив (ArchivedTransaction) объединяются одним
+    запросом UNION ALL с общим порядком.
+    С параметром export=ndjson|csv выгрузка отдаётся потоком с постоянным
+    расходом памяти.
+    """
+    serializer_class = TransactionHistoryQuerySerializer
+    fields = (
+        'id', 'transaction_type', 'amount', 'currency_id', 'gross_currency_id',
+        'exchange_rate', 'user_id', 'created_at',
+    )
+    export_chunk_size = 2000
+
+    def get(self, request):
+        serializer = self.serializer_class(data=request.query_params)
+
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        params = serializer.validated_data
+        user = request.user if request.user.is_authenticated else None
+        rows = self.get_queryset(params, user)
+
+        if params.get('export') == self.serializer_class.EXPORT_CSV:
+            return self.stream(self.iter_csv(rows), 'text/csv', 'transactions.csv')
+        if params.get('export') == self.serializer_class.EXPORT_NDJSON:
+            return self.stream(self.iter_ndjson(rows), 'application/x-ndjson', 'transactions.ndjson')
+
+        limit = params['limit']
+        page = list(rows[:limit + 1])
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            last = page[-1]
+            next_cursor = self.serializer_class.encode_cursor(last[-1], last[0])
+
+        return Response({
+            "results": [self.to_representation(row) for row in page],
+            "next_cursor": next_cursor,
+        })
+
+    def get_queryset(self, params, user):
+        hot = self.filter_queryset(Transaction.objects.all(), params, user).values_list(*self.fields)
+        archived = self.filter_queryset(ArchivedTransaction.objects.all(), params, user).values_list(*self.fields)
+        return hot.union(archived, all=True).order_by('-created_at', '-id')
+
+    def filter_queryset(self, queryset, params, user):
+        queryset = queryset.filter(user=user)
+        if 'transaction_type' in params:
+            queryset = queryset.filter(transaction_type=params['transaction_type'])
+        if 'currency' in params:
+            queryset = queryset.filter(currency_id=params['currency'])
+        if 'date_from' in params:
+            queryset = queryset.filter(created_at__gte=params['date_from'])
+        if 'date_to' in params:
+            queryset = queryset.filter(created_at__lt=params['date_to'])
+        if 'cursor' in params:
+            created_at, pk = params['cursor']
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+        return queryset
+
+    def to_representation(self, row):
+        pk, transaction_type, amount, currency, gross_currency, exchange_rate, user, created_at = row
         return {
-            "id": txn.id,
-            "transaction_type": txn.transaction_type,
-            "amount": str(txn.amount),
-            "currency": txn.currency.code,
-            "gross_currency": txn.gross_currency.code if txn.gross_currency else None,
-            "exchange_rate": str(txn.exchange_rate) if txn.exchange_rate else None,
-            "created_at": txn.created_at,
-            "balances": {
-                "RUB": str(rub_balance.amount)
-            }
+            "id": pk,
+            "transaction_type": transaction_type,
+            "amount": str(amount),
+            "currency": currency,
+            "gross_currency": gross_currency,
+            "exchange_rate": str(exchange_rate) if exchange_rate is not None else None,
+            "user": user,
+            "created_at": created_at,
         }
+
+    def iter_ndjson(self, rows):
+        encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+        for row in rows.iterator(chunk_size=self.export_chunk_size):
+            yield encoder.encode(self.to_representation(row)) + '\n'
+
+    def iter_csv(self, rows):
+        writer = csv.writer(_Echo())
+        yield writer.writerow(['id', 'transaction_type', 'amount', 'currency', 'gross_currency',
+                               'exchange_rate', 'user', 'created_at'])
+        for row in rows.iterator(chunk_size=self.export_chunk_size):
+            item = self.to_representation(row)
+            item['created_at'] = item['created_at'].isoformat()
+            yield writer.writerow(item.values())
+
+    def stream(self, lines, content_type, filename):
+        response = StreamingHttpResponse(lines, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class TurnoverView(APIView):
+    """
+    Оборот за период по валютам и типам транзакций.
+    Считается по таблице дневных агрегатов, а не по Transaction,
+    поэтому время ответа зависит от числа дней, а не транзакций.
+    Границы date_from и date_to включаются.
+    """
+    serializer_class = TurnoverQuerySerializer
+
+    def get(self, request):
+        serializer = self.serializer_class(data=request.query_params)
+
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        params = serializer.validated_data
+        queryset = TransactionDailyAggregate.objects.all()
+        if 'date_from' in params:
+            queryset = queryset.filter(day__gte=params['date_from'])
+        if 'date_to' in params:
+            queryset = queryset.filter(day__lte=params['date_to'])
+        if 'transaction_type' in params:
+            queryset = queryset.filter(transaction_type=params['transaction_type'])
+        if 'currency' in params:
+            queryset = queryset.filter(currency_id=params['currency'])
+
+        group_by = ['currency_id', 'transaction_type']
+        if params.get('group_by') == self.serializer_class.GROUP_BY_DAY:
+            group_by.insert(0, 'day')
+        rows = queryset.values(*group_by).annotate(total=Sum('amount'), transactions=Sum('count')).order_by(*group_by)
+        # SQLite возвращает сумму без масштаба поля, приводим к точности amount
+        exponent = Decimal(1).scaleb(-TransactionDailyAggregate._meta.get_field('amount').decimal_places)
+
+        return Response({
+            "results": [
+                {
+                    **({"day": row['day']} if 'day' in row else {}),
+                    "currency": row['currency_id'],
+                    "transaction_type": row['transaction_type'],
+                    "amount": str(row['total'].quantize(exponent)),
+                    "count": row['transactions'],
+                }
+                for row in rows
+            ],
+        })
@@ -0,0 +1,92 @@
+"""
+Профили подключения к БД.
+
+Профиль выбирается переменной окружения BILLING_DB_PROFILE:
+
+- sqlite (по умолчанию) — файл SQLite, при подключении включаются WAL,
+  synchronous=NORMAL и busy_timeout, транзакции открываются как IMMEDIATE;
+- postgresql — PostgreSQL через psycopg 3 с пулом соединений psycopg_pool
+  (или постоянными соединениями CONN_MAX_AGE, если пул выключен)
+  и проверкой соединений перед использованием.
+"""
+from django.core.exceptions import ImproperlyConfigured
+
+
+def _env_bool(environ, name, default):
+    value = environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _env_int(environ, name, default):
+    value = environ.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ImproperlyConfigured(f'{name} должен быть целым числом, получено {value!r}')
+
+
+def sqlite_database(base_dir, environ):
+    busy_timeout = _env_int(environ, 'BILLING_SQLITE_BUSY_TIMEOUT', 5000)
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': environ.get('BILLING_SQLITE_PATH', base_dir / 'db.sqlite3'),
+        'OPTIONS': {
+            # WAL позволяет читать во время записи, NORMAL в режиме WAL не теряет
+            # целостность и убирает fsync на каждый коммит
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                f'PRAGMA busy_timeout={busy_timeout};'
+            ),
+            # Блокировка записи берётся в начале транзакции, а не при первом UPDATE:
+            # без этого чтение с последующей записью может упасть с database is locked
+            'transaction_mode': 'IMMEDIATE',
+        },
+    }
+
+
+def postgresql_database(environ):
+    database = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': environ.get('POSTGRES_DB', 'billing'),
+        'USER': environ.get('POSTGRES_USER', 'billing'),
+        'PASSWORD': environ.get('POSTGRES_PASSWORD', ''),
+        'HOST': environ.get('POSTGRES_HOST', 'localhost'),
+        'PORT': environ.get('POSTGRES_PORT', '5432'),
+        'CONN_HEALTH_CHECKS': True,
+        # За pgbouncer в режиме transaction серверные курсоры .iterator() не работают
+        'DISABLE_SERVER_SIDE_CURSORS': _env_bool(environ, 'BILLING_PG_DISABLE_SERVER_SIDE_CURSORS', False),
+        'OPTIONS': {
+            'application_name': environ.get('BILLING_PG_APPLICATION_NAME', 'billing'),
+        },
+    }
+
+    if _env_bool(environ, 'BILLING_DB_POOL', True):
+        # С пулом Django требует CONN_MAX_AGE = 0: соединения живут в пуле
+        database['CONN_MAX_AGE'] = 0
+        database['OPTIONS']['pool'] = {
+            'min_size': _env_int(environ, 'BILLING_DB_POOL_MIN_SIZE', 2),
+            'max_size': _env_int(environ, 'BILLING_DB_POOL_MAX_SIZE', 10),
+            'timeout': _env_int(environ, 'BILLING_DB_POOL_TIMEOUT', 10),
+        }
+    else:
+        database['CONN_MAX_AGE'] = _env_int(environ, 'BILLING_DB_CONN_MAX_AGE', 60)
+
+    return database
+
+
+def get_databases(base_dir, environ):
+    profile = environ.get('BILLING_DB_PROFILE', 'sqlite').strip().lower()
+
+    if profile == 'sqlite':
+        return {'default': sqlite_database(base_dir, environ)}
+    if profile in ('postgresql', 'postgres'):
+        return {'default': postgresql_database(environ)}
+
+    raise ImproperlyConfigured(
+        f"Неизвестный профиль БД BILLING_DB_PROFILE={profile!r}. Допустимые значения: sqlite, postgresql"
+    )
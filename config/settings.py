@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from config.database import get_databases
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -48,6 +51,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'billing.instrumentation.InstrumentationMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -73,13 +77,9 @@ WSGI_APPLICATION = 'config.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
+# Профиль выбирается переменной BILLING_DB_PROFILE (sqlite | postgresql), см. config/database.py
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
-}
+DATABASES = get_databases(BASE_DIR, os.environ)
 
 
 # Password validation
@@ -122,3 +122,72 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Billing
+# Время жизни ключей Idempotency-Key (секунды) и размер LRU-кэша ответов в памяти процесса.
+# Размер 0 отключает кэш, ключи тогда читаются только из БД.
+
+BILLING_IDEMPOTENCY_TTL = 24 * 60 * 60
+BILLING_IDEMPOTENCY_CACHE_SIZE = 10_000
+
+# Дневные обороты обновляются в транзакции операции. При False их догоняет
+# команда update_daily_aggregates по отметке последней учтённой транзакции.
+
+BILLING_DAILY_AGGREGATES_INLINE = True
+
+# Как часто (секунды) кэш курсов сверяется с таблицей ExchangeRate.
+
+BILLING_RATE_CACHE_TTL = 60
+
+# Замеры фаз запросов биллинга: заголовок Server-Timing и /metrics.
+# Выключенная middleware снимается при старте и ничего не стоит.
+
+BILLING_INSTRUMENTATION = os.environ.get('BILLING_INSTRUMENTATION', '').lower() in ('1', 'true', 'yes', 'on')
+BILLING_METRICS_ALLOWED_IPS = ('127.0.0.1', '::1')
+
+# Пополнения принимаются в журнал PendingTopUp с ответом 202 и проводятся пачками
+# командой apply_pending_topups. При False пополнение проводится в запросе.
+
+BILLING_TOPUP_WRITE_BEHIND = False
+
+# Проверка тел запросов conversion, service-spend и account-topup скомпилированной
+# схемой вместо полей DRF: те же ошибки и validated_data, меньше работы на запрос.
+
+BILLING_FAST_VALIDATION = False
+
+# Режим изменения балансов по типам операций: locking (по умолчанию) — условный UPDATE
+# и блокировка счетов перед записью, optimistic — чтение без блокировок и запись
+# со сравнением Balance.version. При конфликте версий операция повторяется
+# до BILLING_OPTIMISTIC_RETRIES раз со случайной паузой до BACKOFF × 2^попытка секунд.
+
+BILLING_BALANCE_CONCURRENCY = {}
+BILLING_OPTIMISTIC_RETRIES = 5
+BILLING_OPTIMISTIC_BACKOFF = 0.005
+
+# Сверочные команды (verify_ledger, reconcile_balances) суммируют целые amount_minor
+# вместо Decimal-колонок. Minor-колонки пишутся всегда, см. billing.money.
+
+BILLING_MINOR_UNITS = False
+
+# Срок действия холда покупки (service-spend/authorize), секунды. Истёкшие холды
+# снимает команда release_expired_holds.
+
+BILLING_HOLD_TTL = 15 * 60
+
+# Кодирование ответов и разбор запросов API: auto | orjson | msgspec | stdlib.
+# auto берёт orjson или msgspec, если пакет установлен; вывод совпадает с JSONRenderer DRF.
+
+BILLING_JSON_BACKEND = os.environ.get('BILLING_JSON_BACKEND', 'auto')
+
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'billing.renderers.BillingJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'billing.renderers.BillingJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}